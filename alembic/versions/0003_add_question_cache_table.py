@@ -0,0 +1,24 @@
+"""
+add question_cache table (pergunta normalizada -> SQL validado)
+"""
+revision = '0003_question_cache'
+down_revision = '0002_session_and_history'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        'question_cache',
+        sa.Column('cache_key', sa.String(64), primary_key=True),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('sql', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_question_cache_created_at', 'question_cache', ['created_at'])
+
+def downgrade():
+    op.drop_index('ix_question_cache_created_at', table_name='question_cache')
+    op.drop_table('question_cache')
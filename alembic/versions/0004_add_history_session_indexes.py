@@ -0,0 +1,21 @@
+"""
+add composite indexes for history/session access patterns
+"""
+revision = '0004_history_session_indexes'
+down_revision = '0003_question_cache'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+def upgrade():
+    # Últimas entradas por sessão: WHERE session_id = ? ORDER BY created_at DESC, id DESC
+    op.create_index('ix_history_session_created_at_id', 'history', ['session_id', 'created_at', 'id'])
+    # Pruning por idade: ORDER BY created_at, id / WHERE (created_at, id) <= corte
+    op.create_index('ix_history_created_at_id', 'history', ['created_at', 'id'])
+    op.create_index('ix_session_created_at_id', 'session', ['created_at', 'id'])
+
+def downgrade():
+    op.drop_index('ix_session_created_at_id', table_name='session')
+    op.drop_index('ix_history_created_at_id', table_name='history')
+    op.drop_index('ix_history_session_created_at_id', table_name='history')
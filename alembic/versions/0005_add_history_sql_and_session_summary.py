@@ -0,0 +1,22 @@
+"""
+add history.sql and the rolling summary columns to session
+"""
+revision = '0005_history_sql_session_summary'
+down_revision = '0004_history_session_indexes'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    # SQL executado em cada turno (contexto compacto para as perguntas seguintes)
+    op.add_column('history', sa.Column('sql', sa.Text(), nullable=True))
+    # Resumo dos turnos antigos da sessão e o último history.id incorporado a ele
+    op.add_column('session', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('session', sa.Column('summary_history_id', sa.Integer(), nullable=True))
+
+def downgrade():
+    op.drop_column('session', 'summary_history_id')
+    op.drop_column('session', 'summary')
+    op.drop_column('history', 'sql')
@@ -1,36 +1,112 @@
+import asyncio
 import openai
 import os
-from app.utils.prompt import build_initial_prompt, build_answer_prompt
+import threading
+from app.utils.prompt import build_initial_prompt, build_answer_prompt, build_summary_prompt
+from app.ai.result_encoder import encode_result
+from app.metrics import record_usage
+
+# Limita quantas chamadas à OpenAI ficam em voo ao mesmo tempo neste processo
+_LLM_SEMAPHORE = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "64")))
+
+# Um cliente OpenAI (pool de conexões HTTP) por chave da API, compartilhado por todos os
+# AIChat do processo; os textos dos prompts são memoizados à parte (app.utils.prompt)
+_CLIENTS: dict[str, openai.AsyncOpenAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _openai_client(api_key: str) -> openai.AsyncOpenAI:
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(api_key)
+        if client is None:
+            client = _CLIENTS[api_key] = openai.AsyncOpenAI(api_key=api_key)
+        return client
+
+
+async def close_clients() -> None:
+    """Fecha os clientes OpenAI do processo (shutdown)."""
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        await client.close()
+
 
 class AIChat:
     def __init__(self, api_key: str, db_schema: str):
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = _openai_client(api_key)
         self.initial_prompt = build_initial_prompt(db_schema)
         self.answer_system = build_answer_prompt()
 
-    def ask(self, question: str, history=None):
-        messages = [{"role": "system", "content": self.initial_prompt}]
+    async def _complete(self, messages, call: str) -> str:
+        async with _LLM_SEMAPHORE:
+            response = await self.client.chat.completions.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-5-mini"),
+                # temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.2")),
+                messages=messages
+            )
+        record_usage(call, getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    async def ask(self, question: str, history=None, db_schema: str | None = None):
+        # db_schema: schema reduzido às tabelas relevantes para esta pergunta (opcional)
+        system = self.initial_prompt if db_schema is None else build_initial_prompt(db_schema)
+        messages = [{"role": "system", "content": system}]
         if history:
             messages.extend(history)
         messages.append({"role": "user", "content": question})
-        response = self.client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-5-mini"),
-            # temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.2")),
-            messages=messages
-        )
-        return response.choices[0].message.content
+        return await self._complete(messages, call="sql")
 
-    def answer(self, question: str, result_obj) -> str:
+    def _answer_messages(self, question: str, result_obj):
         messages = [{"role": "system", "content": self.answer_system}]
-        # Passa o resultado como texto compacto
+        # Passa o resultado como tabela compacta, dentro do orçamento de tokens
+        if hasattr(result_obj, "rows"):
+            table = encode_result(result_obj.rows, result_obj.columns, note=result_obj.summary_line())
+        else:
+            table = encode_result(result_obj or [])
         content = (
             f"Pergunta: {question}\n" 
-            f"Resultado: {result_obj}"
+            f"Resultado:\n{table}"
         )
         messages.append({"role": "user", "content": content})
-        response = self.client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-5-mini"),
-            # temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.2")),
-            messages=messages
-        )
-        return response.choices[0].message.content
+        return messages
+
+    async def answer(self, question: str, result_obj) -> str:
+        return await self._complete(self._answer_messages(question, result_obj), call="answer")
+
+    async def summarize(self, previous: str | None, turns: str) -> str:
+        """Novo resumo da conversa: o resumo atual mais os turnos que saíram da janela recente."""
+        messages = [
+            {"role": "system", "content": build_summary_prompt()},
+            {"role": "user", "content": f"Resumo atual:\n{previous or '(vazio)'}\n\nNovos turnos:\n{turns}"},
+        ]
+        return await self._complete(messages, call="summary")
+
+    async def answer_stream(self, question: str, result_obj):
+        """Gera a resposta final em trechos, conforme chegam da OpenAI (stream=True)."""
+        async with _LLM_SEMAPHORE:
+            stream = await self.client.chat.completions.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-5-mini"),
+                messages=self._answer_messages(question, result_obj),
+                stream=True,
+                # O último chunk traz o campo usage (sem choices)
+                stream_options={"include_usage": True},
+            )
+            usage = None
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        record_usage("answer", usage)
+
+
+def get_chat(api_key: str, db_schema: str) -> AIChat:
+    """
+    AIChat para o schema: barato de criar, pois o cliente é compartilhado por chave da API
+    e o prompt de sistema é memoizado pelo texto do schema (mesmo texto => mesmo prefixo).
+    """
+    return AIChat(api_key, db_schema)
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from app import crud
+from app.ai.result_encoder import estimate_tokens
+from app.database import SessionLocal
+
+SUMMARY_HEADER = "Resumo das perguntas anteriores desta sessão:\n"
+
+
+def _excerpt(text: str, max_chars: int) -> str:
+    text = " ".join((text or "").split())
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return text[: max_chars - 3].rstrip() + "..."
+
+
+def turn_messages(question: str, answer: str, sql: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Par de mensagens de um turno para o contexto da geração de SQL: a pergunta e, como
+    resposta, o SQL executado mais um trecho curto da resposta (não o Markdown inteiro).
+    """
+    parts = []
+    if sql:
+        parts.append(f"SQL executado: {sql}")
+    parts.append(f"Resposta: {_excerpt(answer, int(os.getenv('HISTORY_ANSWER_CHARS', '400')))}")
+    return [{"role": "user", "content": question}, {"role": "assistant", "content": "\n".join(parts)}]
+
+
+def _messages_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def summary_enabled() -> bool:
+    return os.getenv("HISTORY_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _limits():
+    """(HISTORY_KEEP_LAST_PAIRS, HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_BATCH)."""
+    return (
+        int(os.getenv("HISTORY_KEEP_LAST_PAIRS", "5")),
+        int(os.getenv("HISTORY_TOKEN_BUDGET", "1500")),
+        max(1, int(os.getenv("HISTORY_SUMMARY_BATCH", "4"))),
+    )
+
+
+def _max_visible() -> int:
+    """
+    Turnos fora do resumo que podem ir ao prompt: os HISTORY_KEEP_LAST_PAIRS recentes e,
+    com o resumo ativo, também os que já saíram da janela e aguardam o próximo resumo
+    (menos de HISTORY_SUMMARY_BATCH), para que nenhum turno fique fora dos dois.
+    """
+    keep, _, batch = _limits()
+    if keep <= 0:
+        return 0
+    return keep + batch - 1 if summary_enabled() else keep
+
+
+def _fitting(costs: List[int], budget: int, limit: int) -> int:
+    """Quantos dos turnos mais recentes (custos em ordem cronológica) cabem no orçamento, até `limit`."""
+    used = count = 0
+    for cost in reversed(costs[-limit:] if limit > 0 else []):
+        if used + cost > budget:
+            break
+        used += cost
+        count += 1
+    return count
+
+
+class ConversationMemory:
+    """
+    Contexto da conversa com tamanho limitado, por mais longa que seja a sessão.
+
+    Os turnos ainda fora do resumo entram do mais novo para o mais antigo enquanto
+    couberem em HISTORY_TOKEN_BUDGET. Os que passam dos HISTORY_KEEP_LAST_PAIRS recentes
+    são condensados em um resumo gravado na sessão, atualizado em background depois da
+    resposta: quando somam HISTORY_SUMMARY_BATCH turnos ou quando algum deixou de caber
+    no orçamento. Até lá, continuam no prompt (orçamento permitindo).
+    """
+
+    def __init__(self):
+        self._pending: set = set()
+        self._tasks: set = set()
+
+    def _fit(self, summary: Optional[str], pairs: List[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        """Resumo (se houver) + os pares mais recentes que cabem no orçamento, em ordem cronológica."""
+        _, budget, _ = _limits()
+        count = _fitting([_messages_tokens(p) for p in pairs], budget, _max_visible())
+        messages = [m for pair in (pairs[-count:] if count else []) for m in pair]
+        if summary:
+            messages = [{"role": "system", "content": SUMMARY_HEADER + summary}] + messages
+        return messages
+
+    def load(self, db, session) -> List[Dict[str, str]]:
+        """Histórico da sessão para o prompt (acesso síncrono ao banco interno)."""
+        # Turnos já incorporados ao resumo não se repetem
+        histories = crud.get_last_histories_by_session(db, session.id, _max_visible(), after_id=session.summary_history_id)
+        return self._fit(session.summary, [turn_messages(h.question, h.answer, h.sql) for h in histories])
+
+    def extend(self, messages: List[Dict[str, str]], question: str, answer: str, sql: Optional[str]) -> List[Dict[str, str]]:
+        """Acrescenta um turno a um histórico já carregado (ex.: perguntas em sequência no /ask/batch)."""
+        summary = None
+        if messages and messages[0]["role"] == "system":
+            summary = messages[0]["content"][len(SUMMARY_HEADER):]
+            messages = messages[1:]
+        pairs = [messages[i:i + 2] for i in range(0, len(messages), 2)]
+        pairs.append(turn_messages(question, answer, sql))
+        return self._fit(summary, pairs)
+
+    def schedule_summary(self, session_id: int, chat) -> None:
+        """Atualiza o resumo da sessão em background (no máximo uma atualização por sessão em voo)."""
+        if not summary_enabled() or session_id in self._pending:
+            return
+        self._pending.add(session_id)
+        task = asyncio.get_running_loop().create_task(self._summarize(session_id, chat))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session_id: int, chat) -> None:
+        try:
+            # Cada rodada incorpora no máximo HISTORY_SUMMARY_MAX_TURNS turnos; sessões longas
+            # (ex.: anteriores ao resumo) são alcançadas em várias chamadas
+            while True:
+                job = await asyncio.to_thread(_turns_to_fold, session_id)
+                if job is None:
+                    return
+                previous, turns, upto_id = job
+                summary = await chat.summarize(previous, turns)
+                summary = (summary or "").strip()[: int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "2000"))]
+                if not await asyncio.to_thread(_store_summary, session_id, summary, upto_id):
+                    return
+        except Exception:
+            logging.getLogger(__name__).warning("Falha ao atualizar o resumo da sessão %s", session_id, exc_info=True)
+        finally:
+            self._pending.discard(session_id)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _turns_to_fold(session_id: int):
+    """(resumo atual, texto dos turnos a incorporar, último id incorporado) ou None se ainda não é hora."""
+    keep, budget, batch = _limits()
+    max_turns = max(1, int(os.getenv("HISTORY_SUMMARY_MAX_TURNS", "20")))
+    db = SessionLocal()
+    try:
+        session = crud.get_session(db, session_id)
+        if session is None:
+            return None
+        after_id = session.summary_history_id
+        # Turnos fora do resumo mais recentes (o suficiente para decidir se é hora de resumir)
+        recent = crud.get_last_histories_by_session(db, session_id, max(keep, 0) + batch, after_id=after_id)
+        costs = [_messages_tokens(turn_messages(h.question, h.answer, h.sql)) for h in recent]
+        window = _fitting(costs, budget, keep)
+        overflow = len(recent) - window
+        # Algum turno fora do resumo já não aparece no prompt (orçamento ou limite de turnos)
+        hidden = len(recent) > _fitting(costs, budget, _max_visible())
+        if overflow <= 0 or (overflow < batch and not hidden):
+            return None
+        boundary = recent[overflow].id if window else None
+        fold = [
+            h for h in crud.get_histories_after(db, session_id, after_id, limit=max_turns)
+            if boundary is None or h.id < boundary
+        ]
+        if not fold:
+            return None
+        lines = []
+        for h in fold:
+            lines.append(f"- Pergunta: {h.question}")
+            if h.sql:
+                lines.append(f"  SQL: {h.sql}")
+            lines.append(f"  Resposta: {_excerpt(h.answer, 300)}")
+        return session.summary, "\n".join(lines), fold[-1].id
+    finally:
+        db.close()
+
+
+def _store_summary(session_id: int, summary: str, upto_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return crud.update_session_summary(db, session_id, summary, upto_id)
+    finally:
+        db.close()
+
+
+conversation_memory = ConversationMemory()
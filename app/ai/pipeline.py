@@ -1,99 +1,263 @@
-from app.db_external.schema import get_db_schema
-from app.ai.chat import AIChat
+from app.db_external.schema import get_schema_snapshot, render_schema
+from app.db_external.schema_retrieval import select_relevant_tables
+from app.ai.chat import get_chat
+from app.ai.question_cache import normalize_question, question_cache, question_cache_enabled
 from app.ai.sql_generator import SQLGenerator
-from app.db_external.connection import get_external_connection
+from app.db_external.query import fetch_sample_rows_async, QueryResult
+from app.db_external.guard import SQLGuardError
+from app.db_external.result_cache import cached_fetch_bounded_async
+from app.db_external.sql_parse import referenced_tables, referenced_columns
+from app.db_external.targets import current_target, current_target_id
+from app.ai.result_encoder import encode_result
+from app.metrics import observe_result, stage
+from app.singleflight import schema_flight, sql_generation_flight
+import asyncio
+import hashlib
 import os
 import json
 import logging
 
+def load_schema_filter():
+    """Filtro de schema do banco alvo (DB_TARGETS_FILE) ou, na falta dele, da ENV (JSON)."""
+    target_filter = current_target().schema_filter
+    if target_filter is not None:
+        return target_filter
+    schema_filter = os.getenv("SCHEMA_FILTER_JSON")
+    if schema_filter:
+        try:
+            return json.loads(schema_filter)
+        except Exception:
+            return None
+    return None
+
+
+def _flight_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
 class ChatPipeline:
 
-    def __init__(self):
+    def __init__(self, snapshot: dict | None = None):
         self.api_key = os.getenv("OPENAI_API_KEY")
-        # Parse opcional do filtro de schema via ENV (JSON)
-        self.tables_and_columns = None
-        schema_filter = os.getenv("SCHEMA_FILTER_JSON")
-        if schema_filter:
+        self.tables_and_columns = load_schema_filter()
+        if snapshot is None:
+            with stage("schema"):
+                snapshot = get_schema_snapshot(tables_and_columns=self.tables_and_columns)
+        self.snapshot = snapshot
+        self.db_schema = snapshot["schema"]
+        self.schema_fp = snapshot["fingerprint"]
+        self.ai = get_chat(self.api_key, self.db_schema)
+
+    @classmethod
+    async def create(cls) -> "ChatPipeline":
+        """
+        Cria o pipeline sem bloquear o event loop (a introspecção inicial roda em thread).
+        Requisições simultâneas com o mesmo banco alvo e filtro aguardam uma única carga do schema.
+        """
+        tables_and_columns = load_schema_filter()
+        with stage("schema"):
+            snapshot = await schema_flight.do(
+                _flight_key(current_target_id(), tables_and_columns),
+                lambda: asyncio.to_thread(get_schema_snapshot, tables_and_columns=tables_and_columns),
+            )
+        return cls(snapshot=snapshot)
+
+    def schema_for_question(self, question: str, history_msgs=None) -> str | None:
+        """
+        Schema reduzido às tabelas relevantes (e seu fecho de FKs) para a pergunta.
+        None => usar o schema completo (schema pequeno ou nenhuma tabela reconhecida).
+        """
+        # Perguntas anteriores da sessão ajudam em follow-ups ("e desses, quais...")
+        previous = " ".join(m["content"] for m in (history_msgs or []) if m.get("role") == "user")
+        tables = select_relevant_tables(self.snapshot["model"], f"{previous} {question}")
+        if tables is None:
+            return None
+        return render_schema(self.snapshot["model"], tables=tables)
+
+    async def sample_data_for(self, sql: str) -> str:
+        """
+        Exemplos reais das tabelas usadas no SQL (para o fallback de busca aproximada).
+
+        Reaproveita as amostras capturadas na introspecção; só as tabelas sem amostra são
+        consultadas, em paralelo. As colunas são reduzidas às citadas no SQL.
+        """
+        model = self.snapshot["model"]
+        tables = referenced_tables(sql, model.dialect)
+        used_cols = referenced_columns(sql, model.dialect)
+        limit = int(os.getenv("FUZZY_SAMPLE_ROWS", "10"))
+
+        samples = {}
+        missing = []
+        for table in tables:
+            info = model.table(table)
+            if info is not None and info.samples:
+                samples[table] = info.samples
+            else:
+                missing.append(table)
+
+        async def fetch(table: str):
+            info = model.table(table)
+            cols = [c.name for c in info.columns if c.name.lower() in used_cols] if info else []
             try:
-                self.tables_and_columns = json.loads(schema_filter)
+                return await fetch_sample_rows_async(
+                    info.name if info else table, columns=cols or None, limit=limit, schema=model.schema
+                )
             except Exception:
-                self.tables_and_columns = None
-        self.db_schema = get_db_schema(tables_and_columns=self.tables_and_columns)
-        self.ai = AIChat(self.api_key, self.db_schema)
+                return []
+
+        for table, rows in zip(missing, await asyncio.gather(*(fetch(t) for t in missing))):
+            samples[table] = rows
 
-    def ask(self, question: str, history_msgs=None):
+        parts = []
+        for table, rows in samples.items():
+            columns = list(rows[0].keys()) if rows else []
+            pruned = [c for c in columns if c.lower() in used_cols]
+            parts.append(f"Tabela {table}:\n{encode_result(rows, pruned or columns)}")
+        return "\n".join(parts)
+
+    async def _generate_sql(self, key_text: str, prompt: str, history_msgs=None, db_schema: str | None = None) -> str:
+        """
+        Chamada de geração de SQL, unificada entre requisições concorrentes com o mesmo
+        texto (normalizado), histórico e schema: só uma vai à OpenAI.
+        """
+        key = _flight_key(self.schema_fp, key_text, history_msgs or [], db_schema)
+        return await sql_generation_flight.do(
+            key, lambda: self.ai.ask(prompt, history=history_msgs, db_schema=db_schema)
+        )
+
+    async def _prepare(self, question: str, history_msgs=None, use_cache: bool = True):
+        """
+        Gera e executa o SQL (incluindo o fallback de busca aproximada).
+
+        Gerador assíncrono de eventos: ("sql", sql) sempre que um SQL é definido e, por
+        último, ("prepared", (sql, result, clarification)).
+        """
         clarification = None
-        # 1. IA gera SQL
-        sql_prompt = SQLGenerator.build_sql_prompt(question, self.db_schema)
-        sql = self.ai.ask(sql_prompt, history=history_msgs)
-        sql_clean = sql.replace('```sql', '').replace('```', '').strip()
-        # 2. Executa SQL no banco externo
-        try:
-            conn = get_external_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(sql_clean)
-                result = cursor.fetchall()
-        except Exception as e:
-            logging.getLogger(__name__).exception("Falha ao executar SQL gerado")
-            clarification = (
-                "Sua pergunta não foi clara ou não foi possível gerar uma consulta válida. "
-                "Você pode reformular ou dar mais detalhes?"
-            )
-            return clarification, sql_clean, None, clarification
-        finally:
+        # 0. Cache pergunta -> SQL (somente sem histórico: follow-ups dependem do contexto)
+        cache_key = None
+        cached_sql = None
+        if use_cache and not history_msgs and question_cache_enabled():
+            cache_key = question_cache.make_key(question, self.schema_fp)
+            with stage("question_cache"):
+                cached_sql = await question_cache.aget(cache_key)
+        if cached_sql:
+            sql_clean = cached_sql
             try:
-                conn.close()
-            except:
-                pass
+                with stage("sql_execution"):
+                    result = await cached_fetch_bounded_async(sql_clean, self.schema_fp, use_cache)
+                observe_result(result)
+                yield "sql", sql_clean
+            except Exception:
+                logging.getLogger(__name__).warning("SQL em cache falhou; gerando novamente", exc_info=True)
+                await question_cache.ainvalidate(cache_key)
+                cached_sql = None
+        question_schema = None
+        if not cached_sql:
+            # 1. IA gera SQL (com o schema reduzido às tabelas relevantes, quando aplicável)
+            with stage("schema_retrieval"):
+                question_schema = self.schema_for_question(question, history_msgs)
+            sql_prompt = SQLGenerator.build_sql_prompt(question)
+            with stage("sql_generation"):
+                sql = await self._generate_sql(
+                    normalize_question(question), sql_prompt, history_msgs, question_schema
+                )
+            sql_clean = sql.replace('```sql', '').replace('```', '').strip()
+            yield "sql", sql_clean
+            # 2. Executa SQL no banco externo
+            try:
+                with stage("sql_execution"):
+                    result = await cached_fetch_bounded_async(sql_clean, self.schema_fp, use_cache)
+                observe_result(result)
+            except SQLGuardError as e:
+                logging.getLogger(__name__).warning("SQL gerado rejeitado pelo guard: %s", e)
+                yield "prepared", (sql_clean, None, str(e))
+                return
+            except Exception as e:
+                logging.getLogger(__name__).exception("Falha ao executar SQL gerado")
+                clarification = (
+                    "Sua pergunta não foi clara ou não foi possível gerar uma consulta válida. "
+                    "Você pode reformular ou dar mais detalhes?"
+                )
+                yield "prepared", (sql_clean, None, clarification)
+                return
+            if result.limit_added:
+                # O guard limitou a consulta: reporta o SQL realmente executado
+                sql_clean = result.sql
+                yield "sql", sql_clean
+            if result.rows and cache_key:
+                await question_cache.aset(cache_key, question, sql_clean)
         # 3. Se resultado vazio, tenta busca aproximada e mostra amostra dos dados
-        if not result:
-            # Tenta identificar a(s) tabela(s) do SQL
-            import re
-            tables = re.findall(r'from\s+([\w_]+)', sql_clean, re.IGNORECASE)
-            if not tables:
-                tables = re.findall(r'join\s+([\w_]+)', sql_clean, re.IGNORECASE)
-            sample_data = {}
-            for table in set(tables):
-                try:
-                    conn = get_external_connection()
-                    with conn.cursor() as cursor:
-                        cursor.execute(f"SELECT * FROM {table} LIMIT 10")
-                        sample_data[table] = cursor.fetchall()
-                except Exception:
-                    sample_data[table] = []
-                finally:
-                    try:
-                        conn.close()
-                    except:
-                        pass
+        if not result.rows:
+            with stage("fuzzy_samples"):
+                sample_data = await self.sample_data_for(sql_clean)
             # Prompt para IA tentar nova consulta baseada nos dados reais
             fuzzy_prompt = (
                 f"A consulta SQL abaixo não retornou resultados:\n{sql_clean}\n"
-                f"Aqui estão exemplos reais de dados das tabelas envolvidas: {sample_data}\n"
+                f"Aqui estão exemplos reais de dados das tabelas envolvidas:\n{sample_data}\n"
                 "Gere um novo SQL para buscar por aproximação (usando LIKE, %palavra%, ou funções de similaridade) "
                 "ou adapte a consulta para tentar encontrar registros relacionados à pergunta. Não explique, apenas gere o SQL puro."
             )
-            fuzzy_sql = self.ai.ask(fuzzy_prompt, history=history_msgs)
+            if question_schema is None:
+                with stage("schema_retrieval"):
+                    question_schema = self.schema_for_question(question, history_msgs)
+            with stage("fuzzy_sql_generation"):
+                fuzzy_sql = await self._generate_sql(fuzzy_prompt, fuzzy_prompt, history_msgs, question_schema)
             fuzzy_sql_clean = fuzzy_sql.replace('```sql', '').replace('```', '').strip()
+            yield "sql", fuzzy_sql_clean
             try:
-                conn = get_external_connection()
-                with conn.cursor() as cursor:
-                    cursor.execute(fuzzy_sql_clean)
-                    fuzzy_result = cursor.fetchall()
+                with stage("fuzzy_sql_execution"):
+                    fuzzy_result = await cached_fetch_bounded_async(fuzzy_sql_clean, self.schema_fp, use_cache)
+                observe_result(fuzzy_result)
+            except SQLGuardError as e:
+                logging.getLogger(__name__).warning("SQL de busca aproximada rejeitado pelo guard: %s", e)
+                yield "prepared", (fuzzy_sql_clean, None, str(e))
+                return
             except Exception as e:
                 logging.getLogger(__name__).exception("Falha ao executar SQL de busca aproximada")
                 clarification = (
                     "Nenhum resultado encontrado e não foi possível realizar uma busca por aproximação no momento."
                 )
-                return clarification, fuzzy_sql_clean, None, clarification
-            finally:
-                try:
-                    conn.close()
-                except:
-                    pass
+                yield "prepared", (fuzzy_sql_clean, None, clarification)
+                return
+            if fuzzy_result.limit_added:
+                fuzzy_sql_clean = fuzzy_result.sql
+                yield "sql", fuzzy_sql_clean
+            if fuzzy_result.rows and cache_key:
+                await question_cache.aset(cache_key, question, fuzzy_sql_clean)
             # IA responde baseado no resultado fuzzy
-            answer = self.ai.answer(question, fuzzy_result)
-            return answer, fuzzy_sql_clean, fuzzy_result, clarification
+            yield "prepared", (fuzzy_sql_clean, fuzzy_result, clarification)
+            return
         # 4. IA responde baseado no resultado do SQL original
-        answer = self.ai.answer(question, result)
-        return answer, sql_clean, result, clarification
\ No newline at end of file
+        yield "prepared", (sql_clean, result, clarification)
+
+    async def ask(self, question: str, history_msgs=None, use_cache: bool = True):
+        async for event, data in self._prepare(question, history_msgs, use_cache):
+            if event == "prepared":
+                sql, result, clarification = data
+        if clarification:
+            return clarification, sql, None, clarification
+        with stage("answer"):
+            answer = await self.ai.answer(question, result)
+        return answer, sql, result, clarification
+
+    async def ask_stream(self, question: str, history_msgs=None, use_cache: bool = True):
+        """
+        Variante em streaming de ask. Gera eventos (nome, dados):
+        "sql" (SQL gerado), "result" (metadados do resultado), "token" (trechos da
+        resposta conforme a IA gera) e por fim "answer" com a resposta completa.
+        """
+        async for event, data in self._prepare(question, history_msgs, use_cache):
+            if event == "sql":
+                yield "sql", {"sql": data}
+            elif event == "prepared":
+                sql, result, clarification = data
+        yield "result", result.meta() if result is not None else QueryResult().meta()
+        if clarification:
+            yield "answer", {"answer": clarification, "sql": sql, "clarification": clarification}
+            return
+        parts = []
+        with stage("answer"):
+            async for token in self.ai.answer_stream(question, result):
+                parts.append(token)
+                yield "token", {"text": token}
+        yield "answer", {"answer": "".join(parts), "sql": sql, "clarification": None}
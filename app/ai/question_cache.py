@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timezone
+from typing import Optional
+
+
+def normalize_question(question: str) -> str:
+    """Normaliza a pergunta para comparação: minúsculas, sem acentos, sem pontuação e espaços extras."""
+    text = unicodedata.normalize("NFKD", question or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def _business_rules_hash() -> str:
+    rules = os.getenv("BUSINESS_RULES_PROMPT", "").strip()
+    return hashlib.sha256(rules.encode("utf-8")).hexdigest()[:16]
+
+
+class QuestionCache:
+    """
+    Cache pergunta normalizada -> SQL que já executou com sucesso.
+
+    A chave inclui o fingerprint do schema e o hash das regras de negócio, então
+    mudanças em qualquer um dos dois invalidam naturalmente as entradas antigas.
+    Eviction por LRU (max_entries) e TTL; opcionalmente persiste na tabela
+    question_cache do banco interno para sobreviver a restarts.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, persist: bool = False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, question: str, schema_fp: str) -> str:
+        raw = f"{normalize_question(question)}|{schema_fp}|{_business_rules_hash()}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds > 0 and (time.time() - stored_at) > self.ttl_seconds
+
+    def _remember(self, key: str, sql: str, stored_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (sql, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self._expired(item[1]):
+                del self._entries[key]
+                item = None
+            if item is not None:
+                self._entries.move_to_end(key)
+        if item is None and self.persist:
+            item = self._load_persisted(key)
+            if item is not None:
+                self._remember(key, *item)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, question: str, sql: str) -> None:
+        self._remember(key, sql, time.time())
+        if self.persist:
+            self._run_persisted("save_question_cache_entry", key, question, sql)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.persist:
+            self._run_persisted("delete_question_cache_entry", key)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
+
+    # Versões assíncronas (a persistência acessa o banco interno de forma síncrona)
+    async def aget(self, key: str) -> Optional[str]:
+        if not self.persist:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, question: str, sql: str) -> None:
+        if not self.persist:
+            return self.set(key, question, sql)
+        await asyncio.to_thread(self.set, key, question, sql)
+
+    async def ainvalidate(self, key: str) -> None:
+        if not self.persist:
+            return self.invalidate(key)
+        await asyncio.to_thread(self.invalidate, key)
+
+    def _load_persisted(self, key: str) -> Optional[tuple[str, float]]:
+        from app import crud
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            entry = crud.get_question_cache_entry(db, key)
+            if entry is None:
+                return None
+            stored_at = entry.created_at.replace(tzinfo=timezone.utc).timestamp() if entry.created_at else time.time()
+            if self._expired(stored_at):
+                return None
+            return entry.sql, stored_at
+        except Exception:
+            logging.getLogger(__name__).exception("Falha ao ler cache de perguntas persistido")
+            return None
+        finally:
+            db.close()
+
+    def _run_persisted(self, func_name: str, *args) -> None:
+        from app import crud
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            getattr(crud, func_name)(db, *args)
+        except Exception:
+            logging.getLogger(__name__).exception("Falha ao gravar cache de perguntas persistido")
+        finally:
+            db.close()
+
+
+question_cache = QuestionCache(
+    max_entries=int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("QUESTION_CACHE_TTL_SECONDS", "86400")),
+    persist=os.getenv("QUESTION_CACHE_PERSIST", "false").lower() in ("1", "true", "yes"),
+)
+
+
+def question_cache_enabled() -> bool:
+    return os.getenv("QUESTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
@@ -0,0 +1,117 @@
+import csv
+import io
+import math
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token), suficiente para orçamento de prompt."""
+    return math.ceil(len(text) / 4)
+
+
+def format_value(value: Any) -> str:
+    """Formata um valor de forma compacta (sem o ruído de repr como Decimal('...') ou datetime.datetime(...))."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Decimal):
+        text = format(value.normalize(), "f")
+        return "0" if text in ("-0", "") else text
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    if isinstance(value, datetime):
+        if value.time() == time(0, 0) and value.tzinfo is None:
+            return value.date().isoformat()
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    return " ".join(str(value).split())
+
+
+def _table(columns: Sequence[str], rows: Sequence[Dict[str, Any]]) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([format_value(row.get(c)) for c in columns])
+    return buf.getvalue().rstrip("\n")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _column_summary(name: str, values: List[Any]) -> str:
+    non_null = [v for v in values if v is not None]
+    nulls = len(values) - len(non_null)
+    parts = [name + ":"]
+    if non_null and all(_is_number(v) for v in non_null):
+        total = sum(Decimal(str(v)) for v in non_null)
+        parts.append(
+            f"min={format_value(min(non_null))} max={format_value(max(non_null))} "
+            f"soma={format_value(total)} média={format_value(total / len(non_null))}"
+        )
+    elif non_null and all(isinstance(v, (date, datetime)) for v in non_null):
+        parts.append(f"min={format_value(min(non_null))} max={format_value(max(non_null))}")
+    else:
+        counts: Dict[str, int] = {}
+        for v in non_null:
+            key = format_value(v)[:40]
+            counts[key] = counts.get(key, 0) + 1
+        top = sorted(counts.items(), key=lambda kv: -kv[1])[:3]
+        parts.append(f"distintos={len(counts)}")
+        if top:
+            parts.append("mais frequentes=" + "; ".join(f"{k} ({n})" for k, n in top))
+    if nulls:
+        parts.append(f"nulos={nulls}")
+    return " ".join(parts)
+
+
+def encode_result(
+    rows: Sequence[Dict[str, Any]],
+    columns: Optional[Sequence[str]] = None,
+    token_budget: Optional[int] = None,
+    note: Optional[str] = None,
+) -> str:
+    """
+    Serializa o resultado como tabela CSV (cabeçalho uma única vez) para o prompt da resposta.
+
+    Se a tabela completa passar do orçamento de tokens (ANSWER_RESULT_TOKEN_BUDGET), envia
+    um resumo: agregados por coluna e as primeiras/últimas linhas que couberem.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("ANSWER_RESULT_TOKEN_BUDGET", "3000"))
+    if columns is None:
+        columns = list(rows[0].keys()) if rows else []
+    header = f"{note}\n" if note else ""
+    if not rows:
+        return header + "(nenhuma linha)"
+
+    full = header + _table(columns, rows)
+    if estimate_tokens(full) <= token_budget:
+        return full
+
+    summary_lines = [f"{len(rows)} linhas; resumo por coluna:"]
+    summary_lines.extend("- " + _column_summary(c, [r.get(c) for r in rows]) for c in columns)
+    summary = header + "\n".join(summary_lines)
+
+    edge = int(os.getenv("ANSWER_RESULT_EDGE_ROWS", "10"))
+    while edge > 0:
+        if len(rows) <= 2 * edge:
+            sample = _table(columns, rows)
+            text = f"{summary}\nLinhas:\n{sample}"
+        else:
+            head = _table(columns, rows[:edge])
+            tail = _table(columns, rows[-edge:]).split("\n", 1)[1]
+            omitted = len(rows) - 2 * edge
+            text = f"{summary}\nPrimeiras e últimas {edge} linhas:\n{head}\n... ({omitted} linhas omitidas) ...\n{tail}"
+        if estimate_tokens(text) <= token_budget:
+            return text
+        edge //= 2
+    return summary
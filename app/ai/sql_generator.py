@@ -1,20 +1,6 @@
 class SQLGenerator:
     @staticmethod
-    def build_sql_prompt(question: str, db_schema: str) -> str:
-        return f"""
-Abaixo está a estrutura do banco de dados:
-{db_schema}
-
-Pergunta do usuário: {question}
-
-Gere apenas um único SQL SELECT, sem explicações, obedecendo às regras:
-- Use somente colunas/tabelas/relacionamentos presentes no schema e exemplos acima.
-- Não use LIMIT dentro de subqueries em IN/ALL/ANY/SOME; se precisar limitar, reescreva com JOIN/CTE ou limite na query externa.
-- Em subqueries que podem retornar múltiplos valores, use IN ao invés de '='.
-- Evite funções ou features não suportadas pela versão MySQL padrão.
-- Para ordenações customizadas (ex.: maior prioridade), use FIELD(...) ou CASE respeitando os valores reais.
-- Se precisar identificar registros por nome informado na pergunta, filtre por LIKE '%valor%'.
-- Todo alias de coluna deve ser um identificador simples (sem vírgulas) e cada expressão no SELECT deve ser válida no MySQL.
-- Se usar agregações (SUM/COUNT/etc.), inclua as colunas não agregadas no GROUP BY conforme necessário pelo MySQL.
-- Não inclua markdown (```), nem comentários; retorne apenas o SQL executável.
-"""
+    def build_sql_prompt(question: str) -> str:
+        # Schema e regras de formato já vão no prompt de sistema (build_initial_prompt);
+        # aqui fica só a parte variável, sempre no fim das mensagens
+        return f"Pergunta do usuário: {question}"
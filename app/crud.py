@@ -1,6 +1,7 @@
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, or_, select
+from datetime import datetime
 from . import models
 
 def create_session(db: Session):
@@ -10,73 +11,178 @@ def create_session(db: Session):
     db.refresh(db_session)
     return db_session
 
+def create_sessions(db: Session, count: int):
+    """Cria `count` sessões em uma única transação. Retorna os ids."""
+    db_sessions = [models.Session() for _ in range(count)]
+    db.add_all(db_sessions)
+    db.flush()
+    ids = [s.id for s in db_sessions]
+    db.commit()
+    return ids
+
 def get_session(db: Session, session_id: int):
     return db.query(models.Session).filter(models.Session.id == session_id).first()
 
-def create_history(db: Session, question: str, answer: str, session_id: int):
-    db_history = models.History(question=question, answer=answer, session_id=session_id)
+def create_history(db: Session, question: str, answer: str, session_id: int, sql: str | None = None):
+    db_history = models.History(question=question, answer=answer, session_id=session_id, sql=sql)
     db.add(db_history)
     db.commit()
     db.refresh(db_history)
     return db_history
 
+def create_histories(db: Session, entries):
+    """Grava vários registros (question, answer, session_id, sql) em uma única transação. Retorna os ids."""
+    db_histories = [models.History(question=q, answer=a, session_id=s, sql=sql) for q, a, s, sql in entries]
+    db.add_all(db_histories)
+    db.flush()
+    ids = [h.id for h in db_histories]
+    db.commit()
+    return ids
+
 def get_history_by_session(db: Session, session_id: int):
     return db.query(models.History).filter(models.History.session_id == session_id).order_by(models.History.created_at).all()
 
-def get_last_histories_by_session(db: Session, session_id: int, limit_pairs: int):
-    """Retorna as últimas N entradas de histórico (pares pergunta/resposta), ordenadas do mais antigo para o mais recente."""
+def get_last_histories_by_session(db: Session, session_id: int, limit_pairs: int, after_id: int | None = None):
+    """
+    Retorna as últimas N entradas de histórico (pares pergunta/resposta), ordenadas do mais
+    antigo para o mais recente. after_id: só entradas com id maior (ainda fora do resumo).
+    """
     if limit_pairs is None or limit_pairs <= 0:
         return []
-    q = (
-        db.query(models.History)
-        .filter(models.History.session_id == session_id)
-        .order_by(models.History.created_at.desc())
-        .limit(limit_pairs)
-        .all()
-    )
+    # Leitura direta pelo índice (session_id, created_at, id), sem filesort
+    q = db.query(models.History).filter(models.History.session_id == session_id)
+    if after_id:
+        q = q.filter(models.History.id > after_id)
+    q = q.order_by(models.History.created_at.desc(), models.History.id.desc()).limit(limit_pairs).all()
     return list(reversed(q))
 
-def prune_history(db: Session, max_rows: int):
-    """Mantém no máximo max_rows registros em history (global), removendo os mais antigos."""
-    if not max_rows or max_rows <= 0:
-        return 0
-    total = db.query(func.count(models.History.id)).scalar() or 0
-    if total <= max_rows:
-        return 0
-    to_delete = total - max_rows
-    # Seleciona os ids mais antigos para apagar
-    old_ids = (
-        db.query(models.History.id)
-        .order_by(models.History.created_at.asc(), models.History.id.asc())
-        .limit(to_delete)
-        .all()
+def get_histories_after(db: Session, session_id: int, after_id: int | None, limit: int | None = None):
+    """Entradas da sessão com id > after_id (ainda fora do resumo), da mais antiga para a mais recente."""
+    q = db.query(models.History).filter(models.History.session_id == session_id)
+    if after_id:
+        q = q.filter(models.History.id > after_id)
+    q = q.order_by(models.History.created_at.asc(), models.History.id.asc())
+    if limit:
+        q = q.limit(limit)
+    return q.all()
+
+def update_session_summary(db: Session, session_id: int, summary: str, upto_history_id: int):
+    """Grava o resumo da sessão, desde que avance sobre o já gravado (resumos concorrentes não regridem)."""
+    updated = (
+        db.query(models.Session)
+        .filter(
+            models.Session.id == session_id,
+            or_(models.Session.summary_history_id.is_(None), models.Session.summary_history_id < upto_history_id),
+        )
+        .update({"summary": summary, "summary_history_id": upto_history_id}, synchronize_session=False)
     )
-    old_ids = [row[0] for row in old_ids]
-    if old_ids:
-        db.query(models.History).filter(models.History.id.in_(old_ids)).delete(synchronize_session=False)
-        db.commit()
-    return len(old_ids)
+    db.commit()
+    return updated
 
-def prune_sessions(db: Session, max_sessions: int):
-    """Mantém no máximo max_sessions em session (global). Remove as mais antigas e seus históricos."""
-    if not max_sessions or max_sessions <= 0:
-        return 0
-    total = db.query(func.count(models.Session.id)).scalar() or 0
-    if total <= max_sessions:
-        return 0
-    to_delete = total - max_sessions
-    old_sessions = (
-        db.query(models.Session.id)
-        .order_by(models.Session.created_at.asc(), models.Session.id.asc())
-        .limit(to_delete)
-        .all()
+def _keep_newest_cutoff(db: Session, model, keep: int):
+    """
+    Retorna (created_at, id) da linha mais nova a ser removida para manter apenas as `keep`
+    mais recentes, ou None se não há excedente. Percorre só `keep` entradas do índice
+    (created_at, id), sem COUNT(*) na tabela inteira.
+    """
+    return (
+        db.query(model.created_at, model.id)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .offset(keep)
+        .limit(1)
+        .first()
+    )
+
+def _at_or_before(model, cutoff):
+    """Predicado de faixa (created_at, id) <= corte, escrito para usar o índice (created_at, id)."""
+    created_at, row_id = cutoff
+    if created_at is None:
+        return and_(model.created_at.is_(None), model.id <= row_id)
+    return or_(
+        model.created_at.is_(None),
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id <= row_id),
+    )
+
+def _prune_cutoff(db: Session, model, keep: int | None, older_than: datetime | None):
+    """Corte final da retenção: o maior entre o limite por quantidade e o limite por idade."""
+    cutoffs = []
+    if keep and keep > 0:
+        cutoff = _keep_newest_cutoff(db, model, keep)
+        if cutoff is not None:
+            cutoffs.append(tuple(cutoff))
+    if older_than is not None:
+        # created_at < older_than  <=>  (created_at, id) <= (older_than, 0)
+        cutoffs.append((older_than, 0))
+    if not cutoffs:
+        return None
+    return max(cutoffs, key=lambda c: (c[0] is not None, c[0] or datetime.min, c[1]))
+
+def _batch_watermark(db: Session, model, cutoff, batch_size: int):
+    """(created_at, id) da última linha do próximo lote (as batch_size mais antigas até o corte)."""
+    row = (
+        db.query(model.created_at, model.id)
+        .filter(_at_or_before(model, cutoff))
+        .order_by(model.created_at.asc(), model.id.asc())
+        .offset(batch_size - 1)
+        .limit(1)
+        .first()
     )
-    old_session_ids = [row[0] for row in old_sessions]
-    if not old_session_ids:
+    return tuple(row) if row is not None else cutoff
+
+def prune_history(db: Session, max_rows: int | None, batch_size: int | None = None, older_than: datetime | None = None):
+    """
+    Mantém no máximo max_rows registros em history (global) e, se informado, remove os
+    anteriores a older_than. Apaga em lotes de até batch_size linhas (um commit por lote),
+    sempre por faixa (created_at, id) <= marca d'água.
+    """
+    cutoff = _prune_cutoff(db, models.History, max_rows, older_than)
+    if cutoff is None:
         return 0
-    # Apaga históricos dessas sessões primeiro
-    db.query(models.History).filter(models.History.session_id.in_(old_session_ids)).delete(synchronize_session=False)
-    # Depois apaga as sessões
-    db.query(models.Session).filter(models.Session.id.in_(old_session_ids)).delete(synchronize_session=False)
+    deleted = 0
+    while True:
+        watermark = _batch_watermark(db, models.History, cutoff, batch_size) if batch_size else cutoff
+        n = db.query(models.History).filter(_at_or_before(models.History, watermark)).delete(synchronize_session=False)
+        db.commit()
+        deleted += n
+        if watermark == cutoff or n == 0:
+            return deleted
+
+def prune_sessions(db: Session, max_sessions: int | None, batch_size: int | None = None, older_than: datetime | None = None):
+    """Mantém no máximo max_sessions em session (global). Remove as mais antigas e seus históricos, em lotes."""
+    cutoff = _prune_cutoff(db, models.Session, max_sessions, older_than)
+    if cutoff is None:
+        return 0
+    deleted = 0
+    while True:
+        watermark = _batch_watermark(db, models.Session, cutoff, batch_size) if batch_size else cutoff
+        old_sessions = select(models.Session.id).where(_at_or_before(models.Session, watermark))
+        # Apaga históricos dessas sessões primeiro
+        db.query(models.History).filter(models.History.session_id.in_(old_sessions)).delete(synchronize_session=False)
+        # Depois apaga as sessões
+        n = db.query(models.Session).filter(_at_or_before(models.Session, watermark)).delete(synchronize_session=False)
+        db.commit()
+        deleted += n
+        if watermark == cutoff or n == 0:
+            return deleted
+
+def get_question_cache_entry(db: Session, cache_key: str):
+    return db.query(models.QuestionCache).filter(models.QuestionCache.cache_key == cache_key).first()
+
+def save_question_cache_entry(db: Session, cache_key: str, question: str, sql: str):
+    """Insere ou atualiza o SQL validado para a chave de cache da pergunta."""
+    entry = get_question_cache_entry(db, cache_key)
+    if entry is None:
+        entry = models.QuestionCache(cache_key=cache_key, question=question, sql=sql)
+        db.add(entry)
+    else:
+        entry.question = question
+        entry.sql = sql
+        entry.created_at = datetime.utcnow()
+    db.commit()
+    return entry
+
+def delete_question_cache_entry(db: Session, cache_key: str):
+    deleted = db.query(models.QuestionCache).filter(models.QuestionCache.cache_key == cache_key).delete(synchronize_session=False)
     db.commit()
-    return len(old_session_ids)
+    return deleted
@@ -1,5 +1,12 @@
+import math
 import os
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+# Engines compartilhados por processo (um pool por servidor de cada banco externo)
+_ENGINES: dict[str, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
 
 def get_external_connection():
     type_db = os.getenv("TYPE_DB", "mysql").lower()
@@ -59,9 +66,91 @@ def get_sqlserver_connection():
     )
     return pyodbc.connect(conn_str)
 
-def get_sqlalchemy_engine():
+def _pool_options() -> dict:
+    """Parâmetros do pool de conexões do banco externo (configuráveis via ENV)."""
+    return {
+        "pool_size": int(os.getenv("EXT_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("EXT_POOL_MAX_OVERFLOW", "10")),
+        "pool_recycle": int(os.getenv("EXT_POOL_RECYCLE", "1800")),
+        "pool_timeout": int(os.getenv("EXT_POOL_TIMEOUT", "30")),
+        "pool_pre_ping": os.getenv("EXT_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+
+def _cached_engine(key: str, factory) -> Engine:
+    """Engine do processo para a chave, criado na primeira chamada (double-checked lock)."""
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = _ENGINES[key] = factory()
+        return engine
+
+
+def get_sqlalchemy_engine() -> Engine:
+    """
+    Retorna o SQLAlchemy Engine (com pool) do primário do banco externo atual
+    (app.db_external.targets; sem DB_TARGETS_FILE, o configurado por TYPE_DB).
+
+    O Engine é criado uma única vez por processo e reutilizado por todas as
+    consultas (introspecção e pipeline), evitando o handshake de conexão a cada SQL.
+    """
+    from .targets import current_target
+
+    return current_target().primary.engine()
+
+
+def connection_identity() -> str:
+    """Identifica o banco externo em uso (dialeto + URL sem senha), para chaves de cache."""
+    engine = get_sqlalchemy_engine()
+    return f"{engine.dialect.name}|{engine.url.render_as_string(hide_password=True)}"
+
+
+def _install_statement_timeout(engine: Engine) -> None:
+    """
+    Limite de tempo por statement (EXT_STATEMENT_TIMEOUT_MS, 0 desativa), aplicado uma vez
+    por conexão física do pool: MAX_EXECUTION_TIME (MySQL), statement_timeout (PostgreSQL),
+    call_timeout (Oracle) e timeout de query do ODBC (SQL Server).
+    """
+    timeout_ms = int(os.getenv("EXT_STATEMENT_TIMEOUT_MS", "30000"))
+    if timeout_ms <= 0:
+        return
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, "connect")
+    def _set_timeout(dbapi_conn, connection_record):
+        if dialect in ("mysql", "postgresql"):
+            sql = (
+                f"SET SESSION MAX_EXECUTION_TIME = {timeout_ms}"
+                if dialect == "mysql"
+                else f"SET statement_timeout = {timeout_ms}"
+            )
+            cursor = dbapi_conn.cursor()
+            try:
+                cursor.execute(sql)
+            finally:
+                cursor.close()
+            if dialect == "postgresql":
+                dbapi_conn.commit()
+        elif dialect == "oracle":
+            dbapi_conn.call_timeout = timeout_ms
+        elif dialect == "mssql":
+            dbapi_conn.timeout = max(1, math.ceil(timeout_ms / 1000))
+
+
+def dispose_engines() -> None:
+    """Fecha os pools abertos (ex.: no shutdown da aplicação)."""
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+
+
+def _create_sqlalchemy_engine(type_db: str) -> Engine:
     """Cria um SQLAlchemy Engine baseado nas mesmas variáveis de ambiente do get_external_connection."""
-    type_db = os.getenv("TYPE_DB", "mysql").lower()
+    pool = _pool_options()
     if type_db == "mysql":
         import pymysql  # ensure driver installed
         user = os.getenv("EXT_MYSQL_USER")
@@ -73,7 +162,7 @@ def get_sqlalchemy_engine():
         return create_engine(
             url,
             connect_args={"connect_timeout": 5},
-            pool_pre_ping=True,
+            **pool,
         )
     if type_db == "postgresql":
         import psycopg2  # ensure driver installed
@@ -84,7 +173,7 @@ def get_sqlalchemy_engine():
         db = os.getenv("EXT_PG_DB")
         # connect_timeout funciona passado no DSN
         url = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}?connect_timeout=5"
-        return create_engine(url, pool_pre_ping=True)
+        return create_engine(url, **pool)
     if type_db == "oracle":
         import oracledb  # ensure driver installed
         user = os.getenv("EXT_ORACLE_USER")
@@ -94,7 +183,7 @@ def get_sqlalchemy_engine():
         service = os.getenv("EXT_ORACLE_SERVICE")
         # SQLAlchemy usa 'oracle+oracledb' para o driver novo
         url = f"oracle+oracledb://{user}:{pwd}@{host}:{port}/?service_name={service}"
-        return create_engine(url, connect_args={"timeout": 5}, pool_pre_ping=True)
+        return create_engine(url, connect_args={"timeout": 5}, **pool)
     if type_db == "sqlserver":
         import pyodbc  # ensure driver installed
         user = os.getenv("EXT_MSSQL_USER")
@@ -106,5 +195,9 @@ def get_sqlalchemy_engine():
         # Connection Timeout (segundos) via ODBC
         params = f"driver={driver}&TrustServerCertificate=yes&Connection+Timeout=5"
         url = f"mssql+pyodbc://{user}:{pwd}@{host}:{port}/{db}?{params}"
-        return create_engine(url, pool_pre_ping=True)
+        return create_engine(url, **pool)
+    if type_db == "sqlite":
+        # Arquivo local (benchmarks e desenvolvimento sem servidor de banco)
+        path = os.getenv("EXT_SQLITE_PATH", "external.db")
+        return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, **pool)
     raise ValueError(f"Banco não suportado: {type_db}")
\ No newline at end of file
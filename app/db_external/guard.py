@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError
+from sqlglot import exp
+
+from app.metrics import registry
+
+from .sql_parse import parse_statements, sqlglot_dialect
+
+# Nós que nunca podem aparecer num SQL gerado (escrita, DDL, comandos do SGBD)
+_FORBIDDEN_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+    exp.Alter, exp.Command, exp.Into, exp.TruncateTable,
+)
+# Dialetos cujo EXPLAIN escreve no banco (PLAN_TABLE) e por isso roda no primário
+_EXPLAIN_WRITES = {"oracle"}
+
+EXPLAIN_SKIPPED = registry.counter(
+    "sql_guard_explain_skipped_total", "Consultas que rodaram sem estimativa do guard porque o EXPLAIN falhou.", ("dialect",)
+)
+
+
+class SQLGuardError(Exception):
+    """SQL rejeitado antes da execução. A mensagem pode ser mostrada ao usuário."""
+
+
+@dataclass
+class GuardResult:
+    sql: str
+    estimated_rows: Optional[float] = None
+    estimated_cost: Optional[float] = None
+    limit_added: bool = False
+
+
+def validate_select(sql: str, dialect_name: Optional[str]) -> exp.Expression:
+    """Aceita apenas um único statement de leitura (SELECT/UNION/CTE); devolve a árvore do parse."""
+    try:
+        statements = parse_statements(sql, dialect_name)
+    except Exception as e:
+        raise SQLGuardError(f"SQL inválido: {e}")
+    if len(statements) != 1:
+        raise SQLGuardError("Apenas um único comando SQL é permitido.")
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        raise SQLGuardError("Apenas consultas SELECT são permitidas.")
+    if any(True for _ in tree.find_all(*_FORBIDDEN_NODES)):
+        raise SQLGuardError("Apenas consultas SELECT são permitidas.")
+    return tree
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Operações do MySQL que envolvem o resultado do bloco sem mudar a quantidade de linhas
+_MYSQL_WRAPPERS = ("ordering_operation", "windowing")
+
+
+def _mysql_output_rows(block: dict) -> Optional[float]:
+    """
+    Linhas que um query_block do EXPLAIN FORMAT=JSON do MySQL devolve: o
+    rows_produced_per_join da última tabela do bloco mais externo (as das tabelas
+    internas contam linhas examinadas a cada passo do join, não a saída). None quando o
+    bloco agrupa (GROUP BY/DISTINCT) ou não tem tabelas: o MySQL não estima essa saída.
+    """
+    while True:
+        wrapper = next((k for k in _MYSQL_WRAPPERS if k in block), None)
+        if wrapper is None:
+            break
+        block = block[wrapper]
+    if "grouping_operation" in block or "duplicates_removal" in block:
+        return None
+    if "union_result" in block:
+        specs = block["union_result"].get("query_specifications") or []
+        rows = [_mysql_output_rows(spec.get("query_block") or {}) for spec in specs]
+        return sum(rows) if rows and None not in rows else None
+    if "nested_loop" in block:
+        block = block["nested_loop"][-1] if block["nested_loop"] else {}
+    return _float((block.get("table") or {}).get("rows_produced_per_join"))
+
+
+def explain_estimate(conn, sql: str, dialect_name: str) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Estima (linhas, custo) do SQL com o EXPLAIN do dialeto, sem executá-lo:
+    EXPLAIN FORMAT=JSON (MySQL), EXPLAIN (FORMAT JSON) (PostgreSQL), EXPLAIN PLAN +
+    PLAN_TABLE (Oracle) e SHOWPLAN_XML (SQL Server). (None, None) se não suportado.
+    """
+    raw = conn.execution_options(no_parameters=True)
+    if dialect_name == "mysql":
+        plan = json.loads(raw.exec_driver_sql(f"EXPLAIN FORMAT=JSON {sql}").scalar())
+        block = plan.get("query_block", {})
+        return _mysql_output_rows(block), _float(block.get("cost_info", {}).get("query_cost"))
+    if dialect_name == "postgresql":
+        plan = raw.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]["Plan"]
+        return _float(top.get("Plan Rows")), _float(top.get("Total Cost"))
+    if dialect_name == "oracle":
+        statement_id = uuid.uuid4().hex[:30]
+        raw.exec_driver_sql(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}")
+        try:
+            row = raw.exec_driver_sql(
+                f"SELECT CARDINALITY, COST FROM PLAN_TABLE WHERE STATEMENT_ID = '{statement_id}' AND ID = 0"
+            ).first()
+        finally:
+            raw.exec_driver_sql(f"DELETE FROM PLAN_TABLE WHERE STATEMENT_ID = '{statement_id}'")
+        return (_float(row[0]), _float(row[1])) if row else (None, None)
+    if dialect_name == "mssql":
+        raw.exec_driver_sql("SET SHOWPLAN_XML ON")
+        try:
+            xml = raw.exec_driver_sql(sql).scalar() or ""
+        finally:
+            raw.exec_driver_sql("SET SHOWPLAN_XML OFF")
+        rows = re.search(r'StatementEstRows="([\d.eE+-]+)"', xml)
+        cost = re.search(r'StatementSubTreeCost="([\d.eE+-]+)"', xml)
+        return (_float(rows.group(1)) if rows else None, _float(cost.group(1)) if cost else None)
+    return None, None
+
+
+def explain_needs_primary(dialect_name: str) -> bool:
+    """True se o EXPLAIN do dialeto escreve no banco e não pode rodar numa réplica."""
+    return dialect_name in _EXPLAIN_WRITES
+
+
+def _single_row_aggregate(tree: exp.Expression) -> bool:
+    """SELECT com agregação e sem GROUP BY: devolve exatamente uma linha."""
+    if not isinstance(tree, exp.Select) or tree.args.get("group"):
+        return False
+    return any(
+        agg.find_ancestor(exp.Window) is None and agg.find_ancestor(exp.Select) is tree
+        for projection in tree.expressions
+        for agg in projection.find_all(exp.AggFunc)
+    )
+
+
+def _current_limit(tree: exp.Expression) -> Optional[int]:
+    limit = tree.args.get("limit") or tree.args.get("fetch")
+    if limit is None:
+        return None
+    value = limit.args.get("expression") or limit.args.get("count")
+    try:
+        return int(value.name) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def guard_sql(conn, sql: str, dialect_name: str) -> GuardResult:
+    """
+    Valida e estima o custo do SQL antes de executá-lo.
+
+    - Rejeita o que não for um único SELECT.
+    - Com SQL_GUARD_EXPLAIN, estima linhas/custo via EXPLAIN. Custo acima de
+      SQL_GUARD_MAX_COST é rejeitado; linhas devolvidas acima de SQL_GUARD_MAX_ROWS são
+      rejeitadas (SQL_GUARD_ACTION=reject) ou limitadas com LIMIT SQL_GUARD_AUTO_LIMIT
+      (padrão). Linhas examinadas contam só no custo.
+    """
+    tree = validate_select(sql, dialect_name)
+    out = GuardResult(sql=sql)
+    if os.getenv("SQL_GUARD_EXPLAIN", "true").lower() not in ("1", "true", "yes"):
+        return out
+    try:
+        out.estimated_rows, out.estimated_cost = explain_estimate(conn, sql, dialect_name)
+    except Exception as e:
+        if isinstance(e, DBAPIError) and e.connection_invalidated:
+            raise  # conexão perdida: quem chamou decide (failover para outra réplica)
+        # EXPLAIN indisponível (permissão, sintaxe do dialeto): segue sem estimativa
+        logging.getLogger(__name__).warning("EXPLAIN falhou (%s); consulta segue sem estimativa: %s", dialect_name, str(e)[:300])
+        EXPLAIN_SKIPPED.inc(dialect=dialect_name)
+        conn.rollback()
+        return out
+    if _single_row_aggregate(tree):
+        # O plano do MySQL não marca agregações sem GROUP BY (estimaria as linhas lidas)
+        out.estimated_rows = 1.0
+
+    max_cost = float(os.getenv("SQL_GUARD_MAX_COST", "0"))
+    if max_cost > 0 and out.estimated_cost is not None and out.estimated_cost > max_cost:
+        raise SQLGuardError("A consulta gerada é pesada demais para ser executada. Tente restringir a pergunta (período, filtros).")
+
+    max_rows = float(os.getenv("SQL_GUARD_MAX_ROWS", "1000000"))
+    if max_rows > 0 and out.estimated_rows is not None and out.estimated_rows > max_rows:
+        if os.getenv("SQL_GUARD_ACTION", "limit").lower() == "reject":
+            raise SQLGuardError("A consulta gerada retornaria dados demais. Tente restringir a pergunta (período, filtros).")
+        auto_limit = int(os.getenv("SQL_GUARD_AUTO_LIMIT", "1000"))
+        current = _current_limit(tree)
+        if current is None or current > auto_limit:
+            out.sql = tree.limit(auto_limit).sql(dialect=sqlglot_dialect(dialect_name))
+            out.limit_added = True
+    return out
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import column, literal_column, select, table as table_clause
+
+from .connection import _pool_options
+from .guard import explain_needs_primary, guard_sql
+from .targets import copy_context_run, on_primary, primary_connection, run_read
+
+_DB_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def _db_executor() -> ThreadPoolExecutor:
+    """
+    Executor dedicado às consultas no banco externo.
+
+    O tamanho padrão acompanha o pool (EXT_POOL_SIZE + EXT_POOL_MAX_OVERFLOW), de modo
+    que consultas excedentes esperam aqui e não ocupam threads esperando conexão.
+    """
+    global _DB_EXECUTOR
+    if _DB_EXECUTOR is None:
+        pool = _pool_options()
+        default_workers = pool["pool_size"] + pool["max_overflow"]
+        workers = int(os.getenv("EXT_DB_MAX_CONCURRENCY", str(default_workers)))
+        _DB_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ext-db")
+    return _DB_EXECUTOR
+
+
+async def _in_db_executor(func, *args):
+    """Roda func no executor do banco externo, preservando o contexto (banco alvo da requisição)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor(), copy_context_run(func, *args))
+
+
+def run_query(sql: str) -> List[Dict[str, Any]]:
+    """
+    Executa um SQL no banco externo usando uma conexão do pool compartilhado (de uma
+    réplica, se o banco alvo tiver réplicas configuradas).
+
+    Retorna as linhas como lista de dicts (coluna -> valor), independente do driver.
+    """
+    return run_read(_run_query, sql)
+
+
+def _run_query(conn, sql: str) -> List[Dict[str, Any]]:
+    # no_parameters: o SQL vai cru para o driver (sem interpretar '%' de LIKE como placeholder)
+    result = conn.execution_options(no_parameters=True).exec_driver_sql(sql)
+    if not result.returns_rows:
+        return []
+    return [dict(row) for row in result.mappings()]
+
+
+async def run_query_async(sql: str) -> List[Dict[str, Any]]:
+    """Versão assíncrona de run_query: executa no executor limitado do banco externo."""
+    return await _in_db_executor(run_query, sql)
+
+
+def fetch_sample_rows(
+    table: str, columns: Optional[List[str]] = None, limit: int = 10, schema: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Amostra de linhas de uma tabela. O SQL é montado pelo SQLAlchemy (nome citado
+    corretamente e LIMIT/TOP/FETCH conforme o dialeto), nunca por interpolação de string.
+    """
+    tbl = table_clause(table, *[column(c) for c in (columns or [])], schema=schema)
+    stmt = select(*tbl.c) if columns else select(literal_column("*")).select_from(tbl)
+    return run_read(lambda conn: [dict(row) for row in conn.execute(stmt.limit(limit)).mappings()])
+
+
+async def fetch_sample_rows_async(
+    table: str, columns: Optional[List[str]] = None, limit: int = 10, schema: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    return await _in_db_executor(fetch_sample_rows, table, columns, limit, schema)
+
+
+@dataclass
+class QueryResult:
+    """Resultado limitado de uma consulta: só a "cabeça" das linhas fica em memória."""
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    columns: List[str] = field(default_factory=list)
+    truncated: bool = False
+    # Total de linhas conhecido/estimado (None quando a contagem foi interrompida)
+    total_rows_estimate: Optional[int] = None
+    total_rows_exact: bool = True
+    bytes: int = 0
+    # SQL efetivamente executado (pode ter recebido LIMIT do guard) e estimativas do EXPLAIN
+    sql: Optional[str] = None
+    estimated_rows: Optional[float] = None
+    estimated_cost: Optional[float] = None
+    limit_added: bool = False
+    # Resultado servido pelo cache de resultados (sem acesso ao banco externo)
+    cached: bool = False
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    def meta(self) -> dict:
+        return {
+            "row_count": self.row_count,
+            "columns": self.columns,
+            "truncated": self.truncated,
+            "total_rows_estimate": self.total_rows_estimate,
+            "total_rows_exact": self.total_rows_exact,
+            "limit_added": self.limit_added,
+            "cached": self.cached,
+        }
+
+    def summary_line(self) -> Optional[str]:
+        """Frase curta para o prompt da resposta quando o resultado foi truncado."""
+        if not self.truncated:
+            return None
+        if self.total_rows_estimate is None:
+            return f"Resultado truncado: exibindo as primeiras {self.row_count} linhas de um total desconhecido."
+        qualifier = "" if self.total_rows_exact else "pelo menos "
+        return (
+            f"Resultado truncado: exibindo as primeiras {self.row_count} linhas de "
+            f"{qualifier}{self.total_rows_estimate}."
+        )
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    return len(json.dumps(row, default=str, ensure_ascii=False).encode("utf-8"))
+
+
+def fetch_bounded(
+    sql: str, max_rows: int | None = None, max_bytes: int | None = None, guard: bool = True
+) -> QueryResult:
+    """
+    Executa o SQL com cursor de servidor (stream_results) e lê em lotes (fetchmany),
+    guardando no máximo max_rows linhas / max_bytes bytes (EXT_RESULT_MAX_ROWS /
+    EXT_RESULT_MAX_BYTES). Após o limite, continua contando (sem guardar) até
+    EXT_RESULT_COUNT_AHEAD linhas para estimar o total.
+
+    guard: valida/estima o SQL antes (guard_sql); levanta SQLGuardError se rejeitado.
+    """
+    if max_rows is None:
+        max_rows = int(os.getenv("EXT_RESULT_MAX_ROWS", "500"))
+    if max_bytes is None:
+        max_bytes = int(os.getenv("EXT_RESULT_MAX_BYTES", "1000000"))
+    batch_size = int(os.getenv("EXT_RESULT_FETCH_BATCH", "200"))
+    count_ahead = int(os.getenv("EXT_RESULT_COUNT_AHEAD", "10000"))
+    return run_read(_fetch_bounded, sql, max_rows, max_bytes, guard, batch_size, count_ahead)
+
+
+def _fetch_bounded(conn, sql: str, max_rows: int, max_bytes: int, guard: bool, batch_size: int, count_ahead: int) -> QueryResult:
+    out = QueryResult(sql=sql)
+    dialect = conn.dialect.name
+    if guard:
+        if explain_needs_primary(dialect) and not on_primary(conn):
+            # O EXPLAIN do Oracle grava na PLAN_TABLE, o que falha numa réplica somente leitura.
+            # Lido no próprio primário, o EXPLAIN usa a mesma conexão: uma segunda do mesmo
+            # pool esgotaria o pool (o executor tem uma thread por conexão).
+            with primary_connection() as primary:
+                checked = guard_sql(primary, sql, dialect)
+        else:
+            checked = guard_sql(conn, sql, dialect)
+        sql = out.sql = checked.sql
+        out.estimated_rows = checked.estimated_rows
+        out.estimated_cost = checked.estimated_cost
+        out.limit_added = checked.limit_added
+    result = conn.execution_options(no_parameters=True, stream_results=True).exec_driver_sql(sql)
+    if not result.returns_rows:
+        return out
+    out.columns = list(result.keys())
+    mappings = result.mappings()
+    seen = 0
+    while True:
+        batch = mappings.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            seen += 1
+            if out.truncated:
+                continue
+            row_dict = dict(row)
+            size = _row_bytes(row_dict)
+            if len(out.rows) >= max_rows or out.bytes + size > max_bytes:
+                out.truncated = True
+                continue
+            out.rows.append(row_dict)
+            out.bytes += size
+        if out.truncated and seen - len(out.rows) >= count_ahead:
+            # Interrompe a leitura: o total passa a ser um limite inferior
+            out.total_rows_exact = False
+            break
+    out.total_rows_estimate = seen
+    if not out.total_rows_exact and dialect == "mysql":
+        # Cursores não bufferizados do MySQL leem o restante do resultado ao fechar;
+        # descarta a conexão em vez de drenar milhões de linhas
+        conn.invalidate()
+    else:
+        result.close()
+    return out
+
+
+async def fetch_bounded_async(
+    sql: str, max_rows: int | None = None, max_bytes: int | None = None, guard: bool = True
+) -> QueryResult:
+    """Versão assíncrona de fetch_bounded, no executor limitado do banco externo."""
+    return await _in_db_executor(fetch_bounded, sql, max_rows, max_bytes, guard)
+
+
+def shutdown_executor() -> None:
+    global _DB_EXECUTOR
+    if _DB_EXECUTOR is not None:
+        _DB_EXECUTOR.shutdown(wait=False)
+        _DB_EXECUTOR = None
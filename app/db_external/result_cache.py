@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Dict, Optional
+
+from app.singleflight import query_flight
+
+from .connection import connection_identity, get_sqlalchemy_engine
+from .query import QueryResult, fetch_bounded_async
+from .sql_parse import parse_statements, referenced_tables, sqlglot_dialect
+from .targets import current_target_id, registry
+
+
+def canonical_sql(sql: str, dialect_name: Optional[str] = None) -> str:
+    """
+    Forma canônica do SQL para a chave do cache: regenerado pelo sqlglot (espaços,
+    caixa de palavras-chave e aspas padronizados). Se o parse falhar, só colapsa espaços.
+    """
+    try:
+        statements = parse_statements(sql, dialect_name)
+        if len(statements) == 1:
+            return statements[0].sql(dialect=sqlglot_dialect(dialect_name))
+    except Exception:
+        pass
+    return " ".join(sql.split()).rstrip(";")
+
+
+def load_ttl_overrides() -> Dict[str, float]:
+    """TTL por tabela via ENV (JSON), ex.: {"pedidos": 60, "moedas": 86400}; 0 = não cachear."""
+    raw = os.getenv("RESULT_CACHE_TTL_JSON")
+    if not raw:
+        return {}
+    try:
+        return {str(k).lower(): float(v) for k, v in json.loads(raw).items()}
+    except Exception:
+        logging.getLogger(__name__).warning("RESULT_CACHE_TTL_JSON inválido; usando apenas o TTL padrão")
+        return {}
+
+
+def _json_default(value):
+    # Tipos comuns dos drivers, no mesmo formato que a resposta JSON da API usaria
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def _dump_result(result: QueryResult) -> bytes:
+    """Serializa o resultado em JSON (nunca pickle: o arquivo compartilhado não é confiável)."""
+    return json.dumps(asdict(result), default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def _load_result(value: bytes) -> Optional[QueryResult]:
+    try:
+        data = json.loads(value)
+        return QueryResult(**{**data, "cached": True})
+    except (ValueError, TypeError):
+        # Entrada ilegível (ex.: formato antigo): tratada como ausente
+        return None
+
+
+class _SQLiteBackend:
+    """Backend compartilhado opcional (arquivo SQLite) para vários processos/workers."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "cache_key TEXT PRIMARY KEY, fingerprint TEXT, expires_at REAL, value BLOB)"
+            )
+
+    def get(self, key: str) -> Optional[tuple[bytes, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM result_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0], row[1]
+
+    def set(self, key: str, fingerprint: str, value: bytes, expires_at: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (cache_key, fingerprint, expires_at, value) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, expires_at, value),
+            )
+
+    def purge(self, expired_only: bool = False) -> int:
+        """Remove as entradas expiradas (ou todas)."""
+        with self._lock, self._conn:
+            if not expired_only:
+                return self._conn.execute("DELETE FROM result_cache").rowcount
+            return self._conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class ResultCache:
+    """
+    Cache de resultados de consultas no banco externo.
+
+    A chave é o SQL canônico + identidade da conexão + fingerprint do schema + limites
+    do resultado. Em memória é um LRU limitado em bytes (tamanho do resultado
+    serializado); opcionalmente usa também um arquivo SQLite compartilhado entre
+    processos. O TTL de cada entrada é o menor entre as tabelas consultadas
+    (RESULT_CACHE_TTL_JSON), com RESULT_CACHE_TTL_SECONDS como padrão. Entradas de um
+    fingerprint antigo deixam de ser acessadas (a chave muda) e saem pelo LRU/TTL, sem
+    limpar o cache inteiro; resultados são guardados em JSON.
+    """
+
+    # Escritas entre limpezas das entradas expiradas do backend compartilhado
+    _PURGE_EVERY = 500
+
+    def __init__(self, max_bytes: int, default_ttl: float, backend_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._backend_path = backend_path
+        self._backend: Optional[_SQLiteBackend] = None
+        self._entries: "OrderedDict[str, tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> Optional[_SQLiteBackend]:
+        if self._backend is None and self._backend_path:
+            try:
+                self._backend = _SQLiteBackend(self._backend_path)
+            except Exception:
+                logging.getLogger(__name__).exception("Falha ao abrir o cache de resultados compartilhado")
+                self._backend_path = None
+        return self._backend
+
+    def make_key(self, sql: str, schema_fp: str) -> str:
+        dialect = get_sqlalchemy_engine().dialect.name
+        # Limites do resultado entram na chave: um resultado truncado não serve para outro limite
+        limits = f'{os.getenv("EXT_RESULT_MAX_ROWS", "500")}|{os.getenv("EXT_RESULT_MAX_BYTES", "1000000")}'
+        raw = f"{canonical_sql(sql, dialect)}|{connection_identity()}|{schema_fp}|{limits}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, sql: str) -> float:
+        overrides = load_ttl_overrides()
+        dialect = get_sqlalchemy_engine().dialect.name
+        ttls = [overrides.get(t.lower(), self.default_ttl) for t in referenced_tables(sql, dialect)]
+        return min(ttls, default=self.default_ttl)
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, (value, _) = self._entries.popitem(last=False)
+            self._bytes -= len(value)
+
+    def _remember(self, key: str, value: bytes, expires_at: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (value, expires_at)
+            self._bytes += len(value)
+            self._evict()
+
+    def get(self, key: str, schema_fp: str) -> Optional[QueryResult]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] <= time.time():
+                del self._entries[key]
+                self._bytes -= len(item[0])
+                item = None
+            if item is not None:
+                self._entries.move_to_end(key)
+        if item is None and self.backend is not None:
+            item = self.backend.get(key)
+            if item is not None:
+                self._remember(key, *item)
+        result = _load_result(item[0]) if item is not None else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return result
+
+    def set(self, key: str, schema_fp: str, sql: str, result: QueryResult) -> None:
+        ttl = self.ttl_for(sql)
+        if ttl <= 0:
+            return
+        try:
+            value = _dump_result(result)
+        except Exception:
+            # Valores que não viram JSON: simplesmente não cacheia
+            return
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+        if self.backend is not None:
+            self.backend.set(key, schema_fp, value, expires_at)
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % self._PURGE_EVERY == 0
+            if purge:
+                self.backend.purge(expired_only=True)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            removed += self.backend.purge()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+                "shared_backend": self._backend_path or None,
+            }
+
+
+result_cache = ResultCache(
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    default_ttl=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300")),
+    backend_path=os.getenv("RESULT_CACHE_SQLITE_PATH") or None,
+)
+
+# Demais bancos alvo (DB_TARGETS_FILE): um cache por banco, com os mesmos limites; o
+# banco padrão usa `result_cache`
+_TARGET_CACHES: Dict[str, ResultCache] = {}
+_TARGET_CACHES_LOCK = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Cache de resultados do banco alvo atual (fingerprint e limite de memória próprios)."""
+    target_id = current_target_id()
+    if target_id == registry.default_id:
+        return result_cache
+    with _TARGET_CACHES_LOCK:
+        cache = _TARGET_CACHES.get(target_id)
+        if cache is None:
+            backend_path = os.getenv("RESULT_CACHE_SQLITE_PATH") or None
+            if backend_path:
+                root, ext = os.path.splitext(backend_path)
+                backend_path = f"{root}_{target_id}{ext}"
+            cache = _TARGET_CACHES[target_id] = ResultCache(
+                max_bytes=result_cache.max_bytes, default_ttl=result_cache.default_ttl, backend_path=backend_path
+            )
+        return cache
+
+
+def target_result_caches() -> Dict[str, ResultCache]:
+    """Caches dos bancos alvo além do padrão (para /cache/stats e /cache/invalidate)."""
+    with _TARGET_CACHES_LOCK:
+        return dict(_TARGET_CACHES)
+
+
+def result_cache_enabled() -> bool:
+    return os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+async def cached_fetch_bounded_async(sql: str, schema_fp: str, use_cache: bool = True) -> QueryResult:
+    """
+    fetch_bounded_async com cache de resultados: um acerto não toca o banco externo.
+    Só guarda resultados de consultas executadas com sucesso.
+
+    Execuções concorrentes do mesmo SQL (mesma chave canônica) são unificadas: uma só
+    vai ao banco e as demais recebem o mesmo resultado, com ou sem cache.
+    """
+    cache = get_result_cache()
+    key = cache.make_key(sql, schema_fp)
+    if not (use_cache and result_cache_enabled()):
+        return await query_flight.do(key, lambda: fetch_bounded_async(sql))
+    # O backend compartilhado é acessado de forma síncrona: fora do event loop
+    shared = cache.backend is not None
+    cached = await asyncio.to_thread(cache.get, key, schema_fp) if shared else cache.get(key, schema_fp)
+    if cached is not None:
+        return cached
+
+    async def fetch_and_store() -> QueryResult:
+        result = await fetch_bounded_async(sql)
+        if shared:
+            await asyncio.to_thread(cache.set, key, schema_fp, sql, result)
+        else:
+            cache.set(key, schema_fp, sql, result)
+        return result
+
+    return await query_flight.do(key, fetch_and_store)
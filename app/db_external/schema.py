@@ -1,8 +1,20 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Iterable, Optional, Set
 
-from sqlalchemy import inspect, MetaData, Table, select, func, text
+from sqlalchemy import inspect, select, func, text, table as table_clause, column
 from sqlalchemy.engine import Engine
 from .connection import get_sqlalchemy_engine
+from .targets import copy_context_run, current_target
+from .schema_model import RENDER_FORMATS, SchemaModel
+
+
+_UNAVAILABLE_PREFIX = "Schema indisponível"
 
 
 def _build_sqlalchemy_engine() -> Engine:
@@ -27,27 +39,250 @@ def _default_schema_for_dialect(dialect_name: str, inspector) -> Optional[str]:
     return None
 
 
-def get_db_schema(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None) -> str:
+# Dialetos em que o SQLAlchemy reflete todas as tabelas com consultas em lote ao catálogo
+# (get_multi_*); nos demais a reflexão é por tabela e roda em paralelo no pool de threads.
+_BULK_REFLECTION_DIALECTS = {"postgresql", "oracle"}
+
+# Marcadores de alteração por tabela, lidos do catálogo em uma única consulta
+_CHANGE_MARKER_QUERIES = {
+    "mysql": (
+        "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE()"
+    ),
+    "postgresql": (
+        "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables "
+        "WHERE schemaname = COALESCE(:schema, current_schema())"
+    ),
+    "oracle": "SELECT OBJECT_NAME, LAST_DDL_TIME FROM USER_OBJECTS WHERE OBJECT_TYPE = 'TABLE'",
+    "mssql": "SELECT name, modify_date FROM sys.tables",
+}
+# Dialetos cujo marcador acompanha alterações de dados; nos demais (Oracle, SQL Server) ele
+# só muda com DDL, então contagens e exemplos também expiram por SCHEMA_TABLE_MAX_AGE_SECONDS
+_DATA_CHANGE_MARKER_DIALECTS = {"mysql", "postgresql"}
+
+
+def _table_change_markers(engine: Engine, dialect: str, schema: Optional[str]) -> Dict[str, str]:
+    """Marcador de última alteração por tabela (nome em minúsculas -> valor), quando o SGBD expõe."""
+    sql = _CHANGE_MARKER_QUERIES.get(dialect)
+    if not sql:
+        return {}
+    try:
+        with engine.connect() as conn:
+            params = {"schema": schema} if ":schema" in sql else {}
+            return {str(name).lower(): str(marker) for name, marker in conn.execute(text(sql), params) if marker is not None}
+    except Exception:
+        return {}
+
+
+# Contagem estimada de linhas por tabela a partir das estatísticas do catálogo (sem varrer a tabela)
+_ESTIMATED_COUNT_QUERIES = {
+    "mysql": (
+        "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE()"
+    ),
+    "postgresql": (
+        "SELECT c.relname, c.reltuples FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relkind IN ('r', 'p') AND n.nspname = COALESCE(:schema, current_schema())"
+    ),
+    "oracle": "SELECT TABLE_NAME, NUM_ROWS FROM ALL_TABLES WHERE OWNER = UPPER(COALESCE(:schema, USER))",
+    "mssql": (
+        "SELECT t.name, SUM(p.rows) FROM sys.tables t "
+        "JOIN sys.schemas s ON s.schema_id = t.schema_id "
+        "JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1) "
+        "WHERE s.name = COALESCE(:schema, SCHEMA_NAME()) GROUP BY t.name"
+    ),
+}
+
+
+def estimate_row_counts(engine: Engine, dialect: str, schema: Optional[str]) -> Dict[str, int]:
     """
-    Retorna o schema (tabelas, colunas, PK, índices/uniques, FKs, contagem e exemplos) do banco externo como string.
+    Contagens estimadas (nome da tabela em minúsculas -> linhas) lidas das estatísticas do
+    catálogo: information_schema.TABLES.TABLE_ROWS, pg_class.reltuples, ALL_TABLES.NUM_ROWS
+    ou sys.partitions. Tabelas sem estatística (ex.: reltuples = -1) ficam de fora.
+    """
+    sql = _ESTIMATED_COUNT_QUERIES.get(dialect)
+    if not sql:
+        return {}
+    try:
+        with engine.connect() as conn:
+            params = {"schema": schema} if ":schema" in sql else {}
+            return {
+                str(name).lower(): int(rows)
+                for name, rows in conn.execute(text(sql), params)
+                if rows is not None and rows >= 0
+            }
+    except Exception:
+        return {}
 
-    tables_and_columns: dict opcional no formato {"tabela1": ["col1", "col2"], "tabela2": None, ...}
-    Se None, pega todas as tabelas e colunas.
+
+def _needs_exact_count(estimate: Optional[int], exact_counts: bool) -> bool:
+    """COUNT(*) exato só se pedido explicitamente, sem estimativa ou abaixo de SCHEMA_EXACT_COUNT_THRESHOLD."""
+    if exact_counts or estimate is None:
+        return True
+    return estimate < int(os.getenv("SCHEMA_EXACT_COUNT_THRESHOLD", "100000"))
+
+
+def _ddl_hash(info: dict) -> str:
+    payload = {k: info[k] for k in ("pk", "unique", "indexes", "fks", "comment")}
+    payload["columns"] = [{k: c[k] for k in ("name", "type", "nullable", "default")} for c in info["columns"]]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _reflect_tables(insp, tables: list, schema: Optional[str]) -> Dict[str, dict]:
+    """Reflete colunas, PK, uniques, índices, FKs e comentários de várias tabelas em lote."""
+    kw = {"schema": schema, "filter_names": tables}
+    raw = {t: {} for t in tables}
+    for key, getter in (
+        ("columns", insp.get_multi_columns),
+        ("pk", insp.get_multi_pk_constraint),
+        ("unique", insp.get_multi_unique_constraints),
+        ("indexes", insp.get_multi_indexes),
+        ("fks", insp.get_multi_foreign_keys),
+        ("comment", insp.get_multi_table_comment),
+    ):
+        try:
+            for (_, table), value in getter(**kw).items():
+                if table in raw:
+                    raw[table][key] = value
+        except Exception:
+            pass
+    return raw
+
+
+def _reflect_table(engine: Engine, table: str, schema: Optional[str]) -> dict:
+    """Reflexão de uma única tabela (um inspector por thread)."""
+    insp = inspect(engine)
+    raw: dict = {}
+    for key, getter in (
+        ("columns", insp.get_columns),
+        ("pk", insp.get_pk_constraint),
+        ("unique", insp.get_unique_constraints),
+        ("indexes", insp.get_indexes),
+        ("fks", insp.get_foreign_keys),
+        ("comment", insp.get_table_comment),
+    ):
+        try:
+            raw[key] = getter(table, schema=schema)
+        except Exception:
+            pass
+    return raw
+
+
+def _build_table_info(table: str, raw: dict, allowed_cols: Optional[Set[str]]) -> dict:
+    """Converte a reflexão crua no formato do modelo (sem contagem e exemplos)."""
+    info = {
+        "name": table, "count": None, "count_estimated": False, "pk": [], "unique": [], "indexes": [],
+        "columns": [], "fks": [], "samples": [], "comment": None,
+    }
+    info["pk"] = list((raw.get("pk") or {}).get("constrained_columns") or [])
+    # Uniques e Indexes
+    unique_cols: Set[str] = set()
+    normal_idx_cols: Set[str] = set()
+    for uc in raw.get("unique") or []:
+        unique_cols.update(c for c in (uc.get("column_names") or []) if c)
+    for idx in raw.get("indexes") or []:
+        cols = [c for c in (idx.get("column_names") or []) if c]
+        if idx.get("unique"):
+            unique_cols.update(cols)
+        else:
+            normal_idx_cols.update(cols)
+    info["unique"] = sorted(unique_cols)
+    info["indexes"] = sorted(normal_idx_cols)
+    # Colunas detalhadas
+    for col in raw.get("columns") or []:
+        name = col.get("name") or col.get("key")
+        if allowed_cols and name not in allowed_cols:
+            continue
+        info["columns"].append({
+            "name": name,
+            "type": str(col.get("type")),
+            "nullable": col.get("nullable", True),
+            "default": None if col.get("default") is None else str(col["default"]),
+            "unique": name in unique_cols,
+            "comment": col.get("comment"),
+        })
+    # Foreign keys
+    for fk in raw.get("fks") or []:
+        cols = fk.get("constrained_columns") or []
+        ref_t = fk.get("referred_table")
+        ref_cols = fk.get("referred_columns") or []
+        for i, c in enumerate(cols):
+            if allowed_cols and c not in allowed_cols:
+                continue
+            ref_c = ref_cols[i] if i < len(ref_cols) else "?"
+            info["fks"].append({"column": c, "ref_table": ref_t or "?", "ref_column": ref_c})
+    info["comment"] = (raw.get("comment") or {}).get("text")
+    return info
+
+
+def _load_table_data(
+    engine: Engine, info: dict, schema: Optional[str], estimate: Optional[int], exact_counts: bool
+) -> None:
+    """Contagem de registros e exemplos reais de dados de uma tabela (roda no pool de threads)."""
+    # Tabela "leve" montada com as colunas já refletidas: sem nova reflexão no banco
+    tbl_obj = table_clause(info["name"], *[column(c["name"]) for c in info["columns"]], schema=schema)
+    info["count"] = estimate
+    info["count_estimated"] = estimate is not None
+    with engine.connect() as conn:
+        # Contagem de registros: exata só quando barata ou pedida, senão a estimativa do catálogo
+        if _needs_exact_count(estimate, exact_counts):
+            try:
+                info["count"] = conn.execute(select(func.count()).select_from(tbl_obj)).scalar()
+                info["count_estimated"] = False
+            except Exception:
+                conn.rollback()
+        # Exemplos reais de dados
+        try:
+            if info["columns"]:
+                rows = conn.execute(select(*tbl_obj.c).limit(3)).mappings().fetchall()
+                info["samples"] = [dict(row) for row in rows]
+        except Exception:
+            pass
+
+
+def introspect_schema(
+    tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None,
+    previous: Optional[SchemaModel] = None,
+    exact_counts: Optional[bool] = None,
+) -> SchemaModel:
+    """
+    Faz a introspecção do banco externo e devolve o modelo tipado (SchemaModel): tabelas
+    com colunas, PK, uniques, índices, FKs, contagem, exemplos e fingerprint; `error`
+    quando o schema está indisponível e `warning` em falha parcial.
+
+    A estrutura vem de consultas em lote ao catálogo quando o dialeto permite; contagens
+    e exemplos são lidos em paralelo (SCHEMA_INTROSPECTION_WORKERS threads).
+
+    previous: modelo de uma introspecção anterior. Tabelas cujo fingerprint (hash do DDL +
+    marcador de alteração do catálogo) não mudou reaproveitam contagem e exemplos. Sem
+    marcador de alteração de dados no SGBD (só de DDL, ou nenhum), os dados são relidos
+    após SCHEMA_TABLE_MAX_AGE_SECONDS.
+
+    exact_counts: força COUNT(*) em todas as tabelas (padrão: SCHEMA_EXACT_COUNTS). Sem isso,
+    tabelas grandes usam a contagem estimada das estatísticas do catálogo.
+
+    tables_and_columns: mesmo filtro de get_db_schema.
     """
-    # Tenta criar engine e inspector; se falhar, retorna mensagem amigável para não derrubar o app
+    model: dict = {"dialect": None, "schema": None, "tables": [], "error": None, "warning": None}
+    # Tenta criar engine e inspector; se falhar, devolve o erro para não derrubar o app
     try:
         engine = _build_sqlalchemy_engine()
         insp = inspect(engine)
     except Exception as e:
-        return f"Schema indisponível no momento (erro de conexão/reflection): {e}"
+        model["error"] = f"{_UNAVAILABLE_PREFIX} no momento (erro de conexão/reflection): {e}"
+        return SchemaModel.from_dict(model)
     dialect = engine.dialect.name  # 'mysql', 'postgresql', 'oracle', 'mssql'
     target_schema = _default_schema_for_dialect(dialect, insp)
+    model["dialect"] = dialect
+    model["schema"] = target_schema
 
     # Lista de tabelas disponíveis no schema alvo
     try:
         tables_all = insp.get_table_names(schema=target_schema)
     except Exception as e:
-        return f"Schema indisponível (falha ao listar tabelas): {e}"
+        model["error"] = f"{_UNAVAILABLE_PREFIX} (falha ao listar tabelas): {e}"
+        return SchemaModel.from_dict(model)
     if tables_and_columns is None:
         tables = tables_all
     else:
@@ -64,138 +299,354 @@ def get_db_schema(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None
             return None
         return set(cols)
 
-    lines: list[str] = []
-    all_fks_global: list[tuple[str, str, str, str]] = []
+    workers = max(1, int(os.getenv("SCHEMA_INTROSPECTION_WORKERS", "8")))
+    max_age = float(os.getenv("SCHEMA_TABLE_MAX_AGE_SECONDS", "3600"))
+    previous_tables = {t.name: t for t in previous.tables} if previous is not None else {}
+    markers = _table_change_markers(engine, dialect, target_schema)
+    estimates = estimate_row_counts(engine, dialect, target_schema)
+    data_markers = dialect in _DATA_CHANGE_MARKER_DIALECTS
+    if exact_counts is None:
+        exact_counts = os.getenv("SCHEMA_EXACT_COUNTS", "false").lower() in ("1", "true", "yes")
+    now = time.time()
 
-    metadata = MetaData()
     try:
-        with engine.connect() as conn:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schema") as pool:
+            # 1. Estrutura: lote único no catálogo ou reflexão por tabela em paralelo
+            if dialect in _BULK_REFLECTION_DIALECTS:
+                raw_by_table = _reflect_tables(insp, tables, target_schema)
+            else:
+                futures = {t: pool.submit(_reflect_table, engine, t, target_schema) for t in tables}
+                raw_by_table = {t: f.result() for t, f in futures.items()}
+
+            # 2. Fingerprints e reaproveitamento das tabelas sem alteração
+            pending = []
             for table in tables:
-                lines.append(f"Tabela: {table}")
+                info = _build_table_info(table, raw_by_table.get(table) or {}, allowed_for(table))
+                marker = markers.get(table.lower())
+                info["fingerprint"] = f"{_ddl_hash(info)}:{marker or ''}"
+                old = previous_tables.get(table)
+                reusable = (
+                    old is not None
+                    and old.fingerprint == info["fingerprint"]
+                    and ((marker is not None and data_markers) or now - old.introspected_at < max_age)
+                )
+                estimate = estimates.get(table.lower())
+                if reusable:
+                    info["count"] = old.count
+                    info["count_estimated"] = old.count_estimated
+                    if info["count_estimated"] and estimate is not None:
+                        info["count"] = estimate
+                    info["samples"] = old.samples
+                    info["introspected_at"] = old.introspected_at
+                else:
+                    info["introspected_at"] = now
+                    pending.append((info, estimate))
+                model["tables"].append(info)
 
-                # Carrega metadados da tabela
-                try:
-                    tbl_obj = Table(table, metadata, schema=target_schema, autoload_with=engine)
-                except Exception:
-                    tbl_obj = None
+            # 3. Contagens e exemplos das tabelas novas/alteradas, em paralelo
+            futures = [
+                pool.submit(_load_table_data, engine, info, target_schema, estimate, exact_counts)
+                for info, estimate in pending
+            ]
+            for future in futures:
+                future.result()
+    except Exception as e:
+        model["warning"] = f"introspecção interrompida por erro de conexão/consulta: {e}"
 
-                # Contagem de registros
-                try:
-                    if tbl_obj is not None:
-                        count_val = conn.execute(select(func.count()).select_from(tbl_obj)).scalar_one()
-                    else:
-                        # Fallback simples
-                        fq_name = f"{target_schema}.{table}" if target_schema else table
-                        count_val = conn.execute(select(func.count()).select_from(text(fq_name))).scalar()
-                    lines.append(f"  Total de registros: {count_val}")
-                except Exception:
-                    pass
+    return SchemaModel.from_dict(model)
 
-                # Chave primária
-                try:
-                    pk_info = insp.get_pk_constraint(table, schema=target_schema) or {}
-                    pk_cols = pk_info.get("constrained_columns") or []
-                    if pk_cols:
-                        lines.append(f"  Primary Key: {', '.join(pk_cols)}")
-                except Exception:
-                    pass
 
-                # Uniques e Indexes
-                unique_cols: Set[str] = set()
-                normal_idx_cols: Set[str] = set()
-                try:
-                    for uc in insp.get_unique_constraints(table, schema=target_schema) or []:
-                        for c in uc.get("column_names") or []:
-                            unique_cols.add(c)
-                except Exception:
-                    pass
-                try:
-                    for idx in insp.get_indexes(table, schema=target_schema) or []:
-                        cols = idx.get("column_names") or []
-                        if idx.get("unique"):
-                            unique_cols.update(cols)
-                        else:
-                            normal_idx_cols.update(cols)
-                except Exception:
-                    pass
-                if unique_cols:
-                    lines.append(f"  Unique: {', '.join(sorted(unique_cols))}")
-                if normal_idx_cols:
-                    lines.append(f"  Indexes: {', '.join(sorted(normal_idx_cols))}")
+def schema_prompt_format() -> str:
+    """Formato do schema no prompt (SCHEMA_PROMPT_FORMAT): verbose (padrão) ou compact."""
+    fmt = os.getenv("SCHEMA_PROMPT_FORMAT", "verbose").lower()
+    return fmt if fmt in RENDER_FORMATS else "verbose"
 
-                # Colunas detalhadas
-                try:
-                    cols_info = insp.get_columns(table, schema=target_schema)
-                    allowed_cols = allowed_for(table)
-                    for col in cols_info:
-                        name = col.get("name") or col.get("key")
-                        if allowed_cols and name not in allowed_cols:
-                            continue
-                        coltype = str(col.get("type"))
-                        details = [f"{name} {coltype}"]
-                        if not col.get("nullable", True):
-                            details.append("NOT NULL")
-                        if col.get("default") is not None:
-                            details.append(f"DEFAULT {col['default']}")
-                        if name in unique_cols:
-                            details.append("UNIQUE")
-                        lines.append(f"  Coluna: {' '.join(details)}")
-                except Exception:
-                    pass
 
-                # Foreign keys
-                try:
-                    fks = insp.get_foreign_keys(table, schema=target_schema) or []
-                    allowed_cols = allowed_for(table)
-                    if fks:
-                        lines.append("  Foreign Keys:")
-                    for fk in fks:
-                        cols = fk.get("constrained_columns") or []
-                        ref_t = fk.get("referred_table")
-                        ref_cols = fk.get("referred_columns") or []
-                        for i, c in enumerate(cols):
-                            if allowed_cols and c not in allowed_cols:
-                                continue
-                            ref_c = ref_cols[i] if i < len(ref_cols) else "?"
-                            lines.append(f"    {c} -> {ref_t}.{ref_c}")
-                            all_fks_global.append((table, c, ref_t or "?", ref_c))
-                except Exception:
-                    pass
+def render_schema(model: SchemaModel, tables: Optional[Iterable[str]] = None, fmt: Optional[str] = None) -> str:
+    """
+    Renderiza o modelo de introspecção no texto enviado à IA (memoizado no modelo).
+
+    tables: restringe a saída a um subconjunto de tabelas (ex.: seleção por relevância).
+    fmt: formato do texto; padrão em SCHEMA_PROMPT_FORMAT.
+    """
+    return model.render(fmt or schema_prompt_format(), tables=tables)
+
+
+def get_db_schema(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None) -> str:
+    """
+    Retorna o schema (tabelas, colunas, PK, índices/uniques, FKs, contagem e exemplos) do banco externo como string.
+
+    tables_and_columns: dict opcional no formato {"tabela1": ["col1", "col2"], "tabela2": None, ...}
+    Se None, pega todas as tabelas e colunas.
+    """
+    return render_schema(introspect_schema(tables_and_columns=tables_and_columns))
+
+
+# Cache de snapshots do schema por processo (chave: banco alvo + filtro), com TTL e
+# refresh em background (stale-while-revalidate): após o primeiro carregamento,
+# o /ask nunca espera pela introspecção.
+_SCHEMA_CACHE: Dict[str, dict] = {}
+_SCHEMA_CACHE_LOCK = threading.Lock()
+_SCHEMA_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+
+
+def _schema_cache_key(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None) -> str:
+    # Um snapshot por banco alvo (app.db_external.targets) e filtro
+    prefix = current_target().cache_prefix
+    if tables_and_columns is None:
+        return f"{prefix}:*"
+    normalized = {t: (sorted(c) if c else None) for t, c in tables_and_columns.items()}
+    return f"{prefix}:{json.dumps(normalized, sort_keys=True)}"
+
+
+def _schema_cache_ttl() -> float:
+    return float(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "600"))
+
+
+def _make_entry(model: SchemaModel, refreshing: bool = False) -> dict:
+    schema = render_schema(model)
+    return {
+        "model": model,
+        "schema": schema,
+        "fingerprint": schema_fingerprint(model),
+        "loaded_at": time.monotonic(),
+        "refreshing": refreshing,
+    }
+
+
+def _load_schema_entry(
+    key: str, tables_and_columns, previous: Optional[dict] = None, exact_counts: Optional[bool] = None
+) -> dict:
+    """Executa a introspecção e grava no cache (somente se o schema estiver disponível)."""
+    if previous is None:
+        with _SCHEMA_CACHE_LOCK:
+            current = _SCHEMA_CACHE.get(key)
+        previous = current["model"] if current else None
+    # Lido antes da introspecção: alterações feitas durante ela invalidam o snapshot em disco
+    catalog_fp = catalog_fingerprint(tables_and_columns) if _snapshot_path(key) else None
+    # Refresh incremental: tabelas sem alteração reaproveitam contagem/exemplos do snapshot atual
+    model = introspect_schema(
+        tables_and_columns=tables_and_columns,
+        previous=previous,
+        exact_counts=exact_counts,
+    )
+    entry = _make_entry(model)
+    if not model.error:
+        save_schema_snapshot(key, model, catalog_fp)
+    with _SCHEMA_CACHE_LOCK:
+        if not model.error:
+            _SCHEMA_CACHE[key] = entry
+        elif key in _SCHEMA_CACHE:
+            # Mantém o snapshot antigo; uma nova tentativa ocorre no próximo acesso
+            _SCHEMA_CACHE[key]["refreshing"] = False
+            return _SCHEMA_CACHE[key]
+    return entry
+
+
+def _refresh_in_background(key: str, tables_and_columns) -> None:
+    try:
+        _load_schema_entry(key, tables_and_columns)
+    except Exception:
+        logging.getLogger(__name__).exception("Falha ao atualizar snapshot do schema em background")
+        with _SCHEMA_CACHE_LOCK:
+            if key in _SCHEMA_CACHE:
+                _SCHEMA_CACHE[key]["refreshing"] = False
+
+
+def _start_background_refresh(key: str, tables_and_columns) -> None:
+    # Copia o contexto: o refresh introspecta o mesmo banco alvo da requisição
+    threading.Thread(
+        target=copy_context_run(_refresh_in_background, key, tables_and_columns),
+        name="schema-refresh",
+        daemon=True,
+    ).start()
+
+
+def get_schema_snapshot(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None) -> dict:
+    """
+    Snapshot do schema em cache: {"model", "schema" (texto), "fingerprint", ...}.
+
+    O primeiro acesso para uma chave faz a introspecção de forma síncrona (um único
+    carregamento por chave, mesmo com requisições concorrentes). Depois disso, o
+    snapshot é servido imediatamente; quando passa do TTL (SCHEMA_CACHE_TTL_SECONDS,
+    <= 0 desativa a expiração) o valor antigo continua sendo servido enquanto uma
+    thread em background recarrega o schema.
+
+    Com SCHEMA_SNAPSHOT_DIR, o primeiro acesso do processo lê o snapshot gravado em
+    disco (por outro worker ou por `python -m app.warm_schema`) em vez de introspectar.
+    """
+    key = _schema_cache_key(tables_and_columns)
+    with _SCHEMA_CACHE_LOCK:
+        entry = _SCHEMA_CACHE.get(key)
+        if entry is not None:
+            ttl = _schema_cache_ttl()
+            expired = ttl > 0 and (time.monotonic() - entry["loaded_at"]) > ttl
+            if expired and not entry["refreshing"]:
+                entry["refreshing"] = True
+                _start_background_refresh(key, tables_and_columns)
+            return entry
+        load_lock = _SCHEMA_LOAD_LOCKS.setdefault(key, threading.Lock())
+    with load_lock:
+        # Outra requisição pode ter carregado enquanto esperávamos
+        with _SCHEMA_CACHE_LOCK:
+            entry = _SCHEMA_CACHE.get(key)
+        if entry is not None:
+            return entry
+        # Cold start: snapshot em disco, validado pelo fingerprint do catálogo
+        entry = _entry_from_disk(key, tables_and_columns)
+        if entry is not None:
+            return entry
+        return _load_schema_entry(key, tables_and_columns)
+
+
+def get_cached_db_schema(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None) -> str:
+    """Versão com cache de get_db_schema (veja get_schema_snapshot)."""
+    return get_schema_snapshot(tables_and_columns)["schema"]
+
 
-                # Exemplos reais de dados
+def schema_fingerprint(model: SchemaModel) -> str:
+    """
+    Hash curto da estrutura do schema: dialeto e, por tabela, o hash do DDL (colunas,
+    tipos, PK, uniques, índices e FKs). Contagens, exemplos e marcadores de alteração
+    ficam de fora, para que o refresh periódico não invalide os caches à toa.
+    """
+    tables = sorted((t.name, (t.fingerprint or "").split(":", 1)[0]) for t in model.tables)
+    payload = [model.dialect, model.schema, model.error, tables]
+    return hashlib.sha256(json.dumps(payload, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def invalidate_schema_cache() -> int:
+    """Descarta todos os snapshots em cache (e em disco). Retorna quantas entradas foram removidas."""
+    with _SCHEMA_CACHE_LOCK:
+        removed = len(_SCHEMA_CACHE)
+        _SCHEMA_CACHE.clear()
+    directory = os.getenv("SCHEMA_SNAPSHOT_DIR")
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.startswith("schema_") and name.endswith(".json"):
                 try:
-                    allowed_cols = allowed_for(table)
-                    if tbl_obj is not None:
-                        if allowed_cols:
-                            cols = [tbl_obj.c[c] for c in tbl_obj.c.keys() if c in allowed_cols]
-                            if not cols:  # se filtro não existe nas colunas, pula
-                                cols = list(tbl_obj.c)
-                            stmt = select(*cols).limit(3)
-                        else:
-                            stmt = select(tbl_obj).limit(3)
-                        result = conn.execute(stmt).fetchall()
-                        if result:
-                            lines.append("  Exemplos de dados:")
-                            for row in result:
-                                mapping = getattr(row, "_mapping", None)
-                                if mapping is not None:
-                                    items = mapping.items()
-                                else:
-                                    # Fallback para tuplas sem nomes
-                                    items = list(zip([c.key for c in (cols if allowed_cols else tbl_obj.c)], row))
-                                if allowed_cols:
-                                    items = [(k, v) for k, v in items if k in allowed_cols]
-                                row_str = ", ".join([f"{k}: {v}" for k, v in items])
-                                lines.append(f"    {row_str}")
-                except Exception:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
                     pass
+    return removed
+
+
+# Snapshot do schema em disco (SCHEMA_SNAPSHOT_DIR): evita que cada worker, a cada
+# restart/scale-out, refaça a introspecção completa (consultas ao catálogo e COUNT(*)).
+# Um arquivo JSON versionado por chave de cache, gravado de forma atômica.
+_SNAPSHOT_VERSION = 1
+
+
+def _snapshot_path(key: str) -> Optional[str]:
+    directory = os.getenv("SCHEMA_SNAPSHOT_DIR")
+    if not directory:
+        return None
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"schema_{name}.json")
+
+
+def catalog_fingerprint(tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None) -> Optional[str]:
+    """
+    Hash barato do catálogo (lista de tabelas + marcadores de alteração, duas consultas),
+    usado para validar o snapshot em disco. None se o banco não responder.
+    """
+    try:
+        engine = _build_sqlalchemy_engine()
+        insp = inspect(engine)
+        dialect = engine.dialect.name
+        target_schema = _default_schema_for_dialect(dialect, insp)
+        tables = insp.get_table_names(schema=target_schema)
+    except Exception:
+        return None
+    if tables_and_columns is not None:
+        tables = [t for t in tables if t in tables_and_columns]
+    markers = _table_change_markers(engine, dialect, target_schema)
+    payload = [dialect, target_schema, sorted((t, markers.get(t.lower(), "")) for t in tables)]
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()[:16]
+
+
+def save_schema_snapshot(key: str, model: SchemaModel, catalog_fp: Optional[str]) -> Optional[str]:
+    """Grava o modelo de introspecção em disco. Retorna o caminho ou None (desativado/falha)."""
+    path = _snapshot_path(key)
+    if path is None:
+        return None
+    payload = {
+        "version": _SNAPSHOT_VERSION,
+        "key": key,
+        "created_at": time.time(),
+        "catalog_fingerprint": catalog_fp,
+        "model": model.to_dict(),
+    }
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as fh:
+            # Valores de exemplo não-JSON (datas, Decimal) viram texto, como no schema renderizado
+            json.dump(payload, fh, default=str)
+        os.replace(tmp, path)
+        return path
+    except Exception:
+        logging.getLogger(__name__).exception("Falha ao gravar snapshot do schema em disco")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return None
 
-    except Exception as e:
-        lines.append(f"\nObservação: introspecção interrompida por erro de conexão/consulta: {e}")
 
-    if all_fks_global:
-        lines.append("\nRelações entre tabelas:")
-        for t, col, ref_t, ref_col in all_fks_global:
-            lines.append(f"  {t}.{col} -> {ref_t}.{ref_col}")
+def load_schema_snapshot(key: str) -> Optional[dict]:
+    """Lê o snapshot em disco da chave; None se não existir, for de outra versão ou estiver corrompido."""
+    path = _snapshot_path(key)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as fh:
+            payload = json.load(fh)
+    except Exception:
+        logging.getLogger(__name__).warning("Snapshot do schema ilegível: %s", path)
+        return None
+    if payload.get("version") != _SNAPSHOT_VERSION or payload.get("key") != key:
+        return None
+    return payload
 
-    return "\n".join(lines)
+
+def _entry_from_disk(key: str, tables_and_columns) -> Optional[dict]:
+    """
+    Monta a entrada do cache a partir do snapshot em disco. Se o catálogo mudou (ou o
+    snapshot passou de SCHEMA_SNAPSHOT_MAX_AGE_SECONDS), o snapshot é servido mesmo
+    assim e um refresh incremental roda em background.
+    """
+    payload = load_schema_snapshot(key)
+    if payload is None:
+        return None
+    max_age = float(os.getenv("SCHEMA_SNAPSHOT_MAX_AGE_SECONDS", "86400"))
+    age = time.time() - payload.get("created_at", 0)
+    stored_fp = payload.get("catalog_fingerprint")
+    fresh = (
+        (max_age <= 0 or age < max_age)
+        and stored_fp is not None
+        and catalog_fingerprint(tables_and_columns) == stored_fp
+    )
+    entry = _make_entry(SchemaModel.from_dict(payload["model"]), refreshing=not fresh)
+    with _SCHEMA_CACHE_LOCK:
+        _SCHEMA_CACHE[key] = entry
+    if not fresh:
+        _start_background_refresh(key, tables_and_columns)
+    return entry
+
+
+def warm_schema_snapshot(
+    tables_and_columns: Dict[str, Optional[Iterable[str]]] | None = None, exact_counts: Optional[bool] = None
+) -> tuple[dict, Optional[str]]:
+    """
+    Introspecção completa gravada em disco (pré-aquecimento no build/deploy).
+    Reaproveita o snapshot existente como base do refresh incremental.
+    Retorna (entrada, caminho do arquivo).
+    """
+    key = _schema_cache_key(tables_and_columns)
+    payload = load_schema_snapshot(key)
+    previous = SchemaModel.from_dict(payload["model"]) if payload else None
+    entry = _load_schema_entry(key, tables_and_columns, previous=previous, exact_counts=exact_counts)
+    path = _snapshot_path(key)
+    saved = path is not None and not entry["model"].error and os.path.exists(path)
+    return entry, path if saved else None
@@ -0,0 +1,281 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Formatos de prompt suportados por SchemaModel.render
+RENDER_FORMATS = ("verbose", "compact")
+
+
+@dataclass(slots=True)
+class ColumnInfo:
+    name: str
+    type: str
+    nullable: bool = True
+    default: Optional[str] = None
+    unique: bool = False
+    comment: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "type": self.type, "nullable": self.nullable,
+            "default": self.default, "unique": self.unique, "comment": self.comment,
+        }
+
+
+@dataclass(slots=True)
+class ForeignKey:
+    column: str
+    ref_table: str
+    ref_column: str
+
+    def to_dict(self) -> dict:
+        return {"column": self.column, "ref_table": self.ref_table, "ref_column": self.ref_column}
+
+
+@dataclass(slots=True)
+class TableInfo:
+    name: str
+    columns: List[ColumnInfo] = field(default_factory=list)
+    pk: List[str] = field(default_factory=list)
+    unique: List[str] = field(default_factory=list)
+    indexes: List[str] = field(default_factory=list)
+    fks: List[ForeignKey] = field(default_factory=list)
+    samples: List[Dict[str, Any]] = field(default_factory=list)
+    count: Optional[int] = None
+    count_estimated: bool = False
+    comment: Optional[str] = None
+    fingerprint: Optional[str] = None
+    introspected_at: float = 0.0
+    _columns_by_name: Dict[str, ColumnInfo] = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._columns_by_name = {c.name.lower(): c for c in self.columns}
+
+    def column(self, name: str) -> Optional[ColumnInfo]:
+        """Coluna pelo nome (sem diferenciar maiúsculas), em O(1)."""
+        return self._columns_by_name.get(name.lower())
+
+    @property
+    def column_names(self) -> List[str]:
+        return [c.name for c in self.columns]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TableInfo":
+        return cls(
+            name=data["name"],
+            columns=[ColumnInfo(**c) for c in data.get("columns", [])],
+            pk=list(data.get("pk", [])),
+            unique=list(data.get("unique", [])),
+            indexes=list(data.get("indexes", [])),
+            fks=[ForeignKey(**fk) for fk in data.get("fks", [])],
+            samples=list(data.get("samples", [])),
+            count=data.get("count"),
+            count_estimated=data.get("count_estimated", False),
+            comment=data.get("comment"),
+            fingerprint=data.get("fingerprint"),
+            introspected_at=data.get("introspected_at", 0.0),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "count": self.count,
+            "count_estimated": self.count_estimated,
+            "pk": list(self.pk),
+            "unique": list(self.unique),
+            "indexes": list(self.indexes),
+            "columns": [c.to_dict() for c in self.columns],
+            "fks": [fk.to_dict() for fk in self.fks],
+            "samples": list(self.samples),
+            "comment": self.comment,
+            "fingerprint": self.fingerprint,
+            "introspected_at": self.introspected_at,
+        }
+
+
+@dataclass(slots=True)
+class SchemaModel:
+    """
+    Modelo tipado do schema do banco externo (resultado da introspecção).
+
+    Mantém índices nome -> tabela (sem diferenciar maiúsculas) e o grafo de FKs
+    (saída e entrada), e memoiza cada renderização por (formato, tabelas). O modelo
+    é tratado como imutável depois de montado: um refresh gera um novo objeto.
+    """
+
+    dialect: Optional[str] = None
+    schema: Optional[str] = None
+    tables: List[TableInfo] = field(default_factory=list)
+    error: Optional[str] = None
+    warning: Optional[str] = None
+    _by_name: Dict[str, TableInfo] = field(default_factory=dict, repr=False, compare=False)
+    _fk_out: Dict[str, Set[str]] = field(default_factory=dict, repr=False, compare=False)
+    _fk_in: Dict[str, Set[str]] = field(default_factory=dict, repr=False, compare=False)
+    _renders: Dict[Tuple[str, Optional[Tuple[str, ...]]], str] = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._by_name = {t.name.lower(): t for t in self.tables}
+        self._fk_out = {}
+        self._fk_in = {}
+        for info in self.tables:
+            for fk in info.fks:
+                self._fk_out.setdefault(info.name, set()).add(fk.ref_table)
+                self._fk_in.setdefault(fk.ref_table, set()).add(info.name)
+
+    def table(self, name: str) -> Optional[TableInfo]:
+        """Tabela pelo nome (sem diferenciar maiúsculas), em O(1)."""
+        return self._by_name.get(name.lower())
+
+    def column(self, table: str, column: str) -> Optional[ColumnInfo]:
+        info = self.table(table)
+        return info.column(column) if info is not None else None
+
+    @property
+    def table_names(self) -> List[str]:
+        return [t.name for t in self.tables]
+
+    def references(self, table: str) -> Set[str]:
+        """Tabelas referenciadas por FKs de `table`."""
+        return self._fk_out.get(table, set())
+
+    def referenced_by(self, table: str) -> Set[str]:
+        """Tabelas com FKs apontando para `table`."""
+        return self._fk_in.get(table, set())
+
+    def fk_closure(self, tables: Iterable[str], depth: int) -> Set[str]:
+        """Inclui as tabelas referenciadas por FK pelas informadas, até `depth` saltos."""
+        selected = set(tables)
+        frontier = set(selected)
+        for _ in range(max(0, depth)):
+            nxt: Set[str] = set()
+            for t in frontier:
+                nxt |= self.references(t)
+            nxt = {self._by_name[t.lower()].name for t in nxt if t.lower() in self._by_name} - selected
+            if not nxt:
+                break
+            selected |= nxt
+            frontier = nxt
+        return selected
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SchemaModel":
+        return cls(
+            dialect=data.get("dialect"),
+            schema=data.get("schema"),
+            tables=[TableInfo.from_dict(t) for t in data.get("tables", [])],
+            error=data.get("error"),
+            warning=data.get("warning"),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "dialect": self.dialect,
+            "schema": self.schema,
+            "tables": [t.to_dict() for t in self.tables],
+            "error": self.error,
+            "warning": self.warning,
+        }
+
+    def render(self, fmt: str = "verbose", tables: Optional[Iterable[str]] = None) -> str:
+        """
+        Texto do schema para o prompt, memoizado por (formato, tabelas).
+
+        fmt: "verbose" (descrição linha a linha, com exemplos de dados) ou "compact"
+        (DDL enxuto, sem exemplos). tables: restringe a um subconjunto (ex.: seleção
+        por relevância).
+        """
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"Formato de schema desconhecido: {fmt}")
+        key = (fmt, tuple(sorted(tables)) if tables is not None else None)
+        text = self._renders.get(key)
+        if text is None:
+            selected = set(key[1]) if key[1] is not None else None
+            text = _render_compact(self, selected) if fmt == "compact" else _render_verbose(self, selected)
+            # Subconjuntos por pergunta variam muito: limita a memória do memo
+            if len(self._renders) >= 256:
+                self._renders.clear()
+            self._renders[key] = text
+        return text
+
+
+def _render_verbose(model: SchemaModel, selected: Optional[Set[str]]) -> str:
+    if model.error:
+        return model.error
+    lines: list[str] = []
+    all_fks_global: list[tuple[str, str, str, str]] = []
+    for info in model.tables:
+        if selected is not None and info.name not in selected:
+            continue
+        table = info.name
+        lines.append(f"Tabela: {table}")
+        if info.count is not None:
+            if info.count_estimated:
+                lines.append(f"  Total de registros: ~{info.count} (estimado)")
+            else:
+                lines.append(f"  Total de registros: {info.count}")
+        if info.pk:
+            lines.append(f"  Primary Key: {', '.join(info.pk)}")
+        if info.unique:
+            lines.append(f"  Unique: {', '.join(info.unique)}")
+        if info.indexes:
+            lines.append(f"  Indexes: {', '.join(info.indexes)}")
+        for col in info.columns:
+            details = [f"{col.name} {col.type}"]
+            if not col.nullable:
+                details.append("NOT NULL")
+            if col.default is not None:
+                details.append(f"DEFAULT {col.default}")
+            if col.unique:
+                details.append("UNIQUE")
+            lines.append(f"  Coluna: {' '.join(details)}")
+        if info.fks:
+            lines.append("  Foreign Keys:")
+        for fk in info.fks:
+            lines.append(f"    {fk.column} -> {fk.ref_table}.{fk.ref_column}")
+            all_fks_global.append((table, fk.column, fk.ref_table, fk.ref_column))
+        if info.samples:
+            lines.append("  Exemplos de dados:")
+            for row in info.samples:
+                lines.append("    " + ", ".join([f"{k}: {v}" for k, v in row.items()]))
+
+    if model.warning:
+        lines.append(f"\nObservação: {model.warning}")
+
+    if all_fks_global:
+        lines.append("\nRelações entre tabelas:")
+        for t, col, ref_t, ref_col in all_fks_global:
+            lines.append(f"  {t}.{col} -> {ref_t}.{ref_col}")
+
+    return "\n".join(lines)
+
+
+def _render_compact(model: SchemaModel, selected: Optional[Set[str]]) -> str:
+    """Uma linha por tabela em DDL compacto (tipos, PK e FKs inline), sem exemplos de dados."""
+    if model.error:
+        return model.error
+    lines: list[str] = []
+    for info in model.tables:
+        if selected is not None and info.name not in selected:
+            continue
+        fks = {fk.column: fk for fk in info.fks}
+        cols = []
+        for col in info.columns:
+            parts = [col.name, col.type]
+            if col.name in info.pk and len(info.pk) == 1:
+                parts.append("PK")
+            elif not col.nullable:
+                parts.append("NOT NULL")
+            if col.unique and col.name not in info.pk:
+                parts.append("UNIQUE")
+            fk = fks.get(col.name)
+            if fk is not None:
+                parts.append(f"-> {fk.ref_table}.{fk.ref_column}")
+            cols.append(" ".join(parts))
+        if len(info.pk) > 1:
+            cols.append(f"PK({', '.join(info.pk)})")
+        line = f"{info.name}({', '.join(cols)})"
+        if info.count is not None:
+            line += f" -- {'~' if info.count_estimated else ''}{info.count} linhas"
+        lines.append(line)
+    if model.warning:
+        lines.append(f"-- Observação: {model.warning}")
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from .schema_model import SchemaModel
+
+# Palavras comuns em perguntas que não ajudam a achar tabelas
+_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+    "um", "uma", "uns", "umas", "por", "para", "com", "sem", "que", "qual", "quais", "quanto",
+    "quantos", "quanta", "quantas", "como", "onde", "quando", "me", "meu", "minha", "se", "ao",
+    "aos", "mais", "menos", "todos", "todas", "the", "of", "and", "in", "to", "for", "is", "are",
+    "how", "many", "what", "which", "hoje", "ontem", "mes", "ano",
+}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def _stem(token: str) -> str:
+    # Stemming leve (plural PT/EN) para "pedido" casar com "pedidos"
+    for suffix in ("oes", "aes", "ies", "es", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Quebra nomes/textos em tokens: separa snake_case, camelCase e números."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    words = re.findall(r"[a-z0-9]+", _normalize(text))
+    return [_stem(w) for w in words if w not in _STOPWORDS and len(w) > 1]
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SchemaIndex:
+    """
+    Índice léxico das tabelas do modelo de introspecção (SchemaModel).
+
+    Cada tabela vira um documento com os tokens do nome (peso maior), colunas,
+    comentários, valores de exemplo e tabelas relacionadas por FK. A relevância
+    combina BM25 com similaridade de trigramas sobre os nomes (para grafias
+    parecidas), e a seleção final inclui o fecho de FKs das tabelas escolhidas.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, model: SchemaModel):
+        self.model = model
+        self.docs: Dict[str, Counter] = {}
+        self.name_tokens: Dict[str, Set[str]] = {}
+        for info in model.tables:
+            name = info.name
+            tokens: List[str] = tokenize(name) * 3
+            for col in info.columns:
+                tokens.extend(tokenize(col.name))
+                if col.comment:
+                    tokens.extend(tokenize(col.comment))
+            if info.comment:
+                tokens.extend(tokenize(info.comment))
+            for row in info.samples:
+                for value in row.values():
+                    if isinstance(value, str) and len(value) <= 80:
+                        tokens.extend(tokenize(value))
+            for fk in info.fks:
+                tokens.extend(tokenize(fk.ref_table))
+            self.docs[name] = Counter(tokens)
+            self.name_tokens[name] = set(tokenize(name))
+        self.avg_len = (sum(sum(d.values()) for d in self.docs.values()) / len(self.docs)) if self.docs else 0.0
+        self.df: Counter = Counter()
+        for doc in self.docs.values():
+            self.df.update(doc.keys())
+
+    def score(self, query: str) -> Dict[str, float]:
+        terms = tokenize(query)
+        n = len(self.docs)
+        scores: Dict[str, float] = {}
+        for table, doc in self.docs.items():
+            doc_len = sum(doc.values())
+            total = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    idf = math.log(1 + (n - self.df[term] + 0.5) / (self.df[term] + 0.5))
+                    norm = tf + self.k1 * (1 - self.b + self.b * doc_len / (self.avg_len or 1))
+                    total += idf * tf * (self.k1 + 1) / norm
+            # Similaridade de trigramas entre termos da pergunta e o nome da tabela
+            best = 0.0
+            for term in terms:
+                tg = _trigrams(term)
+                for name_tok in self.name_tokens[table]:
+                    ntg = _trigrams(name_tok)
+                    best = max(best, len(tg & ntg) / len(tg | ntg))
+            if best >= 0.5:
+                total += best
+            if total > 0:
+                scores[table] = total
+        return scores
+
+    def select(self, query: str, top_k: int, fk_depth: int = 1) -> Optional[List[str]]:
+        """Tabelas relevantes para a pergunta, ou None se nada casar (usar o schema completo)."""
+        scores = self.score(query)
+        if not scores:
+            return None
+        top = sorted(scores, key=lambda t: -scores[t])[:top_k]
+        return sorted(self.model.fk_closure(top, fk_depth))
+
+
+_INDEXES: Dict[int, SchemaIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_schema_index(model: SchemaModel) -> SchemaIndex:
+    """Índice memoizado por snapshot (o modelo em cache é o mesmo objeto até o próximo refresh)."""
+    key = id(model)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None or index.model is not model:
+            index = SchemaIndex(model)
+            # Mantém apenas os snapshots mais recentes
+            if len(_INDEXES) >= 16:
+                _INDEXES.clear()
+            _INDEXES[key] = index
+        return index
+
+
+def select_relevant_tables(model: SchemaModel, question: str) -> Optional[List[str]]:
+    """
+    Seleciona as tabelas relevantes para a pergunta (top-K + fecho de FKs).
+
+    Retorna None quando a seleção não se aplica: desativada (SCHEMA_RETRIEVAL_ENABLED),
+    schema pequeno (menos de SCHEMA_RETRIEVAL_MIN_TABLES tabelas) ou nenhuma tabela casou.
+    """
+    if os.getenv("SCHEMA_RETRIEVAL_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if len(model.tables) < int(os.getenv("SCHEMA_RETRIEVAL_MIN_TABLES", "25")):
+        return None
+    index = get_schema_index(model)
+    return index.select(
+        question,
+        top_k=int(os.getenv("SCHEMA_RETRIEVAL_TOP_K", "8")),
+        fk_depth=int(os.getenv("SCHEMA_RETRIEVAL_FK_DEPTH", "2")),
+    )
@@ -0,0 +1,57 @@
+import re
+from typing import List, Optional, Set
+
+import sqlglot
+from sqlglot import exp
+
+# Nome do dialeto no SQLAlchemy -> nome no sqlglot
+_SQLGLOT_DIALECTS = {
+    "mysql": "mysql",
+    "postgresql": "postgres",
+    "oracle": "oracle",
+    "mssql": "tsql",
+    "sqlite": "sqlite",
+}
+
+
+def sqlglot_dialect(dialect_name: Optional[str]) -> Optional[str]:
+    return _SQLGLOT_DIALECTS.get((dialect_name or "").lower())
+
+
+def parse_statements(sql: str, dialect_name: Optional[str] = None) -> List[exp.Expression]:
+    """Faz o parse de um ou mais statements; levanta sqlglot.errors.ParseError se o SQL for inválido."""
+    return [s for s in sqlglot.parse(sql, read=sqlglot_dialect(dialect_name)) if s is not None]
+
+
+def _parse_one(sql: str, dialect_name: Optional[str]) -> Optional[exp.Expression]:
+    try:
+        statements = parse_statements(sql, dialect_name)
+    except Exception:
+        return None
+    return statements[0] if len(statements) == 1 else None
+
+
+def referenced_tables(sql: str, dialect_name: Optional[str] = None) -> List[str]:
+    """
+    Tabelas físicas referenciadas no SQL (FROM/JOIN/subqueries), sem nomes de CTEs.
+    Se o parse falhar, recorre à extração por regex.
+    """
+    tree = _parse_one(sql, dialect_name)
+    if tree is None:
+        found = re.findall(r'(?:from|join)\s+([\w_.]+)', sql, re.IGNORECASE)
+        return list(dict.fromkeys(t.split(".")[-1] for t in found))
+    cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    tables = []
+    for table in tree.find_all(exp.Table):
+        name = table.name
+        if name and name.lower() not in cte_names:
+            tables.append(name)
+    return list(dict.fromkeys(tables))
+
+
+def referenced_columns(sql: str, dialect_name: Optional[str] = None) -> Set[str]:
+    """Nomes de colunas (em minúsculas) citados no SQL; vazio se o parse falhar."""
+    tree = _parse_one(sql, dialect_name)
+    if tree is None:
+        return set()
+    return {col.name.lower() for col in tree.find_all(exp.Column) if col.name}
@@ -0,0 +1,310 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy import create_engine, literal, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from .connection import _cached_engine, _create_sqlalchemy_engine, _install_statement_timeout, _pool_options
+
+_TARGET_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+# Alvo (banco externo) da requisição atual; None => alvo padrão
+_CURRENT_TARGET: ContextVar[Optional[str]] = ContextVar("db_target", default=None)
+
+T = TypeVar("T")
+
+
+class UnknownTargetError(ValueError):
+    """Id de banco externo que não está no registro (DB_TARGETS_FILE)."""
+
+
+def _url_engine(url: str, pool_overrides: dict, connect_args: dict) -> Engine:
+    pool = {**_pool_options(), **pool_overrides}
+    connect_args = dict(connect_args)
+    if url.startswith("sqlite"):
+        connect_args.setdefault("check_same_thread", False)
+    return create_engine(url, connect_args=connect_args, **pool)
+
+
+class Endpoint:
+    """Um servidor de um alvo (primário ou réplica), com estado de saúde."""
+
+    def __init__(self, target_id: str, name: str, url: Optional[str], weight: float, options: dict):
+        self.target_id = target_id
+        self.name = name
+        self.url = url
+        self.weight = weight
+        self._options = options
+        self.healthy = True
+        self.down_until = 0.0
+        self.last_error: Optional[str] = None
+        self.failures = 0
+
+    def engine(self) -> Engine:
+        """Engine com pool próprio (criado uma vez por processo, como o do alvo padrão)."""
+
+        def factory() -> Engine:
+            if self.url is None:
+                engine = _create_sqlalchemy_engine(os.getenv("TYPE_DB", "mysql").lower())
+            else:
+                engine = _url_engine(self.url, self._options.get("pool", {}), self._options.get("connect_args", {}))
+            _install_statement_timeout(engine)
+            return engine
+
+        return _cached_engine(f"{self.target_id}:{self.name}", factory)
+
+    def available(self, now: float) -> bool:
+        # Fora do ar: volta a ser tentado depois de DB_REPLICA_RETRY_SECONDS (half-open)
+        return self.healthy or now >= self.down_until
+
+    def mark_down(self, error: Exception) -> None:
+        self.healthy = False
+        self.failures += 1
+        self.last_error = str(error)[:300]
+        self.down_until = time.monotonic() + float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+        logging.getLogger(__name__).warning("Banco %s/%s indisponível: %s", self.target_id, self.name, self.last_error)
+
+    def mark_up(self) -> None:
+        if not self.healthy:
+            logging.getLogger(__name__).info("Banco %s/%s disponível novamente", self.target_id, self.name)
+        self.healthy = True
+        self.last_error = None
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class Target:
+    """
+    Banco externo nomeado: primário (introspecção do schema) e réplicas opcionais, que
+    recebem as consultas de leitura do pipeline conforme o peso.
+    """
+
+    def __init__(self, target_id: str, config: dict):
+        self.id = target_id
+        options = {"pool": config.get("pool") or {}, "connect_args": config.get("connect_args") or {}}
+        url = os.path.expandvars(config["url"]) if config.get("url") else None
+        self.primary = Endpoint(target_id, "primary", url, float(config.get("primary_weight", 0)), options)
+        self.replicas = [
+            Endpoint(target_id, f"replica{i}", os.path.expandvars(r["url"]), float(r.get("weight", 1)), options)
+            for i, r in enumerate(config.get("replicas") or [], start=1)
+        ]
+        self.schema_filter = config.get("schema_filter")
+        # Prefixo das chaves de cache do schema; o alvo implícito mantém o formato anterior (TYPE_DB)
+        self.cache_prefix = os.getenv("TYPE_DB", "mysql").lower() if url is None else f"target={target_id}"
+
+    def read_candidates(self) -> List[Endpoint]:
+        """
+        Ordem de tentativa para uma leitura: réplicas disponíveis sorteadas por peso
+        (o primário participa do sorteio se primary_weight > 0) e, por último, o primário.
+        """
+        now = time.monotonic()
+        pool = [r for r in self.replicas if r.weight > 0 and r.available(now)]
+        if self.primary.weight > 0:
+            pool.append(self.primary)
+        # Amostragem ponderada sem reposição (Efraimidis-Spirakis)
+        ordered = sorted(pool, key=lambda e: random.random() ** (1.0 / e.weight), reverse=True)
+        if self.primary not in ordered:
+            ordered.append(self.primary)
+        return ordered
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "dialect": self.primary.engine().dialect.name,
+            "primary": self.primary.status(),
+            "replicas": [r.status() for r in self.replicas],
+        }
+
+
+class TargetRegistry:
+    """
+    Bancos externos atendidos pelo processo.
+
+    Sem DB_TARGETS_FILE há um único alvo ("default") configurado pelas variáveis
+    TYPE_DB/EXT_*, como antes. Com o arquivo (JSON), cada alvo tem URL, réplicas com
+    peso, opções de pool e filtro de schema próprios; veja o README.
+    """
+
+    def __init__(self):
+        self._targets: Optional[Dict[str, Target]] = None
+        self._default_id = "default"
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker: Optional[threading.Thread] = None
+
+    def _load(self) -> Dict[str, Target]:
+        if self._targets is not None:
+            return self._targets
+        with self._lock:
+            if self._targets is not None:
+                return self._targets
+            path = os.getenv("DB_TARGETS_FILE")
+            if not path:
+                self._targets = {"default": Target("default", {})}
+                return self._targets
+            with open(path, encoding="utf-8") as fh:
+                config = json.load(fh)
+            targets = {}
+            for target_id, target_config in (config.get("targets") or {}).items():
+                if not _TARGET_ID_RE.match(target_id):
+                    raise ValueError(f"Id de banco inválido em {path}: {target_id!r}")
+                if not target_config.get("url"):
+                    raise ValueError(f"Banco {target_id!r} sem url em {path}")
+                targets[target_id] = Target(target_id, target_config)
+            if not targets:
+                raise ValueError(f"Nenhum banco configurado em {path}")
+            self._default_id = config.get("default") or next(iter(targets))
+            if self._default_id not in targets:
+                raise ValueError(f"Banco padrão {self._default_id!r} não está em {path}")
+            self._targets = targets
+            return targets
+
+    @property
+    def default_id(self) -> str:
+        self._load()
+        return self._default_id
+
+    def ids(self) -> List[str]:
+        return list(self._load())
+
+    def resolve(self, target_id: Optional[str]) -> str:
+        """Id efetivo (o padrão quando None); UnknownTargetError se não existir."""
+        targets = self._load()
+        if target_id is None:
+            return self._default_id
+        if target_id not in targets:
+            raise UnknownTargetError(f"Banco desconhecido: {target_id}")
+        return target_id
+
+    def get(self, target_id: Optional[str] = None) -> Target:
+        return self._load()[self.resolve(target_id)]
+
+    def check_health(self) -> None:
+        """Testa (SELECT 1) todas as réplicas e atualiza o estado de cada uma."""
+        for target in self._load().values():
+            for endpoint in target.replicas:
+                try:
+                    with endpoint.engine().connect() as conn:
+                        conn.execute(select(literal(1)))
+                    endpoint.mark_up()
+                except Exception as e:
+                    endpoint.mark_down(e)
+
+    def start_health_checks(self) -> None:
+        """Checagem periódica das réplicas (DB_HEALTH_CHECK_INTERVAL_SECONDS, 0 desativa)."""
+        interval = float(os.getenv("DB_HEALTH_CHECK_INTERVAL_SECONDS", "15"))
+        if interval <= 0 or self._checker is not None:
+            return
+        if not any(t.replicas for t in self._load().values()):
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.check_health()
+                except Exception:
+                    logging.getLogger(__name__).exception("Falha na checagem de saúde das réplicas")
+
+        self._checker = threading.Thread(target=loop, name="db-health", daemon=True)
+        self._checker.start()
+
+    def stop_health_checks(self) -> None:
+        self._stop.set()
+        self._checker = None
+
+    def status(self) -> dict:
+        return {"default": self.default_id, "targets": [t.status() for t in self._load().values()]}
+
+
+registry = TargetRegistry()
+
+
+def current_target_id() -> str:
+    return registry.resolve(_CURRENT_TARGET.get())
+
+
+def current_target() -> Target:
+    return registry.get(_CURRENT_TARGET.get())
+
+
+@contextmanager
+def use_target(target_id: Optional[str]):
+    """Direciona o código dentro do bloco (e tasks/threads que copiem o contexto) para o alvo."""
+    token = _CURRENT_TARGET.set(registry.resolve(target_id))
+    try:
+        yield
+    finally:
+        _CURRENT_TARGET.reset(token)
+
+
+def _disconnected(error: Exception) -> bool:
+    # Conexão perdida (servidor caiu, rede): o SQLAlchemy invalida a conexão nesses casos.
+    # Erros da consulta em si (sintaxe, timeout, permissão) não tiram a réplica da rotação.
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def run_read(func: Callable[..., T], *args) -> T:
+    """
+    Executa func(conn, *args) numa conexão de leitura do alvo atual, com failover: se
+    uma réplica recusar a conexão ou a perder durante a execução, ela sai da rotação por
+    DB_REPLICA_RETRY_SECONDS e func é repetida na próxima candidata (por último o
+    primário). func deve apenas ler, já que pode rodar mais de uma vez.
+    """
+    last_error: Optional[Exception] = None
+    for endpoint in current_target().read_candidates():
+        # O primário não sai da rotação (é sempre o último recurso)
+        failover = endpoint.name != "primary"
+        try:
+            conn = endpoint.engine().connect()
+        except Exception as e:
+            if not failover:
+                raise
+            endpoint.mark_down(e)
+            last_error = e
+            continue
+        try:
+            with conn:
+                result = func(conn, *args)
+        except Exception as e:
+            if not (failover and _disconnected(e)):
+                raise
+            endpoint.mark_down(e)
+            last_error = e
+            continue
+        if endpoint.name != "primary":
+            endpoint.mark_up()
+        return result
+    raise last_error
+
+
+def primary_connection():
+    """Conexão com o primário do alvo atual (para o que não pode rodar numa réplica)."""
+    return current_target().primary.engine().connect()
+
+
+def on_primary(conn) -> bool:
+    """True se a conexão (de run_read) é do primário do alvo atual."""
+    return conn.engine is current_target().primary.engine()
+
+
+def copy_context_run(func, *args):
+    """Callable que executa func(*args) no contexto atual (alvo incluso), para executores/threads."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(func, *args)
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+from app.metrics import registry
+
+JOBS = registry.counter("ask_jobs_total", "Jobs de perguntas por desfecho (inclui os recusados na admissão).", ("outcome",))
+JOB_WAIT_SECONDS = registry.histogram("ask_job_queue_seconds", "Tempo dos jobs na fila até começar a rodar.")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(RuntimeError):
+    """Fila de jobs cheia (JOB_QUEUE_MAX_DEPTH): o cliente deve tentar mais tarde."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientQueueLimitError(QueueFullError):
+    """O cliente já tem JOB_MAX_QUEUED_PER_CLIENT jobs aguardando na fila."""
+
+
+@dataclass
+class Job:
+    id: str
+    client: str
+    payload: Any
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        # Acorda quem espera a mudança (long-poll / SSE); o próximo wait usa um evento novo
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_change(self, timeout: float) -> bool:
+        """Aguarda a próxima mudança de estado por até `timeout` segundos."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def view(self, position: Optional[int] = None) -> dict:
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+        if position is not None:
+            out["position"] = position
+        return out
+
+
+class JobQueue(ABC):
+    """
+    Fila de jobs pendentes usada pelo JobManager. A implementação padrão é local ao
+    processo (InMemoryJobQueue); outra fila pode ser passada ao JobManager.
+    """
+
+    @abstractmethod
+    def put(self, job: Job) -> None:
+        """Enfileira o job (sem bloquear)."""
+
+    @abstractmethod
+    async def get(self) -> Job:
+        """Próximo job a executar; aguarda se a fila estiver vazia."""
+
+    @abstractmethod
+    def remove(self, job: Job) -> bool:
+        """Tira um job ainda na fila (cancelamento); False se ele não estava lá."""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Jobs aguardando na fila."""
+
+    @abstractmethod
+    def depth_for(self, client: str) -> int:
+        """Jobs do cliente aguardando na fila."""
+
+    def position(self, job: Job) -> Optional[int]:
+        """Jobs à frente deste; None se a fila não souber estimar."""
+        return None
+
+
+class InMemoryJobQueue(JobQueue):
+    """
+    Fila justa por cliente: uma fila FIFO por cliente, atendidas em rodízio. Um cliente
+    que enfileira muitos jobs não atrasa os jobs dos demais.
+    """
+
+    def __init__(self):
+        self._lanes: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._size = 0
+        self._available: Optional[asyncio.Event] = None
+
+    def _event(self) -> asyncio.Event:
+        if self._available is None:
+            self._available = asyncio.Event()
+        return self._available
+
+    def put(self, job: Job) -> None:
+        self._lanes.setdefault(job.client, deque()).append(job)
+        self._size += 1
+        self._event().set()
+
+    async def get(self) -> Job:
+        while not self._size:
+            self._event().clear()
+            await self._event().wait()
+        client, lane = next(iter(self._lanes.items()))
+        job = lane.popleft()
+        self._size -= 1
+        # O cliente atendido vai para o fim do rodízio
+        del self._lanes[client]
+        if lane:
+            self._lanes[client] = lane
+        return job
+
+    def remove(self, job: Job) -> bool:
+        lane = self._lanes.get(job.client)
+        if lane is None or job not in lane:
+            return False
+        lane.remove(job)
+        self._size -= 1
+        if not lane:
+            del self._lanes[job.client]
+        return True
+
+    def depth(self) -> int:
+        return self._size
+
+    def depth_for(self, client: str) -> int:
+        return len(self._lanes.get(client, ()))
+
+    def position(self, job: Job) -> Optional[int]:
+        """Jobs que serão atendidos antes deste (estimativa, considerando o rodízio)."""
+        lane = self._lanes.get(job.client)
+        if lane is None or job not in lane:
+            return None
+        index = lane.index(job)
+        return sum(min(len(other), index + 1) for other in self._lanes.values()) - 1
+
+
+class JobManager:
+    """
+    Jobs assíncronos de perguntas: o cliente envia a pergunta, recebe um id e consulta
+    (ou acompanha por SSE) o resultado, sem segurar a conexão HTTP durante o pipeline.
+
+    Admissão: com a fila em JOB_QUEUE_MAX_DEPTH jobs, novos envios são recusados
+    (QueueFullError); cada cliente pode ter no máximo JOB_MAX_QUEUED_PER_CLIENT jobs
+    aguardando (ClientQueueLimitError). JOB_WORKERS jobs rodam ao mesmo tempo, e os
+    resultados ficam disponíveis por JOB_RESULT_TTL_SECONDS (até JOB_MAX_RETAINED jobs).
+
+    A chave do cliente vem de quem chama (client_id do corpo, no /jobs), então o limite
+    por cliente serve à justiça entre chamadores confiáveis, não como proteção: quem
+    inventar chaves novas escapa dele. O limite rígido é JOB_QUEUE_MAX_DEPTH.
+    """
+
+    def __init__(self, queue: Optional[JobQueue] = None):
+        self.queue = queue or InMemoryJobQueue()
+        self._handler: Optional[Callable[[Any], Awaitable[dict]]] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+        self.running = 0
+        self.counters = {"submitted": 0, "rejected": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0, "expired": 0}
+
+    @staticmethod
+    def _limits():
+        return (
+            int(os.getenv("JOB_QUEUE_MAX_DEPTH", "200")),
+            int(os.getenv("JOB_MAX_QUEUED_PER_CLIENT", "20")),
+            float(os.getenv("JOB_RESULT_TTL_SECONDS", "600")),
+            int(os.getenv("JOB_MAX_RETAINED", "1000")),
+        )
+
+    def start(self, handler: Callable[[Any], Awaitable[dict]]) -> None:
+        """Inicia os workers (JOB_WORKERS) que executam handler(payload) para cada job."""
+        if self._workers:
+            return
+        self._handler = handler
+        self._stopping = False
+        loop = asyncio.get_running_loop()
+        workers = max(1, int(os.getenv("JOB_WORKERS", "4")))
+        self._workers = [loop.create_task(self._work(), name=f"ask-job-{i}") for i in range(workers)]
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _retry_after(self) -> int:
+        # Estimativa grosseira: um "ciclo" de workers por vez, no mínimo 1s
+        return max(1, min(60, self.queue.depth() // max(1, len(self._workers))))
+
+    def submit(self, payload: Any, client: str) -> Job:
+        """Enfileira um job; levanta QueueFullError/ClientQueueLimitError se recusado."""
+        max_depth, max_per_client, _, _ = self._limits()
+        self._expire()
+        if max_depth > 0 and self.queue.depth() >= max_depth:
+            self.counters["rejected"] += 1
+            JOBS.inc(outcome="rejected")
+            raise QueueFullError("Fila de perguntas cheia; tente novamente em instantes.", self._retry_after())
+        if max_per_client > 0 and self.queue.depth_for(client) >= max_per_client:
+            self.counters["rejected"] += 1
+            JOBS.inc(outcome="rejected")
+            raise ClientQueueLimitError(
+                f"Limite de {max_per_client} perguntas aguardando por cliente atingido.", self._retry_after()
+            )
+        job = Job(id=uuid.uuid4().hex, client=client, payload=payload)
+        self._jobs[job.id] = job
+        self.queue.put(job)
+        self.counters["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        return self.queue.position(job) if job.status == QUEUED else None
+
+    def cancel(self, job: Job) -> bool:
+        """Cancela um job na fila ou em execução; False se ele já terminou."""
+        if job.status == QUEUED and self.queue.remove(job):
+            self._finish(job, CANCELLED)
+            return True
+        if job.status == RUNNING and job._task is not None:
+            job._task.cancel()
+            return True
+        return False
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.queue.get()
+            if job.status != QUEUED:
+                continue
+            job.started_at = time.time()
+            JOB_WAIT_SECONDS.observe(job.started_at - job.created_at)
+            job._set_status(RUNNING)
+            self.running += 1
+            # Task própria por job: permite cancelar o job sem derrubar o worker
+            job._task = asyncio.get_running_loop().create_task(self._handler(job.payload))
+            try:
+                job.result = await job._task
+                self._finish(job, SUCCEEDED)
+            except asyncio.CancelledError:
+                # Job cancelado (DELETE) ou worker encerrado no shutdown, que cancela o job junto
+                self._finish(job, CANCELLED)
+                if self._stopping:
+                    raise
+            except Exception:
+                logging.getLogger(__name__).exception("Erro inesperado no job %s", job.id)
+                job.error = "Não foi possível processar sua solicitação no momento."
+                self._finish(job, FAILED)
+            finally:
+                self.running -= 1
+                job._task = None
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.finished_at = time.time()
+        job.payload = None
+        self.counters[status] += 1
+        JOBS.inc(outcome=status)
+        job._set_status(status)
+        self._expire()
+
+    def _expire(self) -> None:
+        """Descarta jobs terminados há mais de JOB_RESULT_TTL_SECONDS ou além de JOB_MAX_RETAINED."""
+        _, _, ttl, max_retained = self._limits()
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.status in FINISHED]
+        excess = len(self._jobs) - max_retained if max_retained > 0 else 0
+        for job in finished:
+            if (ttl > 0 and now - job.finished_at > ttl) or excess > 0:
+                del self._jobs[job.id]
+                self.counters["expired"] += 1
+                excess -= 1
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.depth(),
+            "running": self.running,
+            "workers": len(self._workers),
+            "retained": len(self._jobs),
+            **self.counters,
+        }
+
+
+job_manager = JobManager()
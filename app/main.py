@@ -1,13 +1,70 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import anyio.to_thread
+import asyncio
+import json
 import logging
+import time
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from . import schemas, crud
 from .database import SessionLocal
-from app.ai.pipeline import ChatPipeline
+from app.ai.pipeline import ChatPipeline, load_schema_filter
+from app.ai.memory import conversation_memory
+from app.ai.chat import close_clients
+from app.db_external.schema import get_schema_snapshot, invalidate_schema_cache
+from app.ai.question_cache import question_cache
+from app.db_external.result_cache import result_cache, target_result_caches
+from app.db_external.targets import UnknownTargetError, registry as db_targets, use_target
+from app.singleflight import single_flight_stats
+from app.retention import retention_worker
+from app.jobs import FINISHED, ClientQueueLimitError, QueueFullError, job_manager
+from app import metrics
+from app.db_external.connection import dispose_engines
+from app.db_external.query import shutdown_executor
+from contextlib import asynccontextmanager
 import os
 
-app = FastAPI()
+
+async def _preload_schemas():
+    # Um snapshot por banco alvo (DB_TARGETS_FILE); a thread herda o banco do contexto
+    for target_id in db_targets.ids():
+        with use_target(target_id):
+            try:
+                await asyncio.to_thread(get_schema_snapshot, load_schema_filter())
+            except Exception:
+                logging.getLogger(__name__).warning("Falha ao pré-carregar o schema do banco %s", target_id, exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Threads para código síncrono (dependências e acesso ao banco interno)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("APP_THREADPOOL_SIZE", "40"))
+    retention_worker.start()
+    # Carrega o schema no boot (do snapshot em disco, se houver), fora do caminho do primeiro /ask
+    preload = None
+    if os.getenv("SCHEMA_PRELOAD_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        preload = asyncio.create_task(_preload_schemas())
+    # Checagem periódica das réplicas de leitura (se houver)
+    db_targets.start_health_checks()
+    # Workers dos jobs assíncronos (/jobs)
+    job_manager.start(_run_job)
+    yield
+    if preload is not None and not preload.done():
+        preload.cancel()
+    await job_manager.stop()
+    await conversation_memory.stop()
+    await retention_worker.stop()
+    db_targets.stop_health_checks()
+    await close_clients()
+    # Fecha o executor e os pools de conexões dos bancos externos
+    shutdown_executor()
+    dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Dependency
 def get_db():
@@ -31,46 +88,476 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     return True
 
 
-@app.post("/ask")
-def ask_question(question: schemas.Question, auth: bool = Depends(verify_token), db: Session = Depends(get_db)):
-    # Le limites configuráveis
-    max_history_rows = int(os.getenv("MAX_HISTORY_ROWS", "500"))
-    max_sessions = int(os.getenv("MAX_SESSIONS", "100"))
-    keep_last_pairs = int(os.getenv("HISTORY_KEEP_LAST_PAIRS", "5"))
+def _resolve_target(target: str | None) -> str:
+    """Id do banco externo pedido (o padrão quando None); 400 se não estiver configurado."""
+    try:
+        return db_targets.resolve(target)
+    except UnknownTargetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _prepare_session(db: Session, session_id: int | None):
+    """Carrega/cria a sessão e monta o histórico (acesso síncrono ao banco interno)."""
     # Gerencia sessão
-    session_id = question.session_id
     if session_id:
         session = crud.get_session(db, session_id)
         if not session:
             session = crud.create_session(db)
     else:
         session = crud.create_session(db)
-    # Pruning global (histórico e sessões)
-    try:
-        crud.prune_sessions(db, max_sessions)
-        crud.prune_history(db, max_history_rows)
-    except Exception:
-        pass
-    # Busca histórico da sessão
-    history_objs = crud.get_last_histories_by_session(db, session.id, keep_last_pairs)
-    history_msgs = []
-    for h in history_objs:
-        history_msgs.append({"role": "user", "content": h.question})
-        history_msgs.append({"role": "assistant", "content": h.answer})
+    # Histórico da sessão: turnos recentes dentro do orçamento de tokens + resumo dos antigos
+    return session, conversation_memory.load(db, session)
+
+
+def _cache_stats_samples():
+    """Contadores dos caches para o /metrics (lidos na coleta)."""
+    for name, stats in (("question", question_cache.stats()), ("result", result_cache.stats())):
+        yield (name, "hits"), stats["hits"]
+        yield (name, "misses"), stats["misses"]
+        yield (name, "entries"), stats["entries"]
+
+
+metrics.registry.gauge_callback(
+    "ask_cache_stats", "Acertos, falhas e entradas dos caches de pergunta e de resultado.", ("cache", "stat"), _cache_stats_samples
+)
+metrics.registry.gauge_callback(
+    "ask_cache_hit_ratio",
+    "Taxa de acerto dos caches de pergunta e de resultado.",
+    ("cache",),
+    lambda: [(("question",), question_cache.stats()["hit_ratio"]), (("result",), result_cache.stats()["hit_ratio"])],
+)
+
+
+def _outcome(clarification) -> str:
+    return "clarification" if clarification else "answered"
+
+
+def _answer_body(answer, sql, result, clarification, session_id: int, history_id: int, usage) -> dict:
+    """Corpo da resposta do /ask (também é o resultado dos jobs)."""
+    return {
+        "answer": answer,
+        "sql": sql,
+        "result": result.rows if result is not None else None,
+        "result_meta": result.meta() if result is not None else None,
+        "clarification": clarification,
+        "session_id": session_id,
+        "history_id": history_id,
+        "usage": usage,
+    }
+
+
+@app.post("/ask")
+async def ask_question(
+    question: schemas.Question, response: Response, auth: bool = Depends(verify_token), db: Session = Depends(get_db)
+):
+    target_id = _resolve_target(question.target)
+    started = time.perf_counter()
+    timings = metrics.start_request_timings()
+    usage = metrics.start_request_usage()
+    # Acesso ao banco interno roda no threadpool; OpenAI e banco externo são aguardados sem bloquear o loop
+    with metrics.stage("session"):
+        session, history_msgs = await run_in_threadpool(_prepare_session, db, question.session_id)
+    # Pruning global (histórico e sessões) roda no retention_worker, fora do caminho da requisição
+    retention_worker.notify_request()
     # Pipeline com histórico
     try:
-        pipeline = ChatPipeline()
-        answer, sql, result, clarification = pipeline.ask(question.question, history_msgs)
+        with use_target(target_id):
+            pipeline = await ChatPipeline.create()
+            answer, sql, result, clarification = await pipeline.ask(
+                question.question, history_msgs, use_cache=not question.bypass_cache
+            )
     except Exception as e:
         logging.getLogger(__name__).exception("Erro inesperado no endpoint /ask")
+        metrics.REQUESTS.inc(endpoint="ask", outcome="error")
         raise HTTPException(status_code=500, detail="Não foi possível processar sua solicitação no momento.")
     # Salva histórico da pergunta e resposta final
-    history = crud.create_history(db, question=question.question, answer=answer, session_id=session.id)
+    with metrics.stage("save_history"):
+        history = await run_in_threadpool(
+            crud.create_history, db, question=question.question, answer=answer, session_id=session.id, sql=sql
+        )
+    conversation_memory.schedule_summary(session.id, pipeline.ai)
+    elapsed = time.perf_counter() - started
+    metrics.REQUESTS.inc(endpoint="ask", outcome=_outcome(clarification))
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint="ask")
+    if metrics.server_timing_enabled():
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings, total=elapsed)
+    return _answer_body(answer, sql, result, clarification, session.id, history.id, usage)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+def _save_history(question: str, answer: str, session_id: int, sql: str | None):
+    # Sessão própria: a resposta em streaming termina depois do ciclo de vida das dependências
+    db = SessionLocal()
+    try:
+        return crud.create_history(db, question=question, answer=answer, session_id=session_id, sql=sql)
+    finally:
+        db.close()
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(question: schemas.Question, auth: bool = Depends(verify_token), db: Session = Depends(get_db)):
+    """Mesmo fluxo do /ask, emitindo server-sent events: sql, result, token..., done."""
+    target_id = _resolve_target(question.target)
+    started = time.perf_counter()
+    session, history_msgs = await run_in_threadpool(_prepare_session, db, question.session_id)
+    # Pruning global (histórico e sessões) roda no retention_worker, fora do caminho da requisição
+    retention_worker.notify_request()
+    session_id = session.id
+
+    async def events():
+        answer = None
+        timings = metrics.start_request_timings()
+        usage = metrics.start_request_usage()
+        try:
+            with use_target(target_id):
+                pipeline = await ChatPipeline.create()
+                async for event, data in pipeline.ask_stream(
+                    question.question, history_msgs, use_cache=not question.bypass_cache
+                ):
+                    if event == "answer":
+                        answer = data
+                        continue
+                    yield _sse(event, data)
+        except Exception:
+            logging.getLogger(__name__).exception("Erro inesperado no endpoint /ask/stream")
+            metrics.REQUESTS.inc(endpoint="ask_stream", outcome="error")
+            yield _sse("error", {"detail": "Não foi possível processar sua solicitação no momento."})
+            return
+        # Salva histórico da pergunta e resposta final
+        with metrics.stage("save_history"):
+            history = await run_in_threadpool(
+                _save_history, question.question, answer["answer"], session_id, answer["sql"]
+            )
+        conversation_memory.schedule_summary(session_id, pipeline.ai)
+        elapsed = time.perf_counter() - started
+        metrics.REQUESTS.inc(endpoint="ask_stream", outcome=_outcome(answer.get("clarification")))
+        metrics.REQUEST_SECONDS.observe(elapsed, endpoint="ask_stream")
+        done = {**answer, "session_id": session_id, "history_id": history.id, "usage": usage}
+        if metrics.server_timing_enabled():
+            # Headers já foram enviados no streaming: os tempos vão no evento final
+            done["timings"] = {**metrics.timings_dict(timings), "total": round(elapsed * 1000, 1)}
+        yield _sse("done", done)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _batch_group(item, index: int):
+    """Chave do grupo de uma pergunta do lote: a sessão informada ou a própria pergunta."""
+    return item.session_id or ("item", index)
+
+
+def _prepare_batch_sessions(db: Session, items):
+    """
+    Ids de sessão e históricos do lote, por grupo (uma leitura por sessão distinta). Cada
+    pergunta sem session_id ganha uma sessão nova só sua, todas criadas em uma transação.
+    """
+    prepared = {}
+    for session_id in dict.fromkeys(item.session_id for item in items if item.session_id):
+        session, history_msgs = _prepare_session(db, session_id)
+        prepared[session_id] = (session.id, history_msgs)
+    new_groups = [_batch_group(item, index) for index, item in enumerate(items) if not item.session_id]
+    if new_groups:
+        for group, session_id in zip(new_groups, crud.create_sessions(db, len(new_groups))):
+            prepared[group] = (session_id, [])
+    return prepared
+
+
+def _save_histories(entries):
+    # Sessão própria: no streaming o lote termina depois do ciclo de vida das dependências
+    db = SessionLocal()
+    try:
+        return crud.create_histories(db, entries)
+    finally:
+        db.close()
+
+
+async def _create_batch_pipelines(targets) -> dict:
+    """Um pipeline por banco alvo do lote (mesmo snapshot de schema e prompt para as perguntas de cada banco)."""
+    pipelines = {}
+    for target_id in dict.fromkeys(targets):
+        with use_target(target_id):
+            pipelines[target_id] = await ChatPipeline.create()
+    return pipelines
+
+
+async def _answer_batch(pipelines: dict, items, targets, prepared, concurrency: int):
+    """
+    Responde as perguntas do lote com um pipeline por banco alvo e gera os resultados na
+    ordem em que ficam prontos.
+
+    Perguntas da mesma sessão rodam em sequência, cada uma vendo as respostas anteriores
+    do lote no histórico; as demais rodam em paralelo, até `concurrency` por vez.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    finished: asyncio.Queue = asyncio.Queue()
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(_batch_group(item, index), []).append(index)
+
+    async def run_group(indexes):
+        session_id, history_msgs = prepared[_batch_group(items[indexes[0]], indexes[0])]
+        for index in indexes:
+            item = items[index]
+            target_id = targets[index]
+            out = {"index": index, "question": item.question, "session_id": session_id, "target": target_id}
+            async with semaphore:
+                try:
+                    with use_target(target_id):
+                        answer, sql, result, clarification = await pipelines[target_id].ask(
+                            item.question, history_msgs, use_cache=not item.bypass_cache
+                        )
+                    out.update({
+                        "answer": answer,
+                        "sql": sql,
+                        "result": result.rows if result is not None else None,
+                        "result_meta": result.meta() if result is not None else None,
+                        "clarification": clarification,
+                        "error": None,
+                    })
+                    metrics.REQUESTS.inc(endpoint="ask_batch", outcome=_outcome(clarification))
+                except Exception:
+                    logging.getLogger(__name__).exception("Erro inesperado em pergunta do /ask/batch")
+                    metrics.REQUESTS.inc(endpoint="ask_batch", outcome="error")
+                    out["error"] = "Não foi possível processar esta pergunta no momento."
+            if out["error"] is None:
+                history_msgs = conversation_memory.extend(history_msgs, item.question, out["answer"], out["sql"])
+            await finished.put(out)
+
+    tasks = [asyncio.create_task(run_group(indexes)) for indexes in groups.values()]
+    try:
+        for _ in range(len(items)):
+            yield await finished.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _history_entries(outputs):
+    """Registros de histórico do lote, na ordem das perguntas (itens com erro não são gravados)."""
+    ok = sorted((o for o in outputs if o["error"] is None), key=lambda o: o["index"])
+    return ok, [(o["question"], o["answer"], o["session_id"], o["sql"]) for o in ok]
+
+
+@app.post("/ask/batch")
+async def ask_batch(batch: schemas.BatchQuestion, auth: bool = Depends(verify_token), db: Session = Depends(get_db)):
+    """
+    Várias perguntas em uma chamada: sessões lidas uma vez, schema e pipeline
+    compartilhados, perguntas em paralelo e histórico gravado em uma única transação.
+    """
+    max_items = int(os.getenv("ASK_BATCH_MAX_ITEMS", "100"))
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="O lote não contém perguntas.")
+    if len(batch.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"O lote excede o limite de {max_items} perguntas.")
+    limit = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+    concurrency = max(1, min(batch.concurrency or limit, limit))
+    targets = [_resolve_target(item.target or batch.target) for item in batch.items]
+    started = time.perf_counter()
+    prepared = await run_in_threadpool(_prepare_batch_sessions, db, batch.items)
+    for _ in batch.items:
+        retention_worker.notify_request()
+
+    if not batch.stream:
+        try:
+            pipelines = await _create_batch_pipelines(targets)
+            outputs = [out async for out in _answer_batch(pipelines, batch.items, targets, prepared, concurrency)]
+        except Exception:
+            logging.getLogger(__name__).exception("Erro inesperado no endpoint /ask/batch")
+            raise HTTPException(status_code=500, detail="Não foi possível processar sua solicitação no momento.")
+        ok, entries = _history_entries(outputs)
+        with metrics.stage("save_history"):
+            history_ids = await run_in_threadpool(crud.create_histories, db, entries) if entries else []
+        for out, history_id in zip(ok, history_ids):
+            out["history_id"] = history_id
+        for session_id, target_id in {out["session_id"]: out["target"] for out in ok}.items():
+            conversation_memory.schedule_summary(session_id, pipelines[target_id].ai)
+        outputs.sort(key=lambda o: o["index"])
+        for out in outputs:
+            out.setdefault("history_id", None)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="ask_batch")
+        return {"items": outputs}
+
+    async def events():
+        outputs = []
+        try:
+            pipelines = await _create_batch_pipelines(targets)
+            async for out in _answer_batch(pipelines, batch.items, targets, prepared, concurrency):
+                outputs.append(out)
+                yield _sse("item", out)
+        except Exception:
+            logging.getLogger(__name__).exception("Erro inesperado no endpoint /ask/batch")
+            yield _sse("error", {"detail": "Não foi possível processar sua solicitação no momento."})
+            return
+        ok, entries = _history_entries(outputs)
+        with metrics.stage("save_history"):
+            history_ids = await run_in_threadpool(_save_histories, entries) if entries else []
+        for session_id, target_id in {out["session_id"]: out["target"] for out in ok}.items():
+            conversation_memory.schedule_summary(session_id, pipelines[target_id].ai)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="ask_batch")
+        yield _sse("done", {"history_ids": {out["index"]: history_id for out, history_id in zip(ok, history_ids)}})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _prepare_job_session(session_id: int | None):
+    # Sessão própria: o job roda fora do ciclo de vida da requisição que o criou
+    db = SessionLocal()
+    try:
+        return _prepare_session(db, session_id)
+    finally:
+        db.close()
+
+
+async def _run_job(question: schemas.JobQuestion) -> dict:
+    """Mesmo fluxo do /ask, executado por um worker da fila de jobs."""
+    started = time.perf_counter()
+    metrics.start_request_timings()
+    usage = metrics.start_request_usage()
+    try:
+        with metrics.stage("session"):
+            session, history_msgs = await run_in_threadpool(_prepare_job_session, question.session_id)
+        retention_worker.notify_request()
+        with use_target(question.target):
+            pipeline = await ChatPipeline.create()
+            answer, sql, result, clarification = await pipeline.ask(
+                question.question, history_msgs, use_cache=not question.bypass_cache
+            )
+        with metrics.stage("save_history"):
+            history = await run_in_threadpool(_save_history, question.question, answer, session.id, sql)
+    except asyncio.CancelledError:
+        metrics.REQUESTS.inc(endpoint="job", outcome="cancelled")
+        raise
+    except Exception:
+        metrics.REQUESTS.inc(endpoint="job", outcome="error")
+        raise
+    conversation_memory.schedule_summary(session.id, pipeline.ai)
+    metrics.REQUESTS.inc(endpoint="job", outcome=_outcome(clarification))
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="job")
+    return _answer_body(answer, sql, result, clarification, session.id, history.id, usage)
+
+
+def _get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado (ou expirado).")
+    return job
+
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(question: schemas.JobQuestion, auth: bool = Depends(verify_token)):
+    """
+    Enfileira a pergunta e responde na hora com o id do job; o resultado é obtido em
+    GET /jobs/{id} (com long-poll opcional) ou GET /jobs/{id}/events (SSE).
+    """
+    target_id = _resolve_target(question.target)
+    # client_id é informado pelo chamador (o token é único): serve à justiça, não limita abuso
+    client = question.client_id or (f"session:{question.session_id}" if question.session_id else "anonymous")
+    try:
+        job = job_manager.submit(question.model_copy(update={"target": target_id}), client)
+    except ClientQueueLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return job.view(job_manager.position(job))
+
+
+@app.get("/jobs/stats")
+def jobs_stats(auth: bool = Depends(verify_token)):
+    return job_manager.stats()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, auth: bool = Depends(verify_token)):
+    """Estado do job; com `wait`, aguarda até esse tanto de segundos (JOB_MAX_WAIT_SECONDS) pelo resultado."""
+    job = _get_job(job_id)
+    deadline = time.monotonic() + max(0.0, min(wait, float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))))
+    while job.status not in FINISHED:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not await job.wait_change(remaining):
+            break
+    return job.view(job_manager.position(job))
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, auth: bool = Depends(verify_token)):
+    """Server-sent events do job: `status` a cada mudança de estado e `done` com o resultado."""
+    job = _get_job(job_id)
+
+    async def events():
+        last = None
+        while True:
+            if job.status != last:
+                last = job.status
+                yield _sse("status", {"status": job.status, "position": job_manager.position(job)})
+            if job.status in FINISHED:
+                yield _sse("done", job.view())
+                return
+            if not await job.wait_change(15):
+                # Comentário SSE: mantém a conexão aberta em proxies enquanto o job espera/roda
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, auth: bool = Depends(verify_token)):
+    job = _get_job(job_id)
+    return {"cancelled": job_manager.cancel(job), "status": job.status}
+
+
+@app.post("/schema/invalidate")
+def invalidate_schema(auth: bool = Depends(verify_token)):
+    # Força nova introspecção do banco externo no próximo /ask
+    removed = invalidate_schema_cache()
+    return {"invalidated": removed}
+
+
+@app.get("/cache/stats")
+def cache_stats(auth: bool = Depends(verify_token)):
     return {
-        "answer": answer,
-        "sql": sql,
-        "result": result,
-        "clarification": clarification,
-        "session_id": session.id,
-        "history_id": history.id
+        "question_cache": question_cache.stats(),
+        "result_cache": result_cache.stats(),
+        # Caches de resultados dos demais bancos de DB_TARGETS_FILE
+        "result_cache_targets": {target_id: cache.stats() for target_id, cache in target_result_caches().items()},
+        "single_flight": single_flight_stats(),
     }
+
+
+@app.post("/cache/invalidate")
+def invalidate_cache(auth: bool = Depends(verify_token)):
+    # Limpa o cache em memória de pergunta -> SQL (entradas persistidas expiram pelo TTL/fingerprint)
+    # e os caches de resultados de todos os bancos (memória e backend compartilhado)
+    removed = result_cache.clear() + sum(cache.clear() for cache in target_result_caches().values())
+    return {"question_cache": question_cache.clear(), "result_cache": removed}
+
+
+@app.get("/targets")
+def targets_status(auth: bool = Depends(verify_token)):
+    # Bancos externos configurados, com o estado de saúde do primário e das réplicas
+    return db_targets.status()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(auth: bool = Depends(verify_token)):
+    # Formato texto do Prometheus (configure o scrape com o mesmo Bearer token)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/retention/stats")
+def retention_stats(auth: bool = Depends(verify_token)):
+    return retention_worker.metrics
@@ -0,0 +1,249 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Buckets padrão (segundos) para latências de etapas e requisições
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_ROWS_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 10000)
+_BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels_text(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=_SECONDS_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # chave -> ([contagem por bucket], soma, total)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {n}")
+        return lines
+
+
+class _CallbackGauge(_Metric):
+    """Gauge lido no momento da coleta (ex.: contadores dos caches)."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, help_text: str, labelnames: Iterable[str], collect: Callable[[], Iterable[Tuple[Tuple, float]]]
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        try:
+            items = sorted(self.collect())
+        except Exception:
+            items = []
+        return self.header() + [f"{self.name}{_labels_text(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class MetricsRegistry:
+    """Registro mínimo de métricas no formato texto do Prometheus (sem dependências externas)."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=_SECONDS_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, labelnames: Iterable[str], collect) -> None:
+        with self._lock:
+            # Substitui o coletor anterior (ex.: reload do app)
+            self._metrics[name] = _CallbackGauge(name, help_text, labelnames, collect)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("ask_requests_total", "Requisições de perguntas por endpoint e desfecho.", ("endpoint", "outcome"))
+REQUEST_SECONDS = registry.histogram("ask_request_seconds", "Latência total das requisições de perguntas.", ("endpoint",))
+STAGE_SECONDS = registry.histogram("ask_stage_seconds", "Latência de cada etapa do pipeline de perguntas.", ("stage",))
+LLM_REQUESTS = registry.counter("openai_requests_total", "Chamadas à OpenAI por tipo de chamada.", ("call",))
+LLM_TOKENS = registry.counter("openai_tokens_total", "Tokens reportados pela OpenAI (campo usage).", ("call", "kind"))
+RESULT_ROWS = registry.histogram("ask_result_rows", "Linhas retornadas pelas consultas no banco externo.", ("cached",), _ROWS_BUCKETS)
+RESULT_BYTES = registry.histogram("ask_result_bytes", "Bytes (aprox.) retornados pelas consultas no banco externo.", ("cached",), _BYTES_BUCKETS)
+
+
+# Tempos das etapas da requisição atual (para o header Server-Timing)
+_TIMINGS: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("ask_timings", default=None)
+
+
+# Tokens consumidos pela requisição atual (campo usage das respostas da OpenAI)
+_USAGE: ContextVar[Optional[Dict[str, int]]] = ContextVar("ask_usage", default=None)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Começa a registrar os tempos das etapas da requisição atual (contexto asyncio/threads)."""
+    timings: List[Tuple[str, float]] = []
+    _TIMINGS.set(timings)
+    return timings
+
+
+def start_request_usage() -> Dict[str, int]:
+    """Começa a somar os tokens da requisição atual; o dict é preenchido por record_usage."""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    _USAGE.set(usage)
+    return usage
+
+
+@contextmanager
+def stage(name: str):
+    """Mede uma etapa do pipeline: alimenta ask_stage_seconds e os tempos da requisição atual."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _TIMINGS.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def record_usage(call: str, usage) -> None:
+    """Contabiliza o campo usage de uma resposta da OpenAI (prompt/completion e tokens em cache)."""
+    LLM_REQUESTS.inc(call=call)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    LLM_TOKENS.inc(prompt, call=call, kind="prompt")
+    LLM_TOKENS.inc(completion, call=call, kind="completion")
+    if cached:
+        LLM_TOKENS.inc(cached, call=call, kind="cached_prompt")
+    current = _USAGE.get()
+    if current is not None:
+        current["prompt_tokens"] += prompt
+        current["completion_tokens"] += completion
+        current["cached_tokens"] += cached
+
+
+def observe_result(result) -> None:
+    """Linhas e bytes de um QueryResult."""
+    if result is None:
+        return
+    cached = "true" if getattr(result, "cached", False) else "false"
+    RESULT_ROWS.observe(result.row_count, cached=cached)
+    RESULT_BYTES.observe(result.bytes, cached=cached)
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """Valor do header Server-Timing (etapas repetidas, como duas gerações de SQL, são somadas)."""
+    summed: Dict[str, float] = {}
+    for name, elapsed in timings:
+        summed[name] = summed.get(name, 0.0) + elapsed
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in summed.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def timings_dict(timings: List[Tuple[str, float]]) -> Dict[str, float]:
+    """Tempos por etapa em milissegundos (para o evento final do /ask/stream)."""
+    summed: Dict[str, float] = {}
+    for name, elapsed in timings:
+        summed[name] = summed.get(name, 0.0) + elapsed
+    return {name: round(elapsed * 1000, 1) for name, elapsed in summed.items()}
+
+
+def server_timing_enabled() -> bool:
+    return os.getenv("SERVER_TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
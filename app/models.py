@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,7 +10,13 @@ class Session(Base):
     __tablename__ = "session"
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Resumo dos turnos antigos (app.ai.memory) e o último history.id incorporado a ele
+    summary = Column(Text, nullable=True)
+    summary_history_id = Column(Integer, nullable=True)
     histories = relationship("History", back_populates="session")
+    __table_args__ = (
+        Index("ix_session_created_at_id", "created_at", "id"),
+    )
 
 class History(Base):
     __tablename__ = "history"
@@ -18,5 +24,17 @@ class History(Base):
     session_id = Column(Integer, ForeignKey("session.id"), nullable=False)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
+    sql = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     session = relationship("Session", back_populates="histories")
+    __table_args__ = (
+        Index("ix_history_session_created_at_id", "session_id", "created_at", "id"),
+        Index("ix_history_created_at_id", "created_at", "id"),
+    )
+
+class QuestionCache(Base):
+    __tablename__ = "question_cache"
+    cache_key = Column(String(64), primary_key=True)
+    question = Column(Text, nullable=False)
+    sql = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
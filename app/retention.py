@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from . import crud
+from .database import SessionLocal
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_LOCK_NAME = "flowia_retention"
+
+
+def _try_lock_file(fh) -> bool:
+    """Lock exclusivo e não bloqueante no arquivo (flock no POSIX, msvcrt.locking no Windows)."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock_file(fh) -> None:
+    if fcntl is not None:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+    else:
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _single_runner_guard(db):
+    """
+    Garante um único executor de retenção entre processos (workers do uvicorn).
+
+    MySQL usa GET_LOCK e PostgreSQL pg_try_advisory_lock (vale entre hosts); nos demais
+    bancos cai para um lock em arquivo local (flock; msvcrt.locking no Windows) (vale entre processos do mesmo host).
+    Entrega True se este processo obteve o lock.
+    """
+    engine = db.get_bind()
+    dialect = engine.dialect.name
+    if dialect in ("mysql", "postgresql"):
+        # Locks de sessão: ficam numa conexão dedicada, separada da usada pelos DELETEs/commits
+        if dialect == "mysql":
+            acquire_sql, release_sql, params = "SELECT GET_LOCK(:name, 0)", "SELECT RELEASE_LOCK(:name)", {"name": _LOCK_NAME}
+        else:
+            key = zlib.crc32(_LOCK_NAME.encode())
+            acquire_sql, release_sql, params = "SELECT pg_try_advisory_lock(:key)", "SELECT pg_advisory_unlock(:key)", {"key": key}
+        with engine.connect() as lock_conn:
+            acquired = bool(lock_conn.execute(text(acquire_sql), params).scalar())
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    lock_conn.execute(text(release_sql), params)
+        return
+    path = os.path.join(tempfile.gettempdir(), f"{_LOCK_NAME}.lock")
+    with open(path, "w") as fh:
+        if not _try_lock_file(fh):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            _unlock_file(fh)
+
+
+class RetentionWorker:
+    """
+    Pruning de history/session fora do caminho do /ask.
+
+    Roda em background a cada RETENTION_INTERVAL_SECONDS ou antes disso, quando o
+    contador de requisições chega a RETENTION_EVERY_N_REQUESTS. Remove em lotes de
+    RETENTION_BATCH_SIZE linhas respeitando MAX_HISTORY_ROWS, MAX_SESSIONS e
+    (opcionalmente) RETENTION_MAX_AGE_DAYS.
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv("RETENTION_INTERVAL_SECONDS", "300"))
+        self.every_n_requests = int(os.getenv("RETENTION_EVERY_N_REQUESTS", "200"))
+        self._requests = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._run_lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,
+            "skipped_locked": 0,
+            "errors": 0,
+            "deleted_history": 0,
+            "deleted_sessions": 0,
+            "last_run_at": None,
+            "last_duration_seconds": None,
+        }
+
+    def notify_request(self) -> None:
+        """Conta uma requisição; ao atingir o limite, antecipa a próxima execução."""
+        self._requests += 1
+        if self.every_n_requests > 0 and self._requests >= self.every_n_requests and self._wakeup is not None:
+            self._requests = 0
+            self._wakeup.set()
+
+    def run_once(self) -> dict:
+        """Executa uma rodada de retenção (síncrona). Retorna o que foi removido."""
+        max_history_rows = int(os.getenv("MAX_HISTORY_ROWS", "500"))
+        max_sessions = int(os.getenv("MAX_SESSIONS", "100"))
+        batch_size = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+        max_age_days = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+        older_than = datetime.utcnow() - timedelta(days=max_age_days) if max_age_days > 0 else None
+
+        if not self._run_lock.acquire(blocking=False):
+            self.metrics["skipped_locked"] += 1
+            return {"skipped": True}
+        started = time.monotonic()
+        db = SessionLocal()
+        try:
+            with _single_runner_guard(db) as acquired:
+                if not acquired:
+                    self.metrics["skipped_locked"] += 1
+                    return {"skipped": True}
+                sessions = crud.prune_sessions(db, max_sessions, batch_size=batch_size, older_than=older_than)
+                history = crud.prune_history(db, max_history_rows, batch_size=batch_size, older_than=older_than)
+            self.metrics["runs"] += 1
+            self.metrics["deleted_sessions"] += sessions
+            self.metrics["deleted_history"] += history
+            return {"skipped": False, "deleted_sessions": sessions, "deleted_history": history}
+        except Exception:
+            self.metrics["errors"] += 1
+            logging.getLogger(__name__).exception("Falha na rotina de retenção de histórico/sessões")
+            db.rollback()
+            return {"skipped": False, "error": True}
+        finally:
+            db.close()
+            self.metrics["last_run_at"] = datetime.utcnow().isoformat()
+            self.metrics["last_duration_seconds"] = round(time.monotonic() - started, 4)
+            self._run_lock.release()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.run_once)
+
+    def start(self) -> None:
+        if self._task is None and os.getenv("RETENTION_ENABLED", "true").lower() in ("1", "true", "yes"):
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+retention_worker = RetentionWorker()
@@ -4,6 +4,23 @@ from datetime import datetime
 class Question(BaseModel):
     question: str
     session_id: int | None = None
+    # Ignora o cache pergunta -> SQL (força nova geração pela IA)
+    bypass_cache: bool = False
+    # Banco externo (id em DB_TARGETS_FILE); None => banco padrão
+    target: str | None = None
+
+class JobQuestion(Question):
+    # Chave de justiça da fila de jobs (ex.: usuário/tenant do chamador); sem ela, a sessão
+    client_id: str | None = None
+
+class BatchQuestion(BaseModel):
+    items: list[Question]
+    # Perguntas em paralelo (limitado por ASK_BATCH_CONCURRENCY)
+    concurrency: int | None = None
+    # Emite cada resultado como server-sent event assim que fica pronto
+    stream: bool = False
+    # Banco padrão dos itens que não informam `target`
+    target: str | None = None
 
 class History(BaseModel):
     id: int
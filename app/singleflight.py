@@ -0,0 +1,70 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.metrics import registry
+
+T = TypeVar("T")
+
+COALESCED = registry.counter(
+    "singleflight_calls_total",
+    "Chamadas por grupo de single-flight: executadas (leader) ou que aguardaram uma em voo (shared).",
+    ("group", "role"),
+)
+
+
+def single_flight_enabled() -> bool:
+    return os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class SingleFlight:
+    """
+    Deduplica trabalho assíncrono concorrente: enquanto uma chamada para a chave está
+    em voo, as demais aguardam e recebem o mesmo resultado (ou a mesma exceção).
+
+    Nada é guardado depois que a chamada termina (isso é papel dos caches). O trabalho
+    roda em uma task própria: se quem o iniciou for cancelado (ex.: cliente desconectou
+    do /ask/stream), os demais continuam aguardando normalmente.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        if not single_flight_enabled():
+            return await func()
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is loop:
+            self.shared += 1
+            COALESCED.inc(group=self.name, role="shared")
+            return await asyncio.shield(task)
+        task = loop.create_task(func())
+        self._calls[key] = task
+        self.executed += 1
+        COALESCED.inc(group=self.name, role="leader")
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Evita o aviso "exception was never retrieved" quando todos os interessados foram cancelados
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "executed": self.executed, "shared": self.shared}
+
+
+# Grupos usados pelo pipeline de perguntas
+schema_flight = SingleFlight("schema")
+sql_generation_flight = SingleFlight("sql_generation")
+query_flight = SingleFlight("query")
+
+
+def single_flight_stats() -> dict:
+    return {flight.name: flight.stats() for flight in (schema_flight, sql_generation_flight, query_flight)}
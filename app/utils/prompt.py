@@ -1,18 +1,19 @@
 import os
+from functools import lru_cache
 
+# Ordem das mensagens pensada para o cache de prompt da OpenAI (que reaproveita o maior
+# prefixo idêntico entre chamadas): primeiro as partes estáticas (regras, regras de
+# negócio), depois o schema e, por último, o que varia a cada chamada (histórico, pergunta).
 
-def build_initial_prompt(db_schema: str) -> str:
-    base = f"""
-Você é um assistente que responde perguntas sobre qualquer banco de dados relacional. Sempre gere SQLs válidos e completos para MySQL, execute apenas SELECTs, nunca modifique dados. Estrutura do banco:
-
-{db_schema}
+_SQL_RULES = """
+Você é um assistente que responde perguntas sobre qualquer banco de dados relacional. Sempre gere SQLs válidos e completos para MySQL, execute apenas SELECTs, nunca modifique dados.
 
 Regras universais:
 - Gere sempre SQLs completos, nunca omita campos obrigatórios (ex: em ORDER BY, sempre especifique o campo).
 - Nunca use nomes reservados do MySQL (como 'order') como identificador, a não ser que estejam entre aspas.
 - Nunca inclua blocos de markdown (```sql ou ```).
 - Gere apenas o SQL puro, pronto para execução.
-- NUNCA use colunas ou tabelas que não estejam exatamente como aparecem no schema e exemplos de dados acima. Nunca invente nomes de colunas, tabelas ou relações.
+- NUNCA use colunas ou tabelas que não estejam exatamente como aparecem no schema e exemplos de dados abaixo. Nunca invente nomes de colunas, tabelas ou relações.
 - Sempre confira os nomes das colunas e tabelas com base nos exemplos reais de dados fornecidos antes de gerar o SQL. Se não tiver certeza, use apenas colunas/tabelas que aparecem nos exemplos.
 - Se precisar relacionar informações entre tabelas, utilize apenas as relações explícitas (chaves estrangeiras) presentes no schema e exemplos. Nunca assuma relações que não estejam claras.
 - Sempre que precisar buscar informações de algo, utilize o nome informado na pergunta para filtrar na tabela de destino usando WHERE col LIKE '%valor%'. Nunca assuma que o valor é conhecido ou que corresponde ao valor informado. Sempre busque o id explicitamente pelo valor antes de usá-lo em outras consultas.
@@ -25,13 +26,44 @@ Regras universais:
 - Você está falando com um usuário final, então não fale coisas como: você não me forneceu dados no prompt suficientes, ou: não tenho acesso ao banco de dados, ou: não posso executar SQLs. Foque em responder a pergunta de forma clara e objetiva, baseada no resultado do SELECT ou em seu conhecimento do prompt dado.
 
 Quando receber uma pergunta, gere o SQL, aguarde o resultado, e só então responda de forma clara e objetiva baseada no resultado do SELECT.
+
+Formato da resposta para cada pergunta:
+- Gere apenas um único SQL SELECT, sem explicações.
+- Não use LIMIT dentro de subqueries em IN/ALL/ANY/SOME; se precisar limitar, reescreva com JOIN/CTE ou limite na query externa.
+- Em subqueries que podem retornar múltiplos valores, use IN ao invés de '='.
+- Evite funções ou features não suportadas pela versão MySQL padrão.
+- Para ordenações customizadas (ex.: maior prioridade), use FIELD(...) ou CASE respeitando os valores reais.
+- Se precisar identificar registros por nome informado na pergunta, filtre por LIKE '%valor%'.
+- Todo alias de coluna deve ser um identificador simples (sem vírgulas) e cada expressão no SELECT deve ser válida no MySQL.
+- Se usar agregações (SUM/COUNT/etc.), inclua as colunas não agregadas no GROUP BY conforme necessário pelo MySQL.
+- Não inclua markdown (```), nem comentários; retorne apenas o SQL executável.
 """
-    biz_rules = os.getenv("BUSINESS_RULES_PROMPT", "").strip()
+
+
+@lru_cache(maxsize=8)
+def _sql_prefix(biz_rules: str) -> str:
+    """Regras fixas + regras de negócio: prefixo idêntico em todas as chamadas de geração de SQL."""
+    prefix = _SQL_RULES
     if biz_rules:
-        base = base + "\n\nRegras específicas do negócio:\n" + biz_rules + "\n"
-    return base
+        prefix = prefix + "\nRegras específicas do negócio:\n" + biz_rules + "\n"
+    return prefix
 
-def build_answer_prompt() -> str:
+
+@lru_cache(maxsize=256)
+def _initial_prompt(db_schema: str, biz_rules: str) -> str:
+    return _sql_prefix(biz_rules) + "\nEstrutura do banco:\n\n" + db_schema + "\n"
+
+
+def build_initial_prompt(db_schema: str) -> str:
+    """
+    Prompt de sistema da geração de SQL. Memoizado por (schema, BUSINESS_RULES_PROMPT):
+    o mesmo schema gera sempre o mesmo texto, byte a byte.
+    """
+    return _initial_prompt(db_schema, os.getenv("BUSINESS_RULES_PROMPT", "").strip())
+
+
+@lru_cache(maxsize=8)
+def _answer_prompt(answer_details: str) -> str:
     default = f"""
         "Você é um assistente que redige respostas claras em PT-BR para usuários finais. "
         "Formate em Markdown simples (títulos, listas, negrito quando útil). "
@@ -43,8 +75,27 @@ def build_answer_prompt() -> str:
         "Não invente informações que não estejam no resultado da consulta ou no enunciado da pergunta ou no prompt dado. Se não tem a informação, diga que não tem como ajudar com isso ou peça mais detalhes."
         "Não sugira seus próximos passos, apenas responda a pergunta do usuário de forma clara e objetiva ou peça alguma informação que o USUÁRIO COMUM DA REGRA DE NEGÓCIO que daremos POSSA RESPONDER, não um técnico que montou você."
     """
-    answer_details = os.getenv("ANSWER_PROMPT", "").strip()
     if answer_details:
         default = default + "\n" + answer_details
     return default
+
+
+def build_answer_prompt() -> str:
+    """Prompt de sistema da resposta final (memoizado por ANSWER_PROMPT)."""
+    return _answer_prompt(os.getenv("ANSWER_PROMPT", "").strip())
         
+
+
+_SUMMARY_PROMPT = """
+Você resume conversas entre um usuário e um assistente que consulta um banco de dados.
+Atualize o resumo atual incorporando os novos turnos. Mantenha apenas o que ajuda a
+interpretar perguntas de acompanhamento: entidades citadas (nomes, ids, datas, filtros),
+tabelas e colunas usadas e as conclusões principais. Seja conciso (tópicos curtos), não
+inclua SQL completo nem formatação Markdown elaborada. Responda apenas com o novo resumo.
+"""
+
+
+def build_summary_prompt() -> str:
+    """Prompt de sistema do resumo da conversa (app.ai.memory)."""
+    return _SUMMARY_PROMPT
+
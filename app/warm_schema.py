@@ -0,0 +1,51 @@
+"""
+Pré-aquece o snapshot do schema em disco (SCHEMA_SNAPSHOT_DIR), para que os workers
+subam sem refazer a introspecção do banco externo.
+
+Uso (no build da imagem ou no deploy, com acesso ao banco externo):
+
+    python -m app.warm_schema [--exact-counts] [--target ID ...]
+
+Sem --target, aquece todos os bancos de DB_TARGETS_FILE (ou o banco único de TYPE_DB).
+"""
+import argparse
+import os
+import sys
+
+from app.ai.pipeline import load_schema_filter
+from app.db_external.schema import warm_schema_snapshot
+from app.db_external.targets import registry, use_target
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Grava o snapshot do schema do banco externo em disco.")
+    parser.add_argument(
+        "--exact-counts", action="store_true", help="usa COUNT(*) em todas as tabelas em vez das estimativas do catálogo"
+    )
+    parser.add_argument(
+        "--target", action="append", metavar="ID", help="banco de DB_TARGETS_FILE a aquecer (pode repetir); padrão: todos"
+    )
+    args = parser.parse_args(argv)
+    unknown = [t for t in args.target or [] if t not in registry.ids()]
+    if unknown:
+        parser.error(f"banco desconhecido: {', '.join(unknown)}")
+
+    if not os.getenv("SCHEMA_SNAPSHOT_DIR"):
+        print("SCHEMA_SNAPSHOT_DIR não configurado.", file=sys.stderr)
+        return 2
+    status = 0
+    for target_id in args.target or registry.ids():
+        with use_target(target_id):
+            entry, path = warm_schema_snapshot(load_schema_filter(), exact_counts=args.exact_counts or None)
+        model = entry["model"]
+        if model.error or path is None:
+            print(f"[{target_id}] {model.error or 'Falha ao gravar o snapshot do schema.'}", file=sys.stderr)
+            status = 1
+            continue
+        print(f"[{target_id}] Snapshot gravado em {path}: {len(model.tables)} tabelas, fingerprint {entry['fingerprint']}.")
+        if model.warning:
+            print(f"[{target_id}] Aviso: {model.warning}", file=sys.stderr)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Servidor local compatível com a API de chat completions da OpenAI, para benchmarks.
+
+Responde com SQL pré-definido (conforme marcadores na pergunta) ou com um texto de
+resposta fixo, com latência configurável, e devolve o campo usage. Suporta stream=True
+(SSE, com o chunk final de usage quando stream_options.include_usage).
+
+Simula o cache de prompt da OpenAI de forma aproximada: prefixos de mensagens já vistos
+(a partir de 1024 tokens, em blocos de 128) são reportados em cached_tokens.
+
+Uso isolado: python -m bench.fake_openai --port 8001 --latency-ms 300
+e, no app, OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# (marcador na pergunta, SQL devolvido); o primeiro que casar vence
+DEFAULT_CANNED: List[Tuple[str, str]] = [
+    ("[fuzzy]", "SELECT id, nome, cidade FROM clientes WHERE nome = 'Cliente inexistente'"),
+    ("[big]", "SELECT * FROM pedidos"),
+    ("[join]", (
+        "SELECT c.cidade, COUNT(*) AS pedidos, SUM(p.total) AS total FROM pedidos p "
+        "JOIN clientes c ON c.id = p.cliente_id GROUP BY c.cidade ORDER BY total DESC"
+    )),
+    ("[status]", "SELECT status, COUNT(*) AS n FROM pedidos GROUP BY status"),
+]
+DEFAULT_SQL = "SELECT COUNT(*) AS n FROM clientes"
+FUZZY_SQL = "SELECT id, nome, cidade FROM clientes WHERE nome LIKE '%Cliente 1%'"
+SUMMARY_TEXT = "- O usuário consultou pedidos por status e faturamento por cidade."
+ANSWER_TEXT = "Segue o resumo do resultado da consulta, com os principais números encontrados."
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAI:
+    """Configuração e lógica de resposta (compartilhada pelas threads do servidor)."""
+
+    def __init__(self, latency_ms: float = 0, token_latency_ms: float = 0, canned: Optional[List[Tuple[str, str]]] = None):
+        self.latency = latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self.canned = canned if canned is not None else list(DEFAULT_CANNED)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._seen_prefixes = set()
+
+    def content_for(self, messages: list) -> str:
+        system = messages[0].get("content", "") if messages else ""
+        last = messages[-1].get("content", "") if messages else ""
+        if "redige respostas" in system:
+            return ANSWER_TEXT
+        if "resume conversas" in system:
+            return SUMMARY_TEXT
+        if "não retornou resultados" in last:
+            return FUZZY_SQL
+        for marker, sql in self.canned:
+            if marker in last:
+                return sql
+        return DEFAULT_SQL
+
+    def cached_tokens(self, messages: list) -> int:
+        """Tokens do maior prefixo (em fronteiras de mensagem) já visto em chamadas anteriores."""
+        digest = hashlib.sha256()
+        tokens = 0
+        cached = 0
+        with self._lock:
+            for m in messages:
+                digest.update(json.dumps(m, sort_keys=True).encode("utf-8"))
+                tokens += _estimate_tokens(str(m.get("content", "")))
+                key = digest.copy().hexdigest()
+                if key in self._seen_prefixes:
+                    cached = tokens
+                else:
+                    self._seen_prefixes.add(key)
+        return cached // 128 * 128 if cached >= 1024 else 0
+
+    def usage(self, messages: list, content: str) -> dict:
+        prompt = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion = _estimate_tokens(content)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": self.cached_tokens(messages)},
+        }
+
+
+def _make_handler(fake: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with fake._lock:
+                fake.requests += 1
+            messages = body.get("messages", [])
+            content = fake.content_for(messages)
+            usage = fake.usage(messages, content)
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "fake")}
+            time.sleep(fake.latency)
+            if body.get("stream"):
+                self._stream(base, content, usage, (body.get("stream_options") or {}).get("include_usage"))
+                return
+            payload = {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, base: dict, content: str, usage: dict, include_usage: bool):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(obj):
+                raw = obj if isinstance(obj, str) else json.dumps(obj)
+                data = f"data: {raw}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            for word in content.split(" "):
+                send({**base, "object": "chat.completion.chunk",
+                      "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]})
+                if fake.token_latency:
+                    time.sleep(fake.token_latency)
+            send({**base, "object": "chat.completion.chunk",
+                  "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if include_usage:
+                send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **options) -> Tuple[ThreadingHTTPServer, FakeOpenAI, str]:
+    """Sobe o servidor em uma thread daemon. Retorna (servidor, fake, base_url para OPENAI_BASE_URL)."""
+    fake = FakeOpenAI(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, fake, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Servidor OpenAI falso para benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0, help="atraso de cada resposta")
+    parser.add_argument("--token-latency-ms", type=float, default=0, help="atraso entre chunks no streaming")
+    parser.add_argument("--canned", help='JSON com pares [["marcador", "SQL"], ...] (substitui os padrões)')
+    args = parser.parse_args(argv)
+    canned = None
+    if args.canned:
+        with open(args.canned, encoding="utf-8") as fh:
+            canned = [tuple(pair) for pair in json.load(fh)]
+    server, _, url = start_server(
+        args.host, args.port, latency_ms=args.latency_ms, token_latency_ms=args.token_latency_ms, canned=canned
+    )
+    print(f"OPENAI_BASE_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
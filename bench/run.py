@@ -0,0 +1,270 @@
+"""
+Benchmark do /ask com stand-ins locais da OpenAI (bench.fake_openai) e do banco
+externo (SQLite gerado por bench.seed).
+
+Por padrão o app (app.main:app) roda no mesmo processo e é chamado via ASGI, sem
+rede; com --url os cenários são disparados contra um servidor já em execução (o
+servidor precisa estar configurado com os mesmos stand-ins).
+
+Cenários:
+  cold_start           schema e caches invalidados antes de cada requisição
+  cached_schema        schema em cache; SQL gerado e executado a cada requisição
+  repeated_question    mesma pergunta, servida pelos caches de pergunta/resultado
+  fuzzy                consulta sem resultado => fallback de busca aproximada
+  large_result         resultado grande (truncado por EXT_RESULT_MAX_ROWS)
+  concurrent_sessions  sessões concorrentes com perguntas de acompanhamento
+  jobs                 perguntas via fila de jobs (POST /jobs + long-poll do resultado)
+
+Uso:
+  python -m bench.run [--requests 50] [--concurrency 8] [--latency-ms 200]
+                      [--json resultado.json] [--baseline base.json --max-regression 0.2]
+
+Com --baseline, termina com código 1 se o p95 de algum cenário piorar além de
+--max-regression (fração) em relação ao arquivo de referência.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from bench.fake_openai import start_server
+from bench.seed import seed_database
+
+TOKEN = "bench"
+SCENARIOS = ("cold_start", "cached_schema", "repeated_question", "fuzzy", "large_result", "concurrent_sessions", "jobs")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil pelo método nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, wall: float) -> dict:
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+    }
+
+
+def _setup_environment(args, workdir: str) -> None:
+    """Aponta o app para os stand-ins (antes de importar app.main)."""
+    ext_path = os.path.join(workdir, "external.db")
+    counts = seed_database(ext_path, tables=args.tables, rows=args.rows)
+    print(f"Banco externo: {ext_path} ({len(counts)} tabelas, {sum(counts.values())} linhas)")
+    _, _, base_url = start_server(latency_ms=args.latency_ms, token_latency_ms=args.token_latency_ms)
+    os.environ.update({
+        "TYPE_DB": "sqlite",
+        "EXT_SQLITE_PATH": ext_path,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'internal.db')}",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "bench",
+        "ASK_BEARER_TOKEN": TOKEN,
+        # O cold start é medido pelo cenário, não no boot
+        "SCHEMA_PRELOAD_ON_STARTUP": "false",
+    })
+
+
+class Runner:
+    def __init__(self, client, concurrency: int):
+        self.client = client
+        self.concurrency = concurrency
+        self.headers = {"Authorization": f"Bearer {TOKEN}"}
+
+    async def ask(self, question: str, bypass_cache: bool = True, session_id: Optional[int] = None) -> dict:
+        payload = {"question": question, "bypass_cache": bypass_cache}
+        if session_id is not None:
+            payload["session_id"] = session_id
+        response = await self.client.post("/ask", json=payload, headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def job(self, question: str) -> dict:
+        """Envia a pergunta como job e aguarda o resultado (long-poll)."""
+        response = await self.client.post("/jobs", json={"question": question, "bypass_cache": True}, headers=self.headers)
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            response = await self.client.get(f"/jobs/{job_id}", params={"wait": 30}, headers=self.headers)
+            response.raise_for_status()
+            data = response.json()
+            if data["status"] == "succeeded":
+                return data["result"]
+            if data["status"] in ("failed", "cancelled"):
+                raise RuntimeError(f"job {job_id}: {data['status']} ({data['error']})")
+
+    async def invalidate(self) -> None:
+        await self.client.post("/schema/invalidate", headers=self.headers)
+        await self.client.post("/cache/invalidate", headers=self.headers)
+
+    async def measure(
+        self, total: int, request: Callable, concurrency: Optional[int] = None, before: Optional[Callable] = None
+    ) -> dict:
+        """
+        Executa `total` chamadas de `request(i, worker)` com a concorrência dada; `before`
+        roda fora da medição.
+        """
+        concurrency = concurrency or self.concurrency
+        latencies: List[float] = []
+        errors = 0
+        queue = list(range(total))
+        lock = asyncio.Lock()
+
+        async def worker(worker_id: int):
+            nonlocal errors
+            while True:
+                async with lock:
+                    if not queue:
+                        return
+                    i = queue.pop()
+                    if before is not None:
+                        await before()
+                started = time.perf_counter()
+                try:
+                    await request(i, worker_id)
+                    latencies.append(time.perf_counter() - started)
+                except Exception as e:
+                    errors += 1
+                    if errors == 1:
+                        print(f"  erro: {e!r}", file=sys.stderr)
+
+        wall_started = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+        return summarize(latencies, errors, time.perf_counter() - wall_started)
+
+    async def scenario(self, name: str, total: int) -> dict:
+        if name == "cold_start":
+            # Sequencial: cada requisição paga a introspecção completa
+            return await self.measure(
+                total, lambda i, w: self.ask("[status] quantos pedidos por status?"), concurrency=1, before=self.invalidate
+            )
+        if name == "cached_schema":
+            await self.ask("[status] aquecimento")
+            return await self.measure(total, lambda i, w: self.ask("[join] faturamento por cidade"))
+        if name == "repeated_question":
+            await self.ask("[join] total de vendas por cidade", bypass_cache=False)
+            return await self.measure(total, lambda i, w: self.ask("[join] total de vendas por cidade", bypass_cache=False))
+        if name == "fuzzy":
+            return await self.measure(total, lambda i, w: self.ask("[fuzzy] pedidos do cliente Joao"))
+        if name == "large_result":
+            return await self.measure(total, lambda i, w: self.ask("[big] liste todos os pedidos"))
+        if name == "concurrent_sessions":
+            sessions: Dict[int, int] = {}
+            questions = ("[status] pedidos por status", "[join] e por cidade?", "[big] liste esses pedidos")
+
+            # Uma sessão por worker: cada um conduz sua conversa enquanto os demais rodam
+            async def conversation_turn(i: int, worker: int):
+                data = await self.ask(questions[i % len(questions)], session_id=sessions.get(worker))
+                sessions[worker] = data["session_id"]
+
+            return await self.measure(total, conversation_turn)
+        if name == "jobs":
+            await self.ask("[status] aquecimento")
+            return await self.measure(total, lambda i, w: self.job("[join] faturamento por cidade"))
+        raise ValueError(f"Cenário desconhecido: {name}")
+
+
+def _print_report(results: Dict[str, dict]) -> None:
+    header = f"{'cenário':<22}{'req':>6}{'erros':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'média ms':>10}{'req/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<22}{r['requests']:>6}{r['errors']:>7}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+            f"{r['p99_ms']:>10}{r['mean_ms']:>10}{r['throughput_rps']:>9}"
+        )
+
+
+def compare_baseline(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """Cenários cujo p95 piorou além da tolerância em relação à referência."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p95_ms"):
+            continue
+        limit = base["p95_ms"] * (1 + max_regression)
+        if r["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {r['p95_ms']} ms > {limit:.2f} ms (referência {base['p95_ms']} ms)")
+    return regressions
+
+
+async def _run(args) -> Dict[str, dict]:
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        lifespan = None
+    else:
+        from app import database, models
+        from app.main import app
+
+        models.Base.metadata.create_all(database.engine)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+    results: Dict[str, dict] = {}
+    try:
+        runner = Runner(client, args.concurrency)
+        for name in args.scenarios:
+            print(f"> {name}")
+            await runner.invalidate()
+            total = max(1, args.requests // 5) if name == "cold_start" else args.requests
+            results[name] = await runner.scenario(name, total)
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline /ask com stand-ins locais.")
+    parser.add_argument("--requests", type=int, default=50, help="requisições por cenário (cold_start usa 1/5)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--tables", type=int, default=30, help="tabelas no banco externo de exemplo")
+    parser.add_argument("--rows", type=int, default=2000, help="linhas da tabela pedidos")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência simulada de cada chamada à OpenAI")
+    parser.add_argument("--token-latency-ms", type=float, default=0, help="latência entre chunks no streaming")
+    parser.add_argument("--url", help="servidor já em execução (não sobe stand-ins nem o app no processo)")
+    parser.add_argument("--workdir", help="diretório dos bancos gerados (padrão: temporário)")
+    parser.add_argument("--json", dest="json_path", help="grava os resultados neste arquivo")
+    parser.add_argument("--baseline", help="resultado anterior (JSON) para detectar regressões")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="piora tolerada no p95 (fração)")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+        os.makedirs(workdir, exist_ok=True)
+        _setup_environment(args, workdir)
+
+    results = asyncio.run(_run(args))
+    _print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare_baseline(results, json.load(fh), args.max_regression)
+        if regressions:
+            print("\nRegressões:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
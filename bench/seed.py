@@ -0,0 +1,103 @@
+"""
+Banco externo de exemplo (SQLite) para os benchmarks.
+
+Tabelas fixas (clientes, pedidos, itens_pedido) com FKs entre si, mais tabelas
+sintéticas extra_NN até completar o número pedido, cada uma ligada a pedidos por FK.
+Os dados são determinísticos (mesma semente => mesmo banco).
+
+Uso: python -m bench.seed caminho.db [--tables 30] [--rows 2000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+_STATUS = ("aberto", "fechado", "cancelado", "enviado")
+_CIDADES = ("São Paulo", "Rio de Janeiro", "Belo Horizonte", "Curitiba", "Recife", "Porto Alegre")
+
+
+def seed_database(path: str, tables: int = 30, rows: int = 2000, seed: int = 42) -> dict:
+    """
+    Recria o banco em `path`. `rows` é o número de pedidos; clientes = rows/10 e
+    itens_pedido = 3 x rows. Retorna {tabela: linhas}.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    counts = {}
+    try:
+        cur = conn.cursor()
+        cur.execute("CREATE TABLE clientes (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, cidade TEXT, email TEXT UNIQUE)")
+        cur.execute(
+            "CREATE TABLE pedidos (id INTEGER PRIMARY KEY, cliente_id INTEGER NOT NULL REFERENCES clientes(id), "
+            "status TEXT NOT NULL, total NUMERIC, criado_em DATE)"
+        )
+        cur.execute("CREATE INDEX ix_pedidos_status ON pedidos(status)")
+        cur.execute(
+            "CREATE TABLE itens_pedido (id INTEGER PRIMARY KEY, pedido_id INTEGER NOT NULL REFERENCES pedidos(id), "
+            "produto TEXT, quantidade INTEGER, preco NUMERIC)"
+        )
+
+        n_clientes = max(1, rows // 10)
+        cur.executemany(
+            "INSERT INTO clientes VALUES (?, ?, ?, ?)",
+            [(i, f"Cliente {i}", rnd.choice(_CIDADES), f"cliente{i}@exemplo.com") for i in range(1, n_clientes + 1)],
+        )
+        start = date(2024, 1, 1)
+        cur.executemany(
+            "INSERT INTO pedidos VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    i, rnd.randint(1, n_clientes), rnd.choice(_STATUS),
+                    round(rnd.uniform(10, 5000), 2), (start + timedelta(days=rnd.randint(0, 700))).isoformat(),
+                )
+                for i in range(1, rows + 1)
+            ],
+        )
+        cur.executemany(
+            "INSERT INTO itens_pedido VALUES (?, ?, ?, ?, ?)",
+            [
+                (i, rnd.randint(1, rows), f"Produto {rnd.randint(1, 200)}", rnd.randint(1, 10), round(rnd.uniform(1, 500), 2))
+                for i in range(1, rows * 3 + 1)
+            ],
+        )
+        counts.update({"clientes": n_clientes, "pedidos": rows, "itens_pedido": rows * 3})
+
+        # Tabelas sintéticas para exercitar introspecção e seleção de schema em bancos largos
+        for n in range(1, max(0, tables - 3) + 1):
+            name = f"extra_{n:02d}"
+            cur.execute(
+                f"CREATE TABLE {name} (id INTEGER PRIMARY KEY, pedido_id INTEGER REFERENCES pedidos(id), "
+                f"descricao TEXT, valor NUMERIC, ativo INTEGER)"
+            )
+            extra_rows = max(1, rows // 20)
+            cur.executemany(
+                f"INSERT INTO {name} VALUES (?, ?, ?, ?, ?)",
+                [
+                    (i, rnd.randint(1, rows), f"Registro {n}-{i}", round(rnd.uniform(0, 1000), 2), rnd.randint(0, 1))
+                    for i in range(1, extra_rows + 1)
+                ],
+            )
+            counts[name] = extra_rows
+        conn.commit()
+    finally:
+        conn.close()
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cria o banco SQLite de exemplo dos benchmarks.")
+    parser.add_argument("path")
+    parser.add_argument("--tables", type=int, default=30)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    counts = seed_database(args.path, tables=args.tables, rows=args.rows, seed=args.seed)
+    print(f"{args.path}: {len(counts)} tabelas, {sum(counts.values())} linhas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os testes rodam sem MySQL: o banco interno padrão vira um SQLite em memória
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,11 @@
+from bench.run import percentile
+
+
+def test_nearest_rank():
+    values = list(range(1, 21))
+    assert percentile(values, 95) == 19
+    assert percentile(values, 50) == 10
+    assert percentile(values, 100) == 20
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 95) == 0.0
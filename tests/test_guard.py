@@ -0,0 +1,141 @@
+import json
+
+import pytest
+
+from app.db_external.guard import SQLGuardError, explain_estimate, guard_sql
+
+# EXPLAIN FORMAT=JSON do MySQL 8.0 sobre uma tabela InnoDB com ~1 milhão de linhas
+COUNT_PLAN = {
+    "query_block": {
+        "select_id": 1,
+        "cost_info": {"query_cost": "100873.35"},
+        "table": {
+            "table_name": "eventos",
+            "access_type": "index",
+            "key": "ix_eventos_status",
+            "used_key_parts": ["status"],
+            "key_length": "82",
+            "rows_examined_per_scan": 997453,
+            "rows_produced_per_join": 997453,
+            "filtered": "100.00",
+            "using_index": True,
+            "cost_info": {
+                "read_cost": "1128.05",
+                "eval_cost": "99745.30",
+                "prefix_cost": "100873.35",
+                "data_read_per_join": "1G",
+            },
+        },
+    }
+}
+
+GROUP_BY_PLAN = {
+    "query_block": {
+        "select_id": 1,
+        "cost_info": {"query_cost": "100873.35"},
+        "grouping_operation": {
+            "using_filesort": False,
+            "table": COUNT_PLAN["query_block"]["table"],
+        },
+    }
+}
+
+JOIN_PLAN = {
+    "query_block": {
+        "select_id": 1,
+        "cost_info": {"query_cost": "1480.25"},
+        "ordering_operation": {
+            "using_filesort": True,
+            "nested_loop": [
+                {
+                    "table": {
+                        "table_name": "e",
+                        "access_type": "ALL",
+                        "rows_examined_per_scan": 997453,
+                        "rows_produced_per_join": 99745,
+                        "filtered": "10.00",
+                        "attached_condition": "(`app`.`e`.`status` = 'erro')",
+                    }
+                },
+                {
+                    "table": {
+                        "table_name": "c",
+                        "access_type": "eq_ref",
+                        "key": "PRIMARY",
+                        "rows_examined_per_scan": 1,
+                        "rows_produced_per_join": 4987,
+                        "filtered": "5.00",
+                    }
+                },
+            ],
+        },
+    }
+}
+
+
+class _FakeConn:
+    """Conexão que responde ao EXPLAIN com um plano gravado."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.statements = []
+
+    def execution_options(self, **options):
+        return self
+
+    def exec_driver_sql(self, sql):
+        self.statements.append(sql)
+        return self
+
+    def scalar(self):
+        return json.dumps(self.plan)
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def guard_env(monkeypatch):
+    monkeypatch.setenv("SQL_GUARD_EXPLAIN", "true")
+    monkeypatch.setenv("SQL_GUARD_MAX_COST", "0")
+    monkeypatch.setenv("SQL_GUARD_MAX_ROWS", "1000")
+    monkeypatch.setenv("SQL_GUARD_ACTION", "reject")
+
+
+def test_mysql_rows_come_from_the_outermost_block():
+    assert explain_estimate(_FakeConn(COUNT_PLAN), "SELECT 1", "mysql") == (997453.0, 100873.35)
+    # No join, a saída é a da última tabela; as anteriores são linhas examinadas
+    assert explain_estimate(_FakeConn(JOIN_PLAN), "SELECT 1", "mysql") == (4987.0, 1480.25)
+    assert explain_estimate(_FakeConn(GROUP_BY_PLAN), "SELECT 1", "mysql") == (None, 100873.35)
+
+
+def test_count_over_large_table_is_one_row():
+    out = guard_sql(_FakeConn(COUNT_PLAN), "SELECT COUNT(*) FROM eventos", "mysql")
+    assert out.estimated_rows == 1 and not out.limit_added
+    assert out.sql == "SELECT COUNT(*) FROM eventos"
+
+
+def test_group_by_is_not_limited_by_examined_rows(monkeypatch):
+    sql = "SELECT status, COUNT(*) FROM eventos GROUP BY status"
+    out = guard_sql(_FakeConn(GROUP_BY_PLAN), sql, "mysql")
+    assert out.estimated_rows is None and out.sql == sql
+
+    monkeypatch.setenv("SQL_GUARD_ACTION", "limit")
+    assert not guard_sql(_FakeConn(GROUP_BY_PLAN), sql, "mysql").limit_added
+
+
+def test_examined_rows_still_count_toward_cost(monkeypatch):
+    monkeypatch.setenv("SQL_GUARD_MAX_COST", "50000")
+    with pytest.raises(SQLGuardError):
+        guard_sql(_FakeConn(GROUP_BY_PLAN), "SELECT status, COUNT(*) FROM eventos GROUP BY status", "mysql")
+
+
+def test_large_plain_select_is_still_limited(monkeypatch):
+    monkeypatch.setenv("SQL_GUARD_ACTION", "limit")
+    out = guard_sql(_FakeConn(COUNT_PLAN), "SELECT * FROM eventos", "mysql")
+    assert out.estimated_rows == 997453 and out.limit_added
+    assert out.sql.endswith("LIMIT 1000")
+
+    # Agregação em janela não reduz a saída a uma linha
+    out = guard_sql(_FakeConn(COUNT_PLAN), "SELECT id, COUNT(*) OVER () FROM eventos", "mysql")
+    assert out.estimated_rows == 997453 and out.limit_added
@@ -0,0 +1,80 @@
+"""
+Regressão dos índices de history/session (migração 0004): o plano (EXPLAIN QUERY PLAN
+do SQLite) das consultas de histórico e de retenção precisa usar os índices compostos,
+sem varrer a tabela nem ordenar em memória.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1)
+    for s in range(3):
+        row = models.Session(created_at=start + timedelta(minutes=s))
+        session.add(row)
+        session.flush()
+        for i in range(5):
+            session.add(models.History(
+                session_id=row.id, question=f"q{i}", answer="a", created_at=start + timedelta(minutes=s, seconds=i)
+            ))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _plans(db, call):
+    """Executa `call` e devolve o plano de cada SELECT emitido."""
+    statements = []
+    engine = db.get_bind()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert statements
+    with engine.connect() as conn:
+        return [
+            " | ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params))
+            for sql, params in statements
+        ]
+
+
+def _assert_index(plan: str, index: str):
+    assert f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan, plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+
+def test_session_history_uses_session_index(db):
+    session_id = db.query(models.Session.id).first()[0]
+    (plan,) = _plans(db, lambda: crud.get_last_histories_by_session(db, session_id, 3))
+    _assert_index(plan, "ix_history_session_created_at_id")
+
+
+def test_histories_after_uses_session_index(db):
+    session_id = db.query(models.Session.id).first()[0]
+    (plan,) = _plans(db, lambda: crud.get_histories_after(db, session_id, 1))
+    _assert_index(plan, "ix_history_session_created_at_id")
+
+
+@pytest.mark.parametrize(
+    "model, index",
+    [(models.History, "ix_history_created_at_id"), (models.Session, "ix_session_created_at_id")],
+)
+def test_prune_cutoff_uses_created_at_index(db, model, index):
+    (plan,) = _plans(db, lambda: crud._keep_newest_cutoff(db, model, 2))
+    _assert_index(plan, index)
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from app.jobs import (
+    CANCELLED,
+    FINISHED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    ClientQueueLimitError,
+    JobManager,
+    JobQueue,
+    QueueFullError,
+)
+
+
+@pytest.fixture(autouse=True)
+def job_env(monkeypatch):
+    monkeypatch.setenv("JOB_WORKERS", "1")
+    monkeypatch.setenv("JOB_QUEUE_MAX_DEPTH", "200")
+    monkeypatch.setenv("JOB_MAX_QUEUED_PER_CLIENT", "20")
+    monkeypatch.setenv("JOB_RESULT_TTL_SECONDS", "600")
+    monkeypatch.setenv("JOB_MAX_RETAINED", "1000")
+
+
+async def _echo(payload):
+    # Handler falso no lugar do pipeline: devolve o payload como resultado
+    await asyncio.sleep(0)
+    return {"answer": payload}
+
+
+async def _until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timeout esperando os jobs"
+        await asyncio.sleep(0.001)
+
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
+
+
+def test_clients_are_served_round_robin():
+    async def scenario():
+        manager = JobManager()
+        order = []
+
+        async def handler(payload):
+            order.append(payload)
+            return await _echo(payload)
+
+        jobs = [manager.submit(p, p[0]) for p in ("a1", "a2", "a3", "b1", "b2", "c1")]
+        manager.start(handler)
+        await _until(lambda: all(j.status in FINISHED for j in jobs))
+        await manager.stop()
+        return order, jobs
+
+    order, jobs = asyncio.run(scenario())
+    assert order == ["a1", "b1", "c1", "a2", "b2", "a3"]
+    assert [j.result for j in jobs] == [{"answer": p} for p in ("a1", "a2", "a3", "b1", "b2", "c1")]
+    assert all(j.payload is None for j in jobs)
+
+
+def test_admission_limits(monkeypatch):
+    monkeypatch.setenv("JOB_QUEUE_MAX_DEPTH", "3")
+    monkeypatch.setenv("JOB_MAX_QUEUED_PER_CLIENT", "2")
+
+    async def scenario():
+        manager = JobManager()
+        manager.submit("a1", "a")
+        manager.submit("a2", "a")
+        with pytest.raises(ClientQueueLimitError) as per_client:
+            manager.submit("a3", "a")
+        manager.submit("b1", "b")
+        with pytest.raises(QueueFullError) as full:
+            manager.submit("c1", "c")
+        return manager, per_client.value, full.value
+
+    manager, per_client, full = asyncio.run(scenario())
+    assert not isinstance(full, ClientQueueLimitError)
+    assert per_client.retry_after >= 1 and full.retry_after >= 1
+    assert manager.counters["rejected"] == 2 and manager.counters["submitted"] == 3
+    assert manager.stats()["queued"] == 3
+
+
+def test_cancel_queued_and_running_jobs():
+    async def scenario():
+        manager = JobManager()
+        release = asyncio.Event()
+
+        async def handler(payload):
+            if payload == "slow":
+                await release.wait()
+            return await _echo(payload)
+
+        slow = manager.submit("slow", "a")
+        queued = manager.submit("queued", "a")
+        after = manager.submit("after", "b")
+        manager.start(handler)
+        await _until(lambda: slow.status == RUNNING)
+
+        assert manager.cancel(queued) and queued.status == CANCELLED
+        assert manager.queue.depth() == 1
+        assert manager.cancel(slow)
+        await _until(lambda: after.status == SUCCEEDED)
+        await manager.stop()
+        return manager, slow
+
+    manager, slow = asyncio.run(scenario())
+    # O cancelamento do job em execução não derruba o worker, que segue para o próximo
+    assert slow.status == CANCELLED and not manager.cancel(slow)
+    assert manager.counters[CANCELLED] == 2 and manager.counters[SUCCEEDED] == 1
+
+
+def test_finished_jobs_expire_by_count_and_ttl(monkeypatch):
+    monkeypatch.setenv("JOB_MAX_RETAINED", "2")
+
+    async def scenario():
+        manager = JobManager()
+        manager.start(_echo)
+        jobs = []
+        for p in ("j1", "j2", "j3"):
+            jobs.append(manager.submit(p, "a"))
+            await _until(lambda: jobs[-1].status in FINISHED)
+        await manager.stop()
+        return manager, jobs
+
+    manager, (j1, j2, j3) = asyncio.run(scenario())
+    assert manager.get(j1.id) is None
+    assert manager.get(j2.id) is j2 and manager.get(j3.id) is j3
+    assert manager.counters["expired"] == 1
+
+    j2.finished_at -= 601
+    assert manager.get(j2.id) is None and manager.get(j3.id) is j3
+    assert manager.stats()["retained"] == 1
+
+
+def test_queued_jobs_are_never_expired(monkeypatch):
+    monkeypatch.setenv("JOB_MAX_RETAINED", "1")
+
+    async def scenario():
+        manager = JobManager()
+        return manager, [manager.submit(p, "a") for p in ("j1", "j2")]
+
+    manager, jobs = asyncio.run(scenario())
+    assert all(manager.get(j.id) is j and j.status == QUEUED for j in jobs)
@@ -0,0 +1,62 @@
+"""
+Memória da conversa: todo turno da sessão precisa estar no resumo ou no histórico que
+vai ao prompt, em qualquer ponto da conversa (sem "buracos" entre a janela e o resumo).
+"""
+import pytest
+
+from app import crud, database, models
+from app.ai import memory
+
+
+@pytest.fixture
+def db(monkeypatch):
+    models.Base.metadata.create_all(database.engine)
+    session = database.SessionLocal()
+    yield session
+    session.close()
+    models.Base.metadata.drop_all(database.engine)
+
+
+def _fold_all(session_id: int) -> int:
+    """Roda as rodadas de resumo de forma síncrona (o resumo vira a lista de perguntas)."""
+    rounds = 0
+    while True:
+        job = memory._turns_to_fold(session_id)
+        if job is None:
+            return rounds
+        previous, turns, upto_id = job
+        questions = [line[len("- Pergunta: "):] for line in turns.splitlines() if line.startswith("- Pergunta: ")]
+        summary = ",".join(filter(None, [previous] + questions))
+        assert memory._store_summary(session_id, summary, upto_id)
+        rounds += 1
+
+
+@pytest.mark.parametrize("budget, answer", [("1500", "ok"), ("120", "resposta " * 40)])
+def test_every_turn_is_in_summary_or_prompt(db, monkeypatch, budget, answer):
+    monkeypatch.setenv("HISTORY_KEEP_LAST_PAIRS", "3")
+    monkeypatch.setenv("HISTORY_SUMMARY_BATCH", "4")
+    monkeypatch.setenv("HISTORY_TOKEN_BUDGET", budget)
+    session = crud.create_session(db)
+    for i in range(15):
+        crud.create_history(db, question=f"q{i}", answer=answer, session_id=session.id, sql="SELECT 1")
+        _fold_all(session.id)
+        db.expire_all()
+        messages = memory.conversation_memory.load(db, crud.get_session(db, session.id))
+        prompt = " ".join(m["content"] for m in messages)
+        summarized = set((crud.get_session(db, session.id).summary or "").split(","))
+        for j in range(i + 1):
+            assert f"q{j}" in summarized or f"q{j}" in prompt.split(), (i, j)
+
+
+def test_first_fold_of_long_session_is_capped(db, monkeypatch):
+    monkeypatch.setenv("HISTORY_KEEP_LAST_PAIRS", "2")
+    monkeypatch.setenv("HISTORY_SUMMARY_MAX_TURNS", "5")
+    session = crud.create_session(db)
+    crud.create_histories(db, [(f"q{i}", "ok", session.id, None) for i in range(30)])
+    job = memory._turns_to_fold(session.id)
+    assert job[1].count("- Pergunta:") == 5
+    # 28 turnos fora da janela: 5 rodadas de 5; os 3 restantes ainda cabem no prompt
+    assert _fold_all(session.id) == 5
+    db.expire_all()
+    messages = memory.conversation_memory.load(db, crud.get_session(db, session.id))
+    assert [m["content"] for m in messages if m["role"] == "user"] == [f"q{i}" for i in range(25, 30)]
@@ -0,0 +1,39 @@
+from datetime import datetime
+from decimal import Decimal
+
+from app.db_external.query import QueryResult
+from app.db_external.result_cache import ResultCache
+
+
+def _cache(tmp_path):
+    cache = ResultCache(max_bytes=1_000_000, default_ttl=60, backend_path=str(tmp_path / "rc.db"))
+    cache.ttl_for = lambda sql: 60
+    return cache
+
+
+def test_round_trip_uses_json_and_marks_cached(tmp_path):
+    cache = _cache(tmp_path)
+    result = QueryResult(
+        rows=[{"total": Decimal("12.50"), "dia": datetime(2024, 5, 1, 10, 0)}], columns=["total", "dia"], sql="SELECT 1"
+    )
+    cache.set("k", "fp1", "SELECT 1", result)
+    raw = cache.backend.get("k")[0]
+    assert raw.startswith(b"{")
+    # Um segundo processo lê do arquivo compartilhado
+    other = _cache(tmp_path)
+    cached = other.get("k", "fp1")
+    assert cached.cached and cached.rows == [{"total": 12.5, "dia": "2024-05-01T10:00:00"}]
+
+
+def test_unreadable_backend_entry_is_a_miss(tmp_path):
+    cache = _cache(tmp_path)
+    cache.backend.set("k", "fp1", b"\x80\x04not-json", 9e12)
+    assert cache.get("k", "fp1") is None
+
+
+def test_new_fingerprint_does_not_clear_other_entries(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("a", "fp1", "SELECT 1", QueryResult(rows=[{"x": 1}], columns=["x"]))
+    assert cache.get("b", "fp2") is None
+    assert cache.get("a", "fp1") is not None
+    assert cache.backend.get("a") is not None
@@ -0,0 +1,99 @@
+import json
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from app.db_external import query, targets
+from app.db_external.guard import GuardResult
+
+
+def _make_target(tmp_path, monkeypatch, replica=True, pool=None):
+    for name in ("primary", "replica"):
+        db = sqlite3.connect(tmp_path / f"{name}.db")
+        db.execute("CREATE TABLE t (origem TEXT)")
+        db.execute("INSERT INTO t VALUES (?)", (name,))
+        db.commit()
+        db.close()
+    target_id = f"t{tmp_path.name[-20:]}".replace(".", "_")
+    config = {"url": f"sqlite:///{tmp_path / 'primary.db'}", "pool": pool or {}}
+    if replica:
+        config["replicas"] = [{"url": f"sqlite:///{tmp_path / 'replica.db'}", "weight": 1}]
+    (tmp_path / "targets.json").write_text(json.dumps({"targets": {target_id: config}}))
+    monkeypatch.setenv("DB_TARGETS_FILE", str(tmp_path / "targets.json"))
+    monkeypatch.setattr(targets, "registry", targets.TargetRegistry())
+    return targets.registry.get(target_id)
+
+
+@pytest.fixture
+def target(tmp_path, monkeypatch):
+    """Alvo com um primário e uma réplica (ambos SQLite), a réplica sempre sorteada primeiro."""
+    return _make_target(tmp_path, monkeypatch)
+
+
+def _origin(conn):
+    return conn.exec_driver_sql("SELECT origem FROM t").scalar()
+
+
+def test_reads_go_to_the_replica(target):
+    assert targets.run_read(_origin) == "replica"
+    assert target.replicas[0].healthy
+
+
+def test_replica_lost_during_execute_fails_over_and_leaves_rotation(target):
+    def flaky(conn):
+        if conn.engine.url.database.endswith("replica.db"):
+            raise DBAPIError("SELECT origem FROM t", None, Exception("server has gone away"), connection_invalidated=True)
+        return _origin(conn)
+
+    assert targets.run_read(flaky) == "primary"
+    replica = target.replicas[0]
+    assert not replica.healthy and replica.failures == 1
+    # Fora da rotação até DB_REPLICA_RETRY_SECONDS: a próxima leitura vai direto ao primário
+    assert target.read_candidates() == [target.primary]
+
+
+def test_query_error_on_replica_is_not_a_failover(target):
+    def broken(conn):
+        raise OperationalError("SELECT x FROM nada", None, Exception("no such table: nada"))
+
+    with pytest.raises(OperationalError):
+        targets.run_read(broken)
+    assert target.replicas[0].healthy
+
+
+def test_guard_explain_runs_on_primary_when_it_writes(target, monkeypatch):
+    seen = []
+
+    def fake_guard(conn, sql, dialect):
+        seen.append(_origin(conn))
+        return GuardResult(sql=sql)
+
+    monkeypatch.setattr(query, "guard_sql", fake_guard)
+    monkeypatch.setattr(query, "explain_needs_primary", lambda dialect: True)
+    result = query.fetch_bounded("SELECT origem FROM t")
+    assert seen == ["primary"] and result.rows == [{"origem": "replica"}]
+
+    monkeypatch.setattr(query, "explain_needs_primary", lambda dialect: False)
+    seen.clear()
+    query.fetch_bounded("SELECT origem FROM t")
+    assert seen == ["replica"]
+
+
+def test_guard_explain_reuses_the_read_connection_on_the_primary(tmp_path, monkeypatch):
+    # Sem réplicas e com pool de 1 conexão: uma segunda conexão para o EXPLAIN esgotaria o pool
+    target = _make_target(tmp_path, monkeypatch, replica=False, pool={"pool_size": 1, "max_overflow": 0, "pool_timeout": 1})
+    checkouts = []
+    event.listen(target.primary.engine(), "checkout", lambda *args: checkouts.append(1))
+    seen = []
+
+    def fake_guard(conn, sql, dialect):
+        seen.append(conn)
+        return GuardResult(sql=sql)
+
+    monkeypatch.setattr(query, "guard_sql", fake_guard)
+    monkeypatch.setattr(query, "explain_needs_primary", lambda dialect: True)
+    result = query.fetch_bounded("SELECT origem FROM t")
+    assert result.rows == [{"origem": "primary"}]
+    assert len(seen) == 1 and len(checkouts) == 1